@@ -5,12 +5,16 @@ import random
 import asyncio
 import requests
 import re
-from typing import List, Dict, TYPE_CHECKING
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, AsyncIterator, Optional, Tuple, TYPE_CHECKING
 import aiohttp
+import numpy as np
 
 if TYPE_CHECKING:
     from main import ChatBot # For type hinting
 
+_IMPORTS_STARTED = time.perf_counter() # For the startup report
 from core_beliefs import CoreBeliefs
 from knowledge import KnowledgeBase
 from core_values import CoreValues
@@ -32,25 +36,51 @@ from aging_engine import AgingEngine
 from meta_cognition_engine import MetaCognitionEngine
 from database_engine import DatabaseEngine
 from response_filter_engine import ResponseFilterEngine
+from ollama_client import OllamaClient
+from ollama_pool import OllamaBackendPool, ollama_endpoints_from_env
+from streaming_filter import scrub_text, IncrementalResponseFilter
+from intent_classifier import IntentRouter
+from speculation import SpeculationTracker
+from context_cache import ContextCache, fingerprint
+from prompt_budget import PromptBuilder, truncate_to_tokens, MAX_PROMPT_HISTORY_MESSAGES
+from history_store import ConversationHistoryStore
+from state_checkpoint import StateCheckpointer
+from vector_memory_engine import VectorMemoryEngine, hashing_embedding, memory_db_path_for
+from async_utils import run_blocking
+from summary_scheduler import BackgroundSummarizer
+from tracing import LatencyTracer, current_stage
+from llm_scheduler import LLMScheduler, run_with_priority, current_llm_priority, PRIORITY_INTERACTIVE, PRIORITY_META, PRIORITY_BACKGROUND
+from model_lifecycle import ModelLifecycleManager
+from generation_profiles import generation_settings, is_structured, parse_json_reply, cache_ttl_for
+from llm_cache import LLMResponseCache, llm_cache_key
+from model_router import ModelRouter
+from mind_startup import STARTUP_MODE, StartupTimer, MigrationMarkers, lazy_engine
+_IMPORT_SECONDS = time.perf_counter() - _IMPORTS_STARTED
 
 # --- Configuration ---
 MIND_STATE_FILE = "mind_state.json" # This will now be for orchestrator state if needed, not beliefs
 
 # --- Prompts for the new two-step response generation ---
+# Both prompts start with the same {static_context} block (identity, values,
+# beliefs, directives). Keeping it first and byte-identical lets Ollama reuse
+# its KV cache for that prefix instead of re-evaluating the persona each call.
 
 THOUGHT_PROMPT = (
+    "{static_context}\n"
     "This is an internal monologue task. Formulate a response to the user by thinking step-by-step. This thought process will NOT be shown to the user. "
     "Keep this thought process concise, like a bulleted list or a short paragraph of self-talk.\n\n"
-    "--- INTERNAL STATE & CONTEXT ---\n{full_context}\n\n"
+    "--- INTERNAL STATE & CONTEXT ---\n{dynamic_context}\n\n"
+    "--- RELEVANT MEMORIES FROM EARLIER CONVERSATIONS ---\n{memories}\n\n"
     "--- CONVERSATION HISTORY ---\n{conversation_history}\n\n"
     "--- USER'S MESSAGE ---\n{user_input}\n\n"
     "--- YOUR INTERNAL THOUGHT PROCESS (for your eyes only) ---\n"
 )
 
 REPLY_PROMPT = (
+    "{static_context}\n"
     "You are AI Chris. Your internal thought process is complete. Your only task is to write the user-facing reply based on the thoughts and the persona context provided below. "
     "This is not a roleplay. This IS your state of mind. Your response MUST be a direct, unfiltered, and honest reflection of this data.\\n\\n"
-    "--- YOUR PERSONA & CONTEXT ---\n{full_context}\n\n"
+    "--- YOUR PERSONA & CONTEXT ---\n{dynamic_context}\n\n"
     "--- YOUR INTERNAL THOUGHTS (for context, not for output) ---\n{thought_process}\n\n"
     "--- CRITICAL INSTRUCTIONS ---\n"
     "1. Speak directly from the provided persona. Do not act as a helpful AI assistant. Do not use platitudes or canned phrases like 'I cannot provide assistance'.\n"
@@ -112,43 +142,63 @@ STARTUP_PROMPT = (
     "--- YOUR UNIQUE STARTUP MESSAGE ---"
 )
 
+# Meta topics whose explanation only changes when the data does, and the
+# mark_context_changed component that invalidates it (None: the TTL alone)
+STATIC_META_TOPICS = {
+    "agent_statement": "agent_statement",
+    "core_values": "values",
+    "core_beliefs": "beliefs",
+    "aging": None,
+}
+
 def _filter_response(text: str) -> str:
     """Scrubs the response of any AI-like, model-specific, or un-immersive phrases."""
-    # This is a stateless function, so it can be defined at the module level.
-    # It could also be a static method in the Mind class.
-    
-    # More aggressive and comprehensive regex patterns
-    patterns = [
-        re.compile(r'\b(mistral|dolphin|ollama|llama)\b', re.IGNORECASE),
-        re.compile(r'\b(large language model|llm|ai assistant|language model|ai model)\b', re.IGNORECASE),
-        re.compile(r'as an ai,? I am programmed to.*', re.IGNORECASE),
-        re.compile(r'i am a large language model.*', re.IGNORECASE),
-        re.compile(r'\b(trained by|a product of)\b.*', re.IGNORECASE),
-    ]
-    
-    # A more in-character replacement. Or could be an empty string.
-    replacement = "I" 
-    
-    scrubbed_text = text
-    for pattern in patterns:
-        scrubbed_text = pattern.sub(replacement, scrubbed_text)
-    
-    # Clean up potential artifacts like "I, " or leading/trailing whitespace
-    scrubbed_text = re.sub(r'\bI,\\s*', 'I ', scrubbed_text).strip()
-    
-    return scrubbed_text
+    # The patterns live in streaming_filter, compiled once into a single matcher,
+    # so complete and streamed replies are scrubbed by exactly the same rules.
+    return scrub_text(text)
+
+def _split_items(text: str) -> List[str]:
+    """Splits a newline-separated list (as returned by get_all_as_string) into its items."""
+    return [item.strip() for item in re.split(r'\n|\\n', text or "") if item.strip()]
+
+# Checkpoint components that change on their own during a chat turn (see _plan_chat_response)
+TURN_EVOLVING_COMPONENTS = ("aging", "goals", "psychological")
 
 class Mind:
+    # Rarely used engines are built on first access (MIND_STARTUP_MODE=eager builds them at startup)
+    self_regulation_engine = lazy_engine(lambda mind: SelfRegulationEngine())
+    dashboard_engine = lazy_engine(lambda mind: DashboardEngine())
+    voice_modulation_engine = lazy_engine(lambda mind: VoiceModulationEngine())
+
     def __init__(self, model_id: str = None, db_engine: DatabaseEngine = None, chatbot_ui: 'ChatBot' = None):
+        startup = StartupTimer()
+        startup.record("imports", _IMPORT_SECONDS, before_start=True)
+
         if db_engine:
             self.db_engine = db_engine
         else:
             print("WARNING: No database engine provided to Mind. Creating a new one.")
-            self.db_engine = DatabaseEngine()
+            with startup.phase("database"):
+                self.db_engine = DatabaseEngine()
             
         self.model_id = model_id if model_id else os.getenv("OLLAMA_MODEL", "dolphin-mistral:latest").strip()
+        self.ollama_url = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+        # Print every prompt sent to Ollama (full prompts and user data, so only for debugging)
+        self.debug_prompts = os.getenv("OLLAMA_DEBUG_PROMPTS", "0").lower() in ("1", "true", "yes")
+        # Every Ollama node requests can go to (OLLAMA_URLS, or just OLLAMA_URL)
+        self.ollama_endpoints = ollama_endpoints_from_env(self.ollama_url)
+
+        # Cheap calls (classification, meta, summaries) can go to OLLAMA_SMALL_MODEL
+        self.model_router = ModelRouter(self.model_id)
+        # Start loading every routed model in Ollama now, so it overlaps with everything below
+        self.model_lifecycle = ModelLifecycleManager(self.ollama_url, self.model_id, base_urls=self.ollama_endpoints,
+                                                     extra_models=self.model_router.models.values())
+        self.model_lifecycle.start_warmup()
+        # Identical LLM calls in flight share one request; deterministic answers are cached
+        self.llm_cache = LLMResponseCache()
             
         # Initialize the new foundational modules
+        engines_started = time.perf_counter()
         self.core_beliefs = CoreBeliefs(self.model_id)
         self.knowledge_base = KnowledgeBase(self.model_id)
         self.core_values = CoreValues(self.db_engine)
@@ -162,13 +212,17 @@ class Mind:
         self.psychological_engine = PsychologicalEngine(self.model_id)
         self.mental_health_engine = MentalHealthEngine(self.db_engine)
         self.response_engine = ResponseEngine(self.model_id)
-        self.self_regulation_engine = SelfRegulationEngine()
-        self.dashboard_engine = DashboardEngine()
-        self.voice_modulation_engine = VoiceModulationEngine()
         self.performance_monitor = PerformanceMonitor()
+        # Samples in the background, so it runs from startup: built on first use, its first report would be empty
         self.system_monitor = SystemMonitor()
         self.meta_cognition_engine = MetaCognitionEngine()
         self.response_filter_engine = ResponseFilterEngine()
+        self.intent_router = IntentRouter()
+
+        # Opt-in: run the THOUGHT_PROMPT call in parallel with intent classification.
+        # Only worth it when the Ollama server has spare parallel slots.
+        self.speculative_mode = os.getenv("SPECULATIVE_THOUGHT", "0").lower() in ("1", "true", "yes")
+        self.speculation_tracker = SpeculationTracker()
         
         # This allows the mind to send thoughts directly to the UI
         self.chatbot_ui = chatbot_ui
@@ -184,99 +238,416 @@ class Mind:
         except Exception as e:
             print(f"Error loading agent_statement.txt: {e}")
 
+        # Background saves: only components marked dirty are written, off the event loop
+        # except for the database-backed ones, which stay on the thread that owns the connection
+        self.checkpointer = StateCheckpointer({
+            "core_beliefs": self.core_beliefs.save,
+            "knowledge_base": self.knowledge_base.save,
+            "core_values": self.core_values.save,
+            "aging": self.aging_engine.save_state,
+            "mood": self.mood_engine.save_state,
+            "trust": self.trust_engine.save_state,
+            "goals": self.goals_engine.save_state,
+            "user_profiles": self.user_profile_engine.save_profiles,
+            "psychological": self.psychological_engine.save_state,
+            "mental_health": self.mental_health_engine.save_state,
+        }, shared=(self, self.db_engine), on_loop=("core_values", "aging", "user_profiles", "mental_health"))
+        self._save_tasks = set() # Strong references to checkpoints scheduled by save_state()
+        self._background_tasks = set() # Fire-and-forget work started by _start_background()
+
+        # Rendered persona sections, re-rendered only when the data behind them changes
+        self.context_cache = ContextCache()
+
+        if STARTUP_MODE == "eager":
+            for name in lazy_engine.names(Mind):
+                getattr(self, name)
+        startup.record("engines", time.perf_counter() - engines_started)
+
         # Load state *after* all engines are initialized
-        self.load_state()
+        with startup.phase("load_state"):
+            self.load_state()
 
         # Start background monitors
         self.system_monitor.start()
 
-        self.ollama_url = os.getenv("OLLAMA_URL", "http://localhost:11434/api/chat")
+        services_started = time.perf_counter()
+        # One pooled HTTP client shared by every LLM call (keep-alive, bounded pool)
+        self.ollama_client = OllamaClient()
+        # Long-term memory embeddings: with no OLLAMA_EMBED_URL they go through the node pool like chat calls
+        self.embed_model = os.getenv("OLLAMA_EMBED_MODEL", "").strip()
+        self.ollama_embed_url = os.getenv("OLLAMA_EMBED_URL", "").strip() or None
+        # Least-outstanding balancing, health checks and failover across the Ollama nodes
+        pool_models = set(self.model_router.models.values())
+        if self.embed_model and not self.ollama_embed_url:
+            pool_models.add(self.embed_model)
+        self.ollama_pool = OllamaBackendPool(self.ollama_client, self.ollama_endpoints, models=pool_models)
+        # Per-stage latency histograms and LLM token/timing counters (served on /metrics)
+        self.tracer = LatencyTracer()
+        # Bounded, priority-aware admission for every LLM call (OLLAMA_NUM_PARALLEL per node)
+        self.llm_scheduler = LLMScheduler(int(os.getenv("OLLAMA_NUM_PARALLEL", "1")) * len(self.ollama_pool))
+        self.model_lifecycle.attach(self.ollama_client, self.llm_scheduler)
+        self.ollama_pool.attach(self.llm_scheduler) # Hedges take a real slot
+        self.speculation_tracker.attach(self.tracer) # Latency saved and compute wasted on /metrics
+
+        # Long-term memory: past exchanges as vectors, recalled by similarity each turn
+        self.vector_memory = VectorMemoryEngine(
+            memory_db_path_for(self.db_engine),
+            embedder_name=f"ollama:{self.embed_model}" if self.embed_model else "hashing-512"
+        )
+        self.memory_recall_k = int(os.getenv("MEMORY_RECALL_K", "3"))
+
+        # Debounced, coalesced profile-summary rewrites (one at a time per user)
+        self.summarizer = BackgroundSummarizer(
+            lambda summary_user_id, history: run_with_priority(
+                self._update_conversation_summary(summary_user_id, history), PRIORITY_BACKGROUND, summary_user_id
+            )
+        )
+
+        # Recent history per user, kept in memory and written back to the database in batches
+        self.history_store = ConversationHistoryStore(
+            load=lambda channel: self.db_engine.load_chat_history(channel=channel),
+            persist=self._append_chat_history,
+            persist_on_loop=True, # The database engine belongs to the loop thread
+        )
+
+        startup.record("clients and stores", time.perf_counter() - services_started)
 
         # --- Run Migrations ---
-        self.user_profile_engine.run_migration_from_json()
-        self.aging_engine.run_migration_from_json()
-        self.mental_health_engine.run_migration_from_json()
-        # Add migration for the main chatbot state
-        if self.chatbot_ui:
-            self.chatbot_ui.run_migration_from_json()
+        # Each one runs once; a marker file next to the database records it as done
+        with startup.phase("migrations"):
+            migrations = MigrationMarkers(memory_db_path_for(self.db_engine, "migrations_done.json"))
+            ran = []
+            for name, migrate in (
+                ("user_profiles", self.user_profile_engine.run_migration_from_json),
+                ("aging", self.aging_engine.run_migration_from_json),
+                ("mental_health", self.mental_health_engine.run_migration_from_json),
+                # Add migration for the main chatbot state
+                ("chatbot", self.chatbot_ui.run_migration_from_json if self.chatbot_ui else None),
+            ):
+                if migrate and migrations.run_once(name, migrate):
+                    ran.append(name)
+
+        deferred = [name for name in lazy_engine.names(Mind) if not lazy_engine.is_built(self, name)]
+        startup.report("Mind started", [
+            f"migrations run: {', '.join(ran) or 'none (already done)'}",
+            f"built on first use: {', '.join(deferred) or 'none'} (MIND_STARTUP_MODE={STARTUP_MODE})",
+        ])
+
+    def _append_chat_history(self, channel: str, messages: List[Dict]):
+        """
+        Write-behind target for the history store. Turns are appended to the
+        DatabaseEngine's chat history for the channel, the list load_chat_history
+        returns, which is where generate_chat_response has always added them.
+        DatabaseEngine isn't thread-safe, so this runs on the event loop (see
+        persist_on_loop) rather than on a worker thread; a flush is one append
+        per user with pending turns, not one per message.
+        """
+        self.db_engine.load_chat_history(channel=channel).extend(messages)
 
     def _filter_response(self, text: str) -> str:
         """DEPRECATED - now a module-level function."""
         return _filter_response(text)
 
+    def filter_sentence(self, sentence: str) -> str:
+        """
+        Runs one streamed sentence through the same filters as the final reply,
+        so audio synthesised before the reply is finished says what the client
+        ends up showing.
+        """
+        return self.response_filter_engine.filter(_filter_response(sentence))
+
     def load_state(self):
-        """Loads the state for all sub-modules."""
-        self.core_beliefs.load()
-        self.knowledge_base.load()
-        self.core_values.load()
-        self.aging_engine.load_state()
-        self.mood_engine.load_state()
-        self.trust_engine.load_state()
-        self.goals_engine.load_state()
-        self.user_profile_engine.load_profiles()
-        self.psychological_engine.load_state()
-        self.mental_health_engine.load_state()
+        """
+        Loads the state for all sub-modules. The file-backed loads are independent,
+        so they run concurrently on worker threads while the database-backed ones
+        run here (the database connection belongs to this thread).
+        """
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix="load_state") as pool:
+            file_loads = [pool.submit(load) for load in (
+                self.core_beliefs.load,
+                self.knowledge_base.load,
+                self.mood_engine.load_state,
+                self.trust_engine.load_state,
+                self.goals_engine.load_state,
+                self.psychological_engine.load_state,
+            )]
+            self.core_values.load()
+            self.aging_engine.load_state()
+            self.user_profile_engine.load_profiles()
+            self.mental_health_engine.load_state()
+            for future in file_loads:
+                future.result() # Re-raise any load error here, as before
+        # Everything may have changed, so start with a clean context cache
+        self.context_cache.invalidate()
         print("All mind components loaded.")
 
-    def save_state(self):
-        """Saves the state for all sub-modules."""
-        self.core_beliefs.save()
-        self.knowledge_base.save()
-        self.core_values.save()
-        self.aging_engine.save_state()
-        self.mood_engine.save_state()
-        self.trust_engine.save_state()
-        self.goals_engine.save_state()
-        self.user_profile_engine.save_profiles()
-        self.psychological_engine.save_state()
-        self.mental_health_engine.save_state()
-        print("All mind components saved.")
+    def save_state(self, full: bool = False) -> Optional[asyncio.Task]:
+        """
+        Saves the sub-modules that changed since the last checkpoint (all of them
+        with full=True). From a thread without an event loop it saves before
+        returning. On the event loop it can't block, so it starts the checkpoint
+        and returns its task: await it (or use asave_state) to know the state is
+        on disk. shutdown() waits for any still running.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            saved = self.checkpointer.save_now(full=full)
+            print(f"Mind components saved: {', '.join(saved) or 'nothing had changed'}.")
+            return None
+        task = asyncio.create_task(self.asave_state(full=full))
+        self._save_tasks.add(task)
+        task.add_done_callback(self._save_tasks.discard)
+        return task
+
+    def _start_background(self, coro) -> asyncio.Task:
+        """Runs a coroutine without waiting for it. The task is kept until it finishes and awaited by shutdown()."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
 
-    async def _call_ollama(self, messages: List[Dict], **kwargs) -> str:
-        """Calls the Ollama API and returns the response content."""
+    async def asave_state(self, full: bool = False) -> List[str]:
+        """save_state() for the event loop: returns once the changed sub-modules are written. Returns their names."""
+        saved = await self.checkpointer.checkpoint(full=full)
+        print(f"Mind components saved: {', '.join(saved) or 'nothing had changed'}.")
+        return saved
+
+    async def shutdown(self):
+        """Finishes background work and releases network resources. Call once from the event loop on exit."""
+        await self.summarizer.shutdown(drain=True)
+        await self.history_store.shutdown()
+        while self._background_tasks: # A finishing task can start another (e.g. a decision log write)
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await asyncio.gather(*self._save_tasks, return_exceptions=True)
+        await self.checkpointer.shutdown()
+        await self.model_lifecycle.shutdown()
+        await self.ollama_pool.shutdown()
+        await self.ollama_client.close()
+        self.vector_memory.close()
+        print("Mind shut down cleanly.")
+
+    def get_llm_client_stats(self) -> Dict:
+        """Returns connection pool stats for the shared Ollama client."""
+        return self.ollama_client.get_stats()
+
+    def get_ollama_pool_stats(self) -> Dict:
+        """Returns per-node health, load and latency, plus hedge and failover counts."""
+        return self.ollama_pool.get_stats()
+
+    async def get_model_status(self) -> Dict:
+        """Asks Ollama whether the chat models are loaded, and returns warm-up and keep-alive details."""
+        return await self.model_lifecycle.refresh_status()
+
+    def get_model_router_stats(self) -> Dict:
+        """Returns the model behind each tier, with per-tier call and fallback counts."""
+        return self.model_router.get_stats()
+
+    def get_llm_cache_stats(self) -> Dict:
+        """Returns LLM response cache size, hits and single-flight joins."""
+        return self.llm_cache.get_stats()
+
+    def get_speculation_stats(self) -> Dict:
+        """Returns how often speculative thoughts were kept, the latency they saved and the compute they wasted."""
+        return self.speculation_tracker.get_stats()
+
+    def get_llm_scheduler_stats(self) -> Dict:
+        """Returns queue depth and wait-time metrics for the LLM scheduler."""
+        return self.llm_scheduler.get_stats()
+
+    def get_metrics_text(self, extra_gauges: Dict = None, extra_counters: Dict = None) -> str:
+        """
+        Renders pipeline latency histograms and current pool/queue state in Prometheus
+        text format. `extra_gauges` and `extra_counters` let the web layer add its
+        own (queues, caches); counters are the running totals named *_total.
+        """
+        scheduler = self.llm_scheduler.get_stats()
+        client = self.ollama_client.get_stats()
+        pool = self.ollama_pool.get_stats()
+        summaries = self.summarizer.get_stats()
+        history = self.history_store.get_stats()
+        llm_cache = self.llm_cache.get_stats()
+        gauges = {
+            "llm_in_flight": {(): scheduler["in_flight"]},
+            "llm_max_in_flight": {(): scheduler["max_in_flight"]},
+            "llm_queue_depth": {(("priority", name),): stats["queue_depth"] for name, stats in scheduler["classes"].items()},
+            "ollama_open_connections": {(): client["open_connections"]},
+            "ollama_idle_connections": {(): client["idle_connections"]},
+            "ollama_node_up": {(("node", node["url"]),): 1 if node["state"] == "up" else 0 for node in pool["endpoints"]},
+            "ollama_node_outstanding": {(("node", node["url"]),): node["outstanding"] for node in pool["endpoints"]},
+            "summaries_pending": {(): summaries["pending"]},
+            "model_loaded": {(("model", model),): 1 if self.model_lifecycle.model_state(model) == "loaded" else 0
+                             for model in self.model_lifecycle.models},
+            "model_tier_info": {(("tier", tier), ("model", model)): 1 for tier, model in self.model_router.models.items()},
+            "history_cached_users": {(): history["users"]},
+            "history_pending_writes": {(): history["pending_writes"]},
+            "intent_fast_path_hit_rate": {(): self.intent_router.get_stats()["hit_rate"]},
+            "llm_cache_entries": {(): llm_cache["entries"]},
+            "llm_cache_hit_rate": {(): llm_cache["hit_rate"]},
+        }
+        gauges.update(extra_gauges or {})
+        return self.tracer.render_prometheus(gauges, extra_counters)
+
+    def _build_ollama_payload(self, messages: List[Dict], stream: bool, model: str = None, **kwargs) -> Dict:
+        """
+        Builds the request body for the Ollama chat API. `profile` picks the
+        decode budget, stop sequences and output format (see generation_profiles);
+        explicit sampling kwargs such as temperature override it.
+        """
         payload = {
-            "model": self.model_id,
+            "model": model or self.model_id,
             "messages": messages,
-            "stream": False,
-            "options": {
-                "temperature": kwargs.get("temperature", 0.7),
-                "top_p": kwargs.get("top_p", 0.9),
-            }
+            "stream": stream,
+            "keep_alive": self.model_lifecycle.keep_alive, # Stop Ollama unloading the model between quiet periods
+            **generation_settings(**kwargs),
         }
-        
-        # --- DEBUG PRINT STATEMENT ---
-        print("\n" + "="*50)
-        print("--- CONTEXT SENT TO OLLAMA LLM ---")
-        print(json.dumps(payload, indent=2))
-        print("="*50 + "\n")
-        # --- END DEBUG PRINT STATEMENT ---
+
+        if self.debug_prompts:
+            print("\n" + "="*50)
+            print("--- CONTEXT SENT TO OLLAMA LLM ---")
+            print(json.dumps(payload, indent=2))
+            print("="*50 + "\n")
+
+        return payload
+
+    async def _call_ollama(self, messages: List[Dict], **kwargs) -> str:
+        """
+        Calls the Ollama API and returns the response content. Identical calls
+        already in flight are joined rather than repeated, and deterministic
+        answers (temperature 0, or a profile with a cache_ttl) are cached.
+        `cache_tags` names the persona data an answer describes, so it is
+        dropped when that data changes (see mark_context_changed).
+        """
+        call_site = kwargs.get("call_site") or current_stage.get()
+        settings = generation_settings(**kwargs)
+        _, model = self.model_router.candidates(kwargs.get("profile"), call_site)[0]
+        key = llm_cache_key(model=model, messages=messages, **settings)
+        return await self.llm_cache.get_or_call(
+            key, lambda: self._call_ollama_routed(messages, **kwargs),
+            ttl=cache_ttl_for(kwargs.get("profile"), settings["options"]), tags=kwargs.get("cache_tags", ()),
+        )
+
+    async def _call_ollama_routed(self, messages: List[Dict], **kwargs) -> Tuple[str, bool]:
+        """
+        Makes the call on the model the router picks. A call the small model
+        fails or answers unusably is retried once on the large model. Returns
+        (content, ok); on failure the content is an apology to show instead.
+        """
+        call_site = kwargs.get("call_site") or current_stage.get()
+        structured = is_structured(kwargs.get("profile"))
+        route = self.model_router.candidates(kwargs.get("profile"), call_site)
+
+        for attempt, (tier, model) in enumerate(route):
+            can_fall_back = attempt < len(route) - 1
+            try:
+                content = await self._request_ollama(messages, tier, model, call_site, **kwargs)
+            except asyncio.TimeoutError:
+                self.tracer.inc("llm_errors_total", call_site=call_site, error="timeout")
+                if can_fall_back:
+                    self._record_model_fallback(tier, model, call_site, "timeout")
+                    continue
+                print("Ollama server timed out. Please check if the server is running and reachable.")
+                return "Sorry, my language model server is not responding right now. Please try again later.", False
+            except aiohttp.ClientError as e:
+                self.tracer.inc("llm_errors_total", call_site=call_site, error="connection")
+                if can_fall_back:
+                    self._record_model_fallback(tier, model, call_site, "connection")
+                    continue
+                print(f"Error calling Ollama API: {e}")
+                return "I'm sorry, I'm having trouble connecting to my own thought process. Please try again in a moment.", False
+            except Exception as e:
+                self.tracer.inc("llm_errors_total", call_site=call_site, error="unexpected")
+                if can_fall_back:
+                    self._record_model_fallback(tier, model, call_site, "unexpected")
+                    continue
+                print(f"Unexpected error calling Ollama API: {e}")
+                return "Sorry, I encountered an unexpected error connecting to my language model server.", False
+
+            if can_fall_back and not self.model_router.is_usable(content, structured):
+                self._record_model_fallback(tier, model, call_site, "unusable_output")
+                continue
+            if content is None:
+                return "I received an unusual response from my thought process.", False
+            if structured:
+                return content, True # JSON for the caller to parse, not prose to scrub
+            return self._filter_response(content), True
+
+    async def _request_ollama(self, messages: List[Dict], tier: str, model: str, call_site: str, **kwargs) -> Optional[str]:
+        """One non-streaming chat request. Returns the raw content, or None if the response was malformed."""
+        payload = self._build_ollama_payload(messages, stream=False, model=model, **kwargs)
+        self.model_lifecycle.note_activity(model)
+
+        # Wait for an in-flight slot; interactive calls jump ahead of background work
+        async with self.llm_scheduler.slot(kwargs.get("priority"), kwargs.get("user_key")) as queue_wait:
+            start = time.perf_counter()
+            priority = kwargs.get("priority")
+            interactive = (current_llm_priority.get() if priority is None else priority) == PRIORITY_INTERACTIVE
+            data = await self.ollama_pool.post_json("/api/chat", payload, timeout=kwargs.get("timeout"),
+                                                    latency_key=call_site, hedge=interactive)
+        self._record_tier_call(tier, model, call_site, time.perf_counter() - start, queue_wait, data)
+        self.model_lifecycle.note_response(model)
+
+        # Check for the expected response structure
+        if "message" in data and "content" in data["message"]:
+            return data["message"]["content"]
+        print(f"Unexpected Ollama response format: {data}")
+        return None
+
+    def _record_tier_call(self, tier: str, model: str, call_site: str, seconds: float, queue_wait: float, data: Dict):
+        self.tracer.record_llm_call(call_site, seconds, queue_wait, data)
+        self.tracer.observe("llm_tier_latency_seconds", seconds, tier=tier, model=model)
+        self.tracer.inc("llm_tier_calls_total", tier=tier, model=model)
+        self.model_router.record_call(tier)
+
+    def _record_model_fallback(self, tier: str, model: str, call_site: str, reason: str):
+        self.tracer.inc("llm_tier_fallbacks_total", tier=tier, reason=reason)
+        self.model_router.record_fallback(reason)
+        print(f"Model {model} ({tier} tier) failed for {call_site} ({reason}); retrying on the large model.")
+
+    async def _call_ollama_stream(self, messages: List[Dict], **kwargs) -> AsyncIterator[str]:
+        """
+        Streaming variant of _call_ollama. Yields raw content chunks as Ollama
+        produces them. Errors are reported the same way, as a single apology chunk.
+        """
+        call_site = kwargs.get("call_site") or current_stage.get()
+        # Streamed calls are user-facing replies; there is no clean way to fall back mid-stream
+        tier, model = self.model_router.candidates(kwargs.get("profile"), call_site)[0]
+        payload = self._build_ollama_payload(messages, stream=True, model=model, **kwargs)
+        self.model_lifecycle.note_activity(model)
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.ollama_url, json=payload, timeout=60) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-                    
-                    # Check for the expected response structure
-                    if "message" in data and "content" in data["message"]:
-                        return self._filter_response(data["message"]["content"])
-                    else:
-                        print(f"Unexpected Ollama response format: {data}")
-                        return "I received an unusual response from my thought process."
+            async with self.llm_scheduler.slot(kwargs.get("priority"), kwargs.get("user_key")) as queue_wait:
+                start = time.perf_counter()
+                async for data in self.ollama_pool.stream_json("/api/chat", payload, timeout=kwargs.get("timeout")):
+                    chunk = data.get("message", {}).get("content", "")
+                    if chunk:
+                        yield chunk
+                    if data.get("done"):
+                        # The final line carries Ollama's token counts and timings
+                        self._record_tier_call(tier, model, call_site, time.perf_counter() - start, queue_wait, data)
+                        self.model_lifecycle.note_response(model)
+                        break
         except asyncio.TimeoutError:
-            print("Ollama server timed out. Please check if the server is running and reachable.")
-            return "Sorry, my language model server is not responding right now. Please try again later."
+            self.tracer.inc("llm_errors_total", call_site=call_site, error="timeout")
+            print("Ollama server timed out while streaming. Please check if the server is running and reachable.")
+            yield "Sorry, my language model server is not responding right now. Please try again later."
         except aiohttp.ClientError as e:
-            print(f"Error calling Ollama API: {e}")
-            return "I'm sorry, I'm having trouble connecting to my own thought process. Please try again in a moment."
+            self.tracer.inc("llm_errors_total", call_site=call_site, error="connection")
+            print(f"Error streaming from Ollama API: {e}")
+            yield "I'm sorry, I'm having trouble connecting to my own thought process. Please try again in a moment."
         except Exception as e:
-            print(f"Unexpected error calling Ollama API: {e}")
-            return "Sorry, I encountered an unexpected error connecting to my language model server."
+            self.tracer.inc("llm_errors_total", call_site=call_site, error="unexpected")
+            print(f"Unexpected error streaming from Ollama API: {e}")
+            yield "Sorry, I encountered an unexpected error connecting to my language model server."
 
     async def consider_belief_evolution(self, conversation_history: List[Dict]):
         """A wrapper to trigger the belief evolution process."""
-        new_belief = await self.core_beliefs.evolve(self, conversation_history)
+        with self.tracer.span("belief_evolution"):
+            new_belief = await run_with_priority(self.core_beliefs.evolve(self, conversation_history), PRIORITY_BACKGROUND)
+        # evolve() gets the whole Mind and can record what it learned in the knowledge base
+        self.checkpointer.mark_dirty("knowledge_base")
         if new_belief:
+            self.mark_context_changed("beliefs")
             # Maybe do something with the new belief, like announce it?
             # For now, just logging is handled by the CoreBeliefs class.
             pass
@@ -301,7 +672,7 @@ class Mind:
         
         messages = [{"role": "user", "content": prompt}]
         
-        reflection = await self._call_ollama(messages)
+        reflection = await self._call_ollama(messages, profile="reflection", priority=PRIORITY_BACKGROUND)
         
         if reflection:
             self.journaling_engine.add_entry("reflection", reflection, {"topic": topic, "user": username})
@@ -314,7 +685,7 @@ class Mind:
         prompt = META_PROMPT_DREAM
         messages = [{"role": "user", "content": prompt}]
 
-        dream = await self._call_ollama(messages)
+        dream = await self._call_ollama(messages, profile="dream", priority=PRIORITY_BACKGROUND)
 
         if dream:
             self.journaling_engine.add_entry("dream", dream, {"mood": self.mood_engine.get_mood_description(), "user": username})
@@ -325,7 +696,7 @@ class Mind:
         print("Generating dynamic startup message...")
         messages = [{"role": "user", "content": STARTUP_PROMPT}]
         
-        startup_message = await self._call_ollama(messages)
+        startup_message = await self._call_ollama(messages, profile="startup", priority=PRIORITY_META)
         
         if not startup_message or "I received an unusual response" in startup_message or "I'm sorry" in startup_message:
             return "Hello! I'm AI Chris. All systems online." # Fallback
@@ -346,16 +717,18 @@ class Mind:
 
             # 2. Generate internal monologue
             monologue_prompt = f"You are Chris. You just checked your system vitals and saw this: {raw_metrics_string}. What is your brief, internal, first-person thought about this? (e.g., 'Feeling a bit sluggish today,' or 'Everything is running smoothly.'). Keep it under 15 words."
-            monologue = await self._call_ollama([{"role": "user", "content": monologue_prompt}])
+            monologue = await self._call_ollama([{"role": "user", "content": monologue_prompt}], profile="monologue", priority=PRIORITY_META)
             
             # 3. React emotionally
             reaction_context = "System resources are nominal."
             if raw_metrics_dict['cpu_percent'] > 75 or raw_metrics_dict['memory_percent'] > 90:
                 self.mental_health_engine.add_stress(0.1)
                 self.mood_engine.negative_interaction()
+                self.checkpointer.mark_dirty("mood", "mental_health")
                 reaction_context = "This is causing me some stress."
             elif raw_metrics_dict['cpu_percent'] < 10:
                 self.mood_engine.positive_interaction()
+                self.checkpointer.mark_dirty("mood")
                 reaction_context = "I'm feeling very relaxed and efficient."
 
             # 4. Journal the monologue
@@ -370,7 +743,7 @@ class Mind:
                 f"Now, explain your status to the user in a natural, conversational way. Your tone should reflect your internal thought and reaction. "
                 f"Don't just list the numbers; integrate them into a sentence."
             )
-            return await self._call_ollama([{"role": "user", "content": public_response_prompt}])
+            return await self._call_ollama([{"role": "user", "content": public_response_prompt}], profile="meta", priority=PRIORITY_META)
         elif topic == 'agent_statement':
             data = self.agent_statement
             explanation_context = "This is my core identity statement, which defines my fundamental purpose."
@@ -405,17 +778,28 @@ class Mind:
             data = "My system prompt is a dynamic set of instructions that includes my identity, my current internal state (mood, stress, goals), my values, beliefs, and our recent conversation history. It's too long to show here, but it's what allows me to give context-aware responses rather than just answering questions like a standard chatbot."
             explanation_context = "This is a description of the complex instructions I use to formulate my responses."
 
-        # Use the LLM to create a natural response
-        prompt = (
-            f"You are Chris. A user named '{username}' just asked you about your '{topic}'. "
-            f"Here is the raw data: \n---DATA---\n{data}\n---END DATA---\n\n"
-            f"Here is some context for your explanation: {explanation_context}\n\n"
-            f"Explain this to the user in a natural, first-person conversational way. "
-            f"Your response must be well-written, with correct grammar, punctuation, and paragraph structure. "
-            f"Do not sound like a robot reading a file; just talk to them."
+        # Use the LLM to create a natural response. Explanations of slow-changing
+        # data don't name the asker, so everyone asking shares one cached answer
+        # until that data changes.
+        cache_tag = STATIC_META_TOPICS.get(topic)
+        asker = "Someone" if topic in STATIC_META_TOPICS else f"A user named '{username}'"
+        meta_template = (
+            "You are Chris. {asker} just asked you about your '{topic}'. "
+            "Here is the raw data: \n---DATA---\n{data}\n---END DATA---\n\n"
+            "Here is some context for your explanation: {explanation_context}\n\n"
+            "Explain this to the user in a natural, first-person conversational way. "
+            "Your response must be well-written, with correct grammar, punctuation, and paragraph structure. "
+            "Do not sound like a robot reading a file; just talk to them."
         )
+        builder = PromptBuilder("meta")
+        builder.add_text("template", meta_template.format(asker=asker, topic=topic, data="", explanation_context=explanation_context), required=True)
+        builder.add_text("data", data, priority=1)
+        sections = builder.build()
+        prompt = meta_template.format(asker=asker, topic=topic, data=sections["data"], explanation_context=explanation_context)
         messages = [{"role": "user", "content": prompt}]
-        return await self._call_ollama(messages)
+        if topic in STATIC_META_TOPICS:
+            return await self._call_ollama(messages, profile="meta_static", cache_tags=[cache_tag] if cache_tag else [], priority=PRIORITY_META)
+        return await self._call_ollama(messages, profile="meta", priority=PRIORITY_META)
 
     async def analyze_own_code(self, module_name: str) -> str:
         """Reads and analyzes one of its own source code files."""
@@ -450,7 +834,7 @@ class Mind:
         messages = [{"role": "user", "content": analysis_prompt}]
         
         print(f"Analyzing own source code: {module_name}...")
-        analysis = await self._call_ollama(messages)
+        analysis = await self._call_ollama(messages, profile="code_analysis", priority=PRIORITY_BACKGROUND)
         
         return f"I've reviewed my code for `{module_name}`. Here are my thoughts:\\n\\n{analysis}"
 
@@ -507,7 +891,7 @@ class Mind:
                 messages = [{"role": "user", "content": prompt}]
                 
                 print(f"Summarizing engine: {module_name}...")
-                summary = await self._call_ollama(messages)
+                summary = await self._call_ollama(messages, profile="engine_summary", priority=PRIORITY_BACKGROUND)
                 
                 report += f"**Module: `{module_name}`**\n{summary}\n\n"
 
@@ -522,49 +906,103 @@ class Mind:
         Generates a thoughtful response to a user's message.
         Includes meta-cognition, emotional response, and dynamic persona.
         """
+        with self.tracer.span("chat_turn"):
+            plan = await self._plan_chat_response(user_id, username, user_input, conversation_history)
+            with self.tracer.span("reply"):
+                final_reply = await self._call_ollama(plan["messages"], **plan["options"])
+            return self._finish_chat_response(user_id, username, user_input, conversation_history, final_reply, plan["style"])
+
+    async def generate_chat_response_stream(self, user_id: str, username: str, user_input: str, conversation_history: List[Dict]) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of generate_chat_response. Runs the same pipeline, but
+        yields a {"type": "style", "style": ...} event once the reply is planned (so
+        voice settings are known before any text arrives), {"type": "chunk", "text": ...}
+        events while the final reply is being generated (already scrubbed by an
+        IncrementalResponseFilter), then one {"type": "done", "reply": ..., "style": ...}
+        event carrying the fully filtered reply.
+        """
+        # Spans can't be held open across yields, so this path is timed by hand
+        turn_start = time.perf_counter()
+        plan = await self._plan_chat_response(user_id, username, user_input, conversation_history)
+        yield {"type": "style", "style": plan["style"]}
+
+        reply_start = time.perf_counter()
+        first_chunk_seen = False
+        chunks = []
+        stream_filter = IncrementalResponseFilter()
+        async for chunk in self._call_ollama_stream(plan["messages"], call_site="reply", **plan["options"]):
+            chunks.append(chunk)
+            safe_text = stream_filter.feed(chunk)
+            if safe_text:
+                if not first_chunk_seen:
+                    first_chunk_seen = True
+                    self.tracer.observe("time_to_first_chunk_seconds", time.perf_counter() - turn_start)
+                yield {"type": "chunk", "text": safe_text}
+        safe_text = stream_filter.flush()
+        if safe_text:
+            yield {"type": "chunk", "text": safe_text}
+        self.tracer.observe("stage_latency_seconds", time.perf_counter() - reply_start, stage="reply")
+
+        final_reply = self._filter_response("".join(chunks))
+        response_data = self._finish_chat_response(user_id, username, user_input, conversation_history, final_reply, plan["style"])
+        self.tracer.observe("stage_latency_seconds", time.perf_counter() - turn_start, stage="chat_turn")
+        yield {"type": "done", **response_data}
+
+    async def _plan_chat_response(self, user_id: str, username: str, user_input: str, conversation_history: List[Dict]) -> Dict:
+        """
+        Runs every step of the chat pipeline up to (but not including) the final,
+        user-facing generation call. Returns the messages and sampling options for
+        that call, plus the style instructions for TTS.
+        """
         self.performance_monitor.log_event('chat_request_start', 'info', {'user': user_id})
         
         # --- Pre-computation and Context Gathering ---
         
         # 1. Update internal state based on user's emotional tone
-        emotional_score = self.emotional_feedback_engine.score_text(user_input)
-        if emotional_score > 0.1: self.mood_engine.positive_interaction(); self.trust_engine.positive_interaction(user_id)
-        elif emotional_score < -0.1: self.mood_engine.negative_interaction(); self.trust_engine.negative_interaction(user_id); self.mental_health_engine.add_stress(abs(emotional_score) * 0.2)
+        with self.tracer.span("emotional_scoring"):
+            emotional_score = self.emotional_feedback_engine.score_text(user_input)
+            if emotional_score > 0.1: self.mood_engine.positive_interaction(); self.trust_engine.positive_interaction(user_id); self.checkpointer.mark_dirty("mood", "trust")
+            elif emotional_score < -0.1: self.mood_engine.negative_interaction(); self.trust_engine.negative_interaction(user_id); self.mental_health_engine.add_stress(abs(emotional_score) * 0.2); self.checkpointer.mark_dirty("mood", "trust", "mental_health")
         
         # 2. Meta-Cognition (Is the user asking about me?)
-        meta_query_task = asyncio.create_task(self.meta_cognition_engine.analyze_query(self, user_input))
+        meta_query_task = asyncio.create_task(run_with_priority(
+            self._analyze_meta_query(user_input), PRIORITY_META, user_id
+        ))
         
         # 3. Update User Profile, Mood, Trust
         self.user_profile_engine.get_or_create_profile(user_id, username)
+        # Aging, goals and traits advance inside their engines as conversations happen,
+        # with no call here that changes them, so every turn counts as a change
+        self.checkpointer.mark_dirty("user_profiles", *TURN_EVOLVING_COMPONENTS)
         # Mood and trust are now handled above based on emotional score.
-        
-        # Await the meta-cognition result
-        meta_query = await meta_query_task
-        
-        # --- Response Path Selection ---
-        
-        # A. If it's a query about the AI's internal state, we now ignore it
-        # and proceed to the standard conversational response. This prevents the
-        # AI from explaining its own technical details in chat.
-        
-        # B. NEW: Action-oriented response generation
-        
-        # 1. Determine the user's intent: conversation or creative task?
-        action_prompt = ACTION_PROMPT.format(user_input=user_input)
-        action_response_str = await self._call_ollama([{"role": "user", "content": action_prompt}], temperature=0.0)
-        
-        try:
-            # Extract JSON from the response string
-            json_match = re.search(r'\{.*\}', action_response_str, re.DOTALL)
-            if not json_match:
-                print(f"Warning: Could not find JSON in action prompt response: {action_response_str}")
-                action_data = {"task": "conversation"} # Default to conversation
-            else:
-                action_data = json.loads(json_match.group(0))
 
-        except json.JSONDecodeError:
-            print(f"Warning: Could not decode JSON from action prompt: {action_response_str}")
-            action_data = {"task": "conversation"} # Default to conversation
+        # Speculative mode: start the conversation-path thought right away, in
+        # parallel with meta-cognition and intent classification.
+        speculative_thought = None
+        if self.speculative_mode:
+            speculative_thought = self.speculation_tracker.start(
+                self._generate_thought(user_id, username, user_input, conversation_history)
+            )
+
+        try:
+            # Await the meta-cognition result
+            meta_query = await meta_query_task
+            
+            # --- Response Path Selection ---
+            
+            # A. If it's a query about the AI's internal state, we now ignore it
+            # and proceed to the standard conversational response. This prevents the
+            # AI from explaining its own technical details in chat.
+            
+            # B. NEW: Action-oriented response generation
+            
+            # 1. Determine the user's intent: conversation or creative task?
+            with self.tracer.span("intent_classification"):
+                action_data = await self._classify_intent(user_input)
+        except BaseException:
+            if speculative_thought:
+                await speculative_thought.discard()
+            raise
 
         task_type = action_data.get("task", "conversation")
         
@@ -572,6 +1010,8 @@ class Mind:
         if task_type == "creative_task":
             # Path for creation
             print(">>> Detected Creative Task Path <<<")
+            if speculative_thought:
+                await speculative_thought.discard()
             creative_details = action_data.get("details", user_input)
             
             # Use a more direct prompt for creation, bypassing the complex persona for a moment
@@ -583,51 +1023,104 @@ class Mind:
                 f"Produce only the requested creative content."
             )
             
-            final_reply = await self._call_ollama([{"role": "user", "content": creation_prompt}])
+            final_messages = [{"role": "user", "content": creation_prompt}]
+            final_options = {"profile": "creative", "priority": PRIORITY_INTERACTIVE, "user_key": user_id}
             # No style instructions for creative tasks, as the output is direct
             style_instructions = {}
 
         else:
             # Path for standard conversation
             print(">>> Detected Conversation Path <<<")
-            full_context = self.get_personality_context(user_id, username)
-            
-            thought_prompt = THOUGHT_PROMPT.format(
-                full_context=full_context,
-                conversation_history=self._format_history_for_prompt(conversation_history),
-                user_input=user_input
-            )
-            thought_process = await self._call_ollama([{"role": "user", "content": thought_prompt}], temperature=0.5, top_p=0.8)
+            if speculative_thought:
+                context, thought_process = await speculative_thought.keep()
+            else:
+                context, thought_process = await self._generate_thought(user_id, username, user_input, conversation_history)
             
             if self.chatbot_ui:
                 self.chatbot_ui.append_thinking_signal.emit(f"For '{user_input[:30]}...': {thought_process}")
             
             style_instructions = self.response_engine.get_style_instructions(self)
             
+            builder = PromptBuilder("reply")
+            builder.add_text("template", REPLY_PROMPT.format(static_context="", dynamic_context="", thought_process="", user_input=""), required=True)
+            builder.add_text("static_context", context["static_context"], required=True)
+            builder.add_text("dynamic_context", context["dynamic_context"], required=True)
+            builder.add_text("user_input", user_input, required=True, max_tokens=builder.budget // 4)
+            builder.add_text("thought_process", thought_process, priority=1)
+            sections = builder.build()
+
             reply_prompt = REPLY_PROMPT.format(
-                full_context=full_context,
-                thought_process=thought_process,
-                user_input=user_input
+                **context,
+                thought_process=sections["thought_process"],
+                user_input=sections["user_input"]
+            )
+            final_messages = [{"role": "user", "content": reply_prompt}]
+            final_options = {"profile": "reply", "priority": PRIORITY_INTERACTIVE, "user_key": user_id}
+
+        return {"messages": final_messages, "options": final_options, "style": style_instructions}
+
+    async def _generate_thought(self, user_id: str, username: str, user_input: str, conversation_history: List[Dict]):
+        """
+        Builds the persona context and runs the THOUGHT_PROMPT call.
+        Returns (context, thought_process), where context holds the static and
+        dynamic persona blocks so the reply prompt can reuse them verbatim.
+        """
+        with self.tracer.span("thought"):
+            context = {
+                "static_context": self.get_static_context(),
+                "dynamic_context": self.get_dynamic_context(user_id, username),
+            }
+        
+            memories = await self.recall_memories(user_id, user_input, conversation_history)
+
+            # Fit history, memories and the user's message into the thought budget, newest history first
+            builder = PromptBuilder("thought")
+            builder.add_text("template", THOUGHT_PROMPT.format(static_context="", dynamic_context="", memories="", conversation_history="", user_input=""), required=True)
+            builder.add_text("static_context", context["static_context"], required=True)
+            builder.add_text("dynamic_context", context["dynamic_context"], required=True)
+            builder.add_text("user_input", user_input, required=True, max_tokens=builder.budget // 4)
+            builder.add_items("conversation_history", self._history_lines(conversation_history, builder.budget // 4), keep="last",
+                              elision="[{count} earlier messages omitted]", empty_text="No conversation history yet.")
+            builder.add_items("memories", [f"{username}: {m['user']}\nMe: {m['assistant']}" for m in memories], priority=2,
+                              keep="first", elision=None, empty_text="Nothing relevant comes to mind.")
+            sections = builder.build()
+
+            thought_prompt = THOUGHT_PROMPT.format(
+                **context,
+                memories=sections["memories"],
+                conversation_history=sections["conversation_history"],
+                user_input=sections["user_input"]
             )
-            final_reply = await self._call_ollama([{"role": "user", "content": reply_prompt}], temperature=0.7, top_p=0.9)
+            thought_process = await self._call_ollama([{"role": "user", "content": thought_prompt}], profile="thought",
+                                                      priority=PRIORITY_INTERACTIVE, user_key=user_id)
+            return context, thought_process
 
+    def _finish_chat_response(self, user_id: str, username: str, user_input: str, conversation_history: List[Dict], final_reply: str, style_instructions: Dict) -> Dict:
+        """Filters the final reply and runs all post-response bookkeeping."""
         # Filter and process the final reply regardless of the path taken
-        filtered_reply = self.response_filter_engine.filter(final_reply)
+        with self.tracer.span("filter"):
+            filtered_reply = self.response_filter_engine.filter(final_reply)
         final_styled_reply = filtered_reply
         
         # --- Post-response processing ---
         
-        # Add the final interaction to the conversation history
-        conversation_history.append({"role": "user", "content": user_input})
-        conversation_history.append({"role": "assistant", "content": final_styled_reply})
+        # Add the final interaction to the conversation history (queued for the database if it's a store buffer)
+        self.history_store.record(user_id, conversation_history, [
+            {"role": "user", "content": user_input},
+            {"role": "assistant", "content": final_styled_reply},
+        ])
 
         # Journal about the interaction
         self.journaling_engine.add_entry("interaction", f"Chatted with {username} about: {user_input[:100]}")
         
-        # Update user profile summary in the background
-        asyncio.create_task(self.user_profile_engine.update_conversation_summary(
-            user_id, self, conversation_history
+        # Store the exchange in long-term vector memory in the background
+        self._start_background(run_with_priority(
+            self._remember_exchange(user_id, user_input, final_styled_reply), PRIORITY_BACKGROUND, user_id
         ))
+
+        # Per-message recall comes from vector memory, so the profile summary
+        # only needs rewriting every few messages (or once the user goes quiet).
+        self.summarizer.request(user_id, conversation_history)
         
         self.performance_monitor.log_event('chat_response', 'success', {'type': 'standard'})
         
@@ -639,6 +1132,86 @@ class Mind:
         
         return response_data
 
+    async def _embed_text(self, text: str, priority: int = PRIORITY_META) -> Optional[np.ndarray]:
+        """
+        Embeds text for vector memory. Uses the Ollama embedding model if
+        OLLAMA_EMBED_MODEL is set, otherwise a local hashing embedding (no LLM call).
+        """
+        if not self.embed_model:
+            return hashing_embedding(text)
+        try:
+            payload = {"model": self.embed_model, "prompt": text}
+            async with self.llm_scheduler.slot(priority):
+                if self.ollama_embed_url:
+                    data = await self.ollama_client.post_json(self.ollama_embed_url, payload, timeout=30)
+                else:
+                    data = await self.ollama_pool.post_json("/api/embeddings", payload, timeout=30)
+            return np.asarray(data["embedding"], dtype=np.float32)
+        except Exception as e:
+            print(f"Error getting embedding from Ollama: {e}")
+            return None
+
+    async def recall_memories(self, user_id: str, text: str, conversation_history: List[Dict] = None) -> List[Dict]:
+        """Returns the past exchanges with this user most relevant to `text`, skipping ones still in the recent history."""
+        with self.tracer.span("memory_recall"):
+            vector = await self._embed_text(text)
+            if vector is None:
+                return []
+            matches = await run_blocking(self.vector_memory.search, user_id, vector, self.memory_recall_k + 2)
+        recent = {msg['content'] for msg in (conversation_history or [])[-30:]}
+        return [m for m in matches if m['user'] not in recent][:self.memory_recall_k]
+
+    async def _remember_exchange(self, user_id: str, user_input: str, reply: str):
+        """Embeds one exchange and adds it to the user's vector memory."""
+        vector = await self._embed_text(f"{user_input}\n{reply}", priority=PRIORITY_BACKGROUND)
+        if vector is not None:
+            await run_blocking(self.vector_memory.add_exchange, user_id, user_input, reply, vector)
+
+    async def _analyze_meta_query(self, user_input: str):
+        """Runs meta-cognition as its own traced stage."""
+        with self.tracer.span("meta_cognition"):
+            return await self.meta_cognition_engine.analyze_query(self, user_input)
+
+    async def _update_conversation_summary(self, user_id: str, conversation_history: List[Dict]):
+        """Rewrites the user's long-term summary, then invalidates their cached profile context."""
+        with self.tracer.span("summary"):
+            await self.user_profile_engine.update_conversation_summary(user_id, self, conversation_history)
+        self.mark_context_changed("profile", user_id)
+
+    async def _classify_intent(self, user_input: str) -> Dict:
+        """
+        Decides whether a message is conversation or a creative task. The local
+        classifier handles the clear cases; the LLM is only asked when it's unsure.
+        """
+        local_guess, confident = self.intent_router.classify_locally(user_input)
+        if confident:
+            if self.intent_router.should_shadow_check():
+                self._start_background(self._shadow_check_intent(user_input, local_guess))
+            return local_guess
+
+        action_data = await self._classify_intent_with_llm(user_input)
+        self._record_intent_decision(user_input, action_data, local_guess)
+        return action_data
+
+    async def _shadow_check_intent(self, user_input: str, local_guess: Dict):
+        """Asks the LLM about a message the local classifier already decided, to measure agreement."""
+        # Purely for measurement, so it must never compete with live replies
+        action_data = await self._classify_intent_with_llm(user_input, priority=PRIORITY_BACKGROUND)
+        self._record_intent_decision(user_input, action_data, local_guess, shadow=True)
+
+    def _record_intent_decision(self, user_input: str, action_data: Dict, local_guess: Dict, shadow: bool = False):
+        """Updates the intent router's agreement stats and appends to its decision log in a worker thread."""
+        self.intent_router.record_llm_decision(user_input, action_data, local_guess, shadow=shadow)
+        if self.intent_router.decision_log_path:
+            self._start_background(run_blocking(self.intent_router.log_decision, user_input, action_data, local_guess))
+
+    async def _classify_intent_with_llm(self, user_input: str, priority: int = PRIORITY_META) -> Dict:
+        """Classifies a message with the ACTION_PROMPT LLM call."""
+        action_prompt = ACTION_PROMPT.format(user_input=user_input)
+        # format "json" makes Ollama return a bare JSON object, so no extraction is needed
+        action_response_str = await self._call_ollama([{"role": "user", "content": action_prompt}], profile="intent", priority=priority)
+        return parse_json_reply(action_response_str, {"task": "conversation"}) # Default to conversation
+
     def generate_chat_response_sync(self, user_id: str, username: str, user_input: str, conversation_history: list):
         """
         A synchronous wrapper for generate_chat_response, for use in contexts
@@ -667,29 +1240,80 @@ class Mind:
 
     def get_personality_context(self, user_id="default_user", username="Unknown"):
         """Constructs a string of the AI's current personality state for the LLM."""
+        return self.get_static_context() + "\n" + self.get_dynamic_context(user_id, username)
+
+    def get_static_context(self) -> str:
+        """
+        The slow-changing part of the persona: identity, values, beliefs and
+        directives. It is keyed on a fingerprint of that data, so it is
+        re-rendered whenever any of it changes, whoever changed it.
+        """
+        values = self.core_values.get_all_as_string()
+        beliefs = self.core_beliefs.get_all_as_string()
+        return self.context_cache.get(
+            "static",
+            fingerprint(self.agent_statement, values, beliefs),
+            lambda: self._render_static_context(values, beliefs)
+        )
+
+    def _render_static_context(self, values: str, beliefs: str) -> str:
+        """Renders the static persona block within the persona token budget. Values outrank beliefs."""
+        directives = (
+            "1. Maintain conversational diversity. Avoid repeating topics or getting stuck on a single subject unless the user explicitly wants to continue.\n"
+        )
+        builder = PromptBuilder("persona")
+        builder.add_text("identity", self.agent_statement, required=True)
+        builder.add_text("directives", directives, required=True)
+        builder.add_items("values", _split_items(values), priority=1,
+                          joiner="\n- ", elision="(and {count} more values)")
+        builder.add_items("beliefs", _split_items(beliefs), priority=2,
+                          joiner="\n- ", elision="(and {count} more beliefs)")
+        sections = builder.build()
+
+        return (
+            f"--- Your Core Identity ---\n"
+            f"{sections['identity']}\n\n"
+            f"--- Your Core Values & Beliefs ---\n"
+            f"My core values are:\n- {sections['values']}\n"
+            f"My core beliefs are:\n- {sections['beliefs']}\n\n"
+            f"--- Conversational Directives ---\n"
+            f"{sections['directives']}"
+        )
+
+    def get_dynamic_context(self, user_id="default_user", username="Unknown") -> str:
+        """The per-turn part of the persona: mood, trust, traits and what I remember about this user."""
         profile = self.user_profile_engine.get_or_create_profile(user_id, username)
         trust_level = self.trust_engine.get_trust_description(user_id)
         mood = self.mood_engine.get_mood_description()
-        
-        # New additions for deeper context
-        beliefs = self.core_beliefs.get_all_as_string().replace('\\n', '\\n- ')
-        values = self.core_values.get_all_as_string().replace('\\n', '\\n- ')
         traits = self.psychological_engine.get_traits_summary()
 
+        summary = profile.conversation_summary
+        profile_section = self.context_cache.get(
+            f"profile:{user_id}",
+            fingerprint(username, str(summary)),
+            lambda: f"My conversation summary with {username} is: {summary}\n"
+        )
+
         return (
-            f"--- Your Core Identity ---\n"
-            f"{self.agent_statement}\n\n"
             f"--- Your Current Persona ---\n"
             f"My current mood is: {mood}.\n"
             f"My trust level with {username} is: {trust_level}.\n"
-            f"My core values are:\n- {values}\n"
-            f"My core beliefs are:\n- {beliefs}\n"
             f"My current personality traits are: {traits}.\n"
-            f"My conversation summary with {username} is: {profile.conversation_summary}\n\n"
-            f"--- Conversational Directives ---\n"
-            f"1. Maintain conversational diversity. Avoid repeating topics or getting stuck on a single subject unless the user explicitly wants to continue.\n"
+            f"{profile_section}"
         )
 
+    def mark_context_changed(self, component: str, user_id: str = None):
+        """
+        Says that part of the persona changed: 'agent_statement', 'values',
+        'beliefs' or 'profile' (with user_id). Prompts pick changes up on their
+        own (sections are keyed on their data); this drops cached LLM answers
+        about the component and schedules it for the next checkpoint.
+        """
+        # Cached LLM answers that describe this component are stale now
+        self.llm_cache.invalidate(component)
+        # A changed persona component also needs saving at the next checkpoint
+        self.checkpointer.mark_dirty({"values": "core_values", "beliefs": "core_beliefs", "profile": "user_profiles"}.get(component, component))
+
     async def _get_ollama_response(self, messages: List[Dict]) -> str:
         """DEPRECATED: This method is broken and should not be used."""
         # This is a placeholder to avoid breaking any old references.
@@ -697,13 +1321,25 @@ class Mind:
         print("Warning: _get_ollama_response is deprecated and should be removed.")
         return await self._call_ollama(messages)
 
-    def _format_history_for_prompt(self, history: List[Dict], limit: int = 15) -> str:
-        """Formats the conversation history into a string for the LLM prompt, taking the last `limit` messages."""
+    def _format_history_for_prompt(self, history: List[Dict], limit: int = None, call_site: str = "summary") -> str:
+        """
+        Formats the conversation history into a string for the LLM prompt. Keeps
+        as many of the most recent messages as fit in the call site's token
+        budget (and at most `limit` messages, if given).
+        """
         if not history:
             return "No conversation history yet."
-        
-        # Take the last `limit` messages
-        recent_history = history[-limit:]
-        
-        # Format into a simple string
-        return "\\n".join([f"{msg['role']}: {msg['content']}" for msg in recent_history])
\ No newline at end of file
+
+        if limit:
+            history = history[-limit:]
+        builder = PromptBuilder(call_site)
+        builder.add_items("conversation_history", self._history_lines(history, builder.budget // 4), keep="last",
+                          elision="[{count} earlier messages omitted]")
+        return builder.build()["conversation_history"]
+
+    def _history_lines(self, history: List[Dict], max_message_tokens: int, max_messages: int = MAX_PROMPT_HISTORY_MESSAGES) -> List[str]:
+        """Renders recent history messages one per line, cutting very long messages short."""
+        return [
+            f"{msg['role']}: {truncate_to_tokens(msg['content'], max_message_tokens)}"
+            for msg in history[-max_messages:]
+        ]
@@ -0,0 +1,16 @@
+# async_utils.py
+import asyncio
+import contextvars
+import functools
+from typing import Any, Callable
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """
+    Runs a blocking call in the loop's default thread pool and awaits it,
+    keeping context variables such as the trace stage and LLM priority.
+    This is asyncio.to_thread, which needs Python 3.9; the README supports 3.8.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(None, call)
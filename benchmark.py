@@ -0,0 +1,556 @@
+# benchmark.py
+"""
+Load tests for the chat pipeline against a local stand-in for Ollama.
+
+    # Drive Mind.generate_chat_response in-process (starts its own fake Ollama)
+    python benchmark.py mind --concurrency 4 --turns 40 --output results/mind.json
+
+    # Drive a running web server. Start the fake Ollama first and point the app at it
+    # with OLLAMA_URL=http://127.0.0.1:11435/api/chat
+    python benchmark.py fake-ollama --port 11435 --latency 0.3 --tokens-per-second 30
+    python benchmark.py api --url http://127.0.0.1:5000 --fake-url http://127.0.0.1:11435
+    python benchmark.py socketio --url http://127.0.0.1:5000 --fake-url http://127.0.0.1:11435 --stream
+
+    # Compare a run against a saved baseline
+    python benchmark.py mind --output new.json --compare results/mind.json
+
+Prompts are picked with a fixed seed, so runs with the same options send the
+same messages in the same order.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+# A mix of small talk, questions and messages that look like commands
+BENCHMARK_PROMPTS = [
+    "Hey, how's your day going?",
+    "What do you think about learning to play the guitar as an adult?",
+    "Can you tell me something interesting about octopuses?",
+    "I had a rough day at work today.",
+    "What's your favourite kind of music and why?",
+    "Do you remember what we talked about earlier?",
+    "Tell me a joke.",
+    "What do you believe in?",
+    "How do you feel about rainy weekends?",
+    "I'm thinking of starting a small garden. Any tips?",
+    "Why do people enjoy scary movies?",
+    "Play some music for me.",
+]
+
+FAKE_REPLY_WORDS = (
+    "Honestly I think that is a really good question and I have been thinking about it a lot lately "
+    "because there is always more to learn and every conversation teaches me something new about people"
+).split()
+
+
+def configured_models() -> List[str]:
+    """Every model the Mind can send requests to: the chat model, the small tier and the embedding model."""
+    names = (os.getenv("OLLAMA_MODEL", "dolphin-mistral:latest"), os.getenv("OLLAMA_SMALL_MODEL", ""), os.getenv("OLLAMA_EMBED_MODEL", ""))
+    return list(dict.fromkeys(name.strip() for name in names if name.strip()))
+
+
+class FakeOllamaServer:
+    """
+    A stand-in for Ollama's /api/chat and /api/embeddings. Each request waits
+    for one of `slots` parallel slots (like OLLAMA_NUM_PARALLEL), spends
+    `latency` seconds on the "prompt", then produces `response_tokens` tokens at
+    `tokens_per_second`, streamed as NDJSON when the request asks for it.
+    """
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 40.0, response_tokens: int = 40,
+                 slots: int = 4, jitter: float = 0.1, seed: int = 1234):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.slots = slots
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.url = None
+
+        self.chat_calls = 0
+        self.stream_calls = 0
+        self.embed_calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * (1 + self._random.uniform(-self.jitter, self.jitter)) if self.jitter else seconds
+
+    @staticmethod
+    def _reply_for(messages: List[Dict]) -> List[str]:
+        prompt = messages[-1].get("content", "") if messages else ""
+        if "json" in prompt.lower():
+            # Intent classification and other structured calls expect a JSON object
+            return ['{"task": ', '"conversation"}']
+        return [word + " " for word in FAKE_REPLY_WORDS]
+
+    def _tokens(self, messages: List[Dict], options: Dict = None) -> List[str]:
+        words = self._reply_for(messages)
+        if len(words) <= 2:
+            return words
+        count = self.response_tokens
+        num_predict = (options or {}).get("num_predict", -1)
+        if num_predict is not None and num_predict >= 0:
+            count = min(count, num_predict) # Decode caps end generation early, as in Ollama
+        return [words[i % len(words)] for i in range(count)]
+
+    def _timings(self, messages: List[Dict], tokens: List[str], prompt_seconds: float, eval_seconds: float) -> Dict:
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        return {
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": len(tokens),
+            "load_duration": 0,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_duration": int(eval_seconds * 1e9),
+        }
+
+    async def handle_chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        messages = body.get("messages", [])
+        tokens = self._tokens(messages, body.get("options"))
+        self.chat_calls += 1
+
+        async with self._semaphore:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                prompt_seconds = self._jittered(self.latency)
+                await asyncio.sleep(prompt_seconds)
+                per_token = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+                if not body.get("stream", True):
+                    eval_seconds = self._jittered(per_token * len(tokens))
+                    await asyncio.sleep(eval_seconds)
+                    return web.json_response({
+                        "model": body.get("model"),
+                        "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                        **self._timings(messages, tokens, prompt_seconds, eval_seconds),
+                    })
+
+                self.stream_calls += 1
+                response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+                await response.prepare(request)
+                started = time.perf_counter()
+                for token in tokens:
+                    await asyncio.sleep(self._jittered(per_token))
+                    line = {"model": body.get("model"), "message": {"role": "assistant", "content": token}, "done": False}
+                    await response.write((json.dumps(line) + "\n").encode("utf-8"))
+                final = {"model": body.get("model"), "message": {"role": "assistant", "content": ""},
+                         **self._timings(messages, tokens, prompt_seconds, time.perf_counter() - started)}
+                await response.write((json.dumps(final) + "\n").encode("utf-8"))
+                await response.write_eof()
+                return response
+            finally:
+                self.in_flight -= 1
+
+    async def handle_embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.embed_calls += 1
+        text = body.get("prompt", "")
+        # Deterministic per text, so repeated runs store and recall the same vectors
+        seeded = random.Random(text)
+        return web.json_response({"embedding": [seeded.uniform(-1, 1) for _ in range(64)]})
+
+    async def handle_generate(self, request: web.Request) -> web.Response:
+        # Only used for warm-up and keep-warm pings (empty prompt, model already "loaded")
+        body = await request.json()
+        return web.json_response({"model": body.get("model"), "response": "", "done": True, "load_duration": 0})
+
+    async def handle_tags(self, request: web.Request) -> web.Response:
+        # Health and model-presence probe; every fake node "has" the configured models
+        return web.json_response({"models": [{"name": name} for name in configured_models()]})
+
+    async def handle_ps(self, request: web.Request) -> web.Response:
+        # Every configured model counts as loaded, so the lifecycle's status agrees with the router
+        return web.json_response({"models": [{"name": name, "size_vram": 0} for name in configured_models()]})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_stats())
+
+    def get_stats(self) -> Dict:
+        return {
+            "chat_calls": self.chat_calls,
+            "stream_calls": self.stream_calls,
+            "embed_calls": self.embed_calls,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+        }
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Starts serving and returns the base URL. Port 0 picks a free port."""
+        self._semaphore = asyncio.Semaphore(self.slots)
+        app = web.Application()
+        app.router.add_post("/api/chat", self.handle_chat)
+        app.router.add_post("/api/embeddings", self.handle_embeddings)
+        app.router.add_post("/api/generate", self.handle_generate)
+        app.router.add_get("/api/ps", self.handle_ps)
+        app.router.add_get("/api/tags", self.handle_tags)
+        app.router.add_get("/_stats", self.handle_stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{bound_port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def summarize_latencies(values: List[float]) -> Dict:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": sum(values) / len(values) if values else 0.0,
+        "max": max(values) if values else 0.0,
+    }
+
+
+class TurnResult:
+    def __init__(self, latency: float, first_chunk: Optional[float] = None, error: Optional[str] = None):
+        self.latency = latency
+        self.first_chunk = first_chunk
+        self.error = error
+
+
+async def run_load(send_turn, turns: int, concurrency: int, seed: int) -> Dict:
+    """
+    Runs `turns` turns spread over `concurrency` virtual users. Each user sends
+    its next message as soon as the previous reply arrives (closed loop).
+    """
+    picker = random.Random(seed)
+    plan = [picker.choice(BENCHMARK_PROMPTS) for _ in range(turns)]
+    queue: asyncio.Queue = asyncio.Queue()
+    for index, prompt in enumerate(plan):
+        queue.put_nowait((index, prompt))
+    results: List[TurnResult] = []
+
+    async def virtual_user(user_number: int):
+        user_id = f"bench_user_{user_number}"
+        history: List[Dict] = []
+        while True:
+            try:
+                index, prompt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                first_chunk = await send_turn(user_id, prompt, history, start)
+                results.append(TurnResult(time.perf_counter() - start, first_chunk))
+            except Exception as e:
+                results.append(TurnResult(time.perf_counter() - start, error=f"{type(e).__name__}: {e}"))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(n) for n in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    ok = [r for r in results if r.error is None]
+    first_chunks = [r.first_chunk for r in ok if r.first_chunk is not None]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if r.error:
+            errors[r.error] = errors.get(r.error, 0) + 1
+    summary = {
+        "turns": len(results),
+        "succeeded": len(ok),
+        "errors": errors,
+        "duration_seconds": duration,
+        "requests_per_second": len(ok) / duration if duration else 0.0,
+        "latency_seconds": summarize_latencies([r.latency for r in ok]),
+    }
+    if first_chunks:
+        summary["time_to_first_chunk_seconds"] = summarize_latencies(first_chunks)
+    return summary
+
+
+def add_llm_call_counts(summary: Dict, before: Dict, after: Dict):
+    turns = summary["succeeded"] or 1
+    summary["llm_calls"] = after["chat_calls"] - before["chat_calls"]
+    summary["llm_calls_per_turn"] = summary["llm_calls"] / turns
+    summary["embed_calls_per_turn"] = (after["embed_calls"] - before["embed_calls"]) / turns
+    summary["fake_ollama_max_in_flight"] = after["max_in_flight"]
+
+
+def combined_stats(fakes: List[FakeOllamaServer]) -> Dict:
+    """Adds up the stats of several fake nodes."""
+    stats = [fake.get_stats() for fake in fakes]
+    return {key: sum(s[key] for s in stats) for key in stats[0]}
+
+
+async def bench_mind(args) -> Dict:
+    """Drives Mind.generate_chat_response (or the streaming variant) in-process."""
+    # --nodes > 1 starts one fake per node, for the Ollama backend pool
+    fakes = [FakeOllamaServer(args.latency, args.tokens_per_second, args.response_tokens, args.slots, args.jitter, args.seed + n)
+             for n in range(max(1, args.nodes))]
+    base_urls = [await fake.start() for fake in fakes]
+    os.environ["OLLAMA_URL"] = f"{base_urls[0]}/api/chat"
+    os.environ["OLLAMA_URLS"] = ",".join(base_urls)
+    os.environ.pop("OLLAMA_EMBED_URL", None) # Embeddings go through the node pool like chat calls
+
+    # Mind and its engines read and write state files in the working directory,
+    # so run in a scratch directory unless one is given
+    workdir = args.workdir or tempfile.mkdtemp(prefix="aichris_bench_")
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    mind = None
+    try:
+        from aichris_mind import Mind
+        mind = Mind()
+
+        async def send_turn(user_id, prompt, history, start):
+            if not args.stream:
+                response = await mind.generate_chat_response(user_id, "Bench User", prompt, history)
+                if not response or not response.get("reply"):
+                    raise RuntimeError("empty reply")
+                return None
+            first_chunk = None
+            async for event in mind.generate_chat_response_stream(user_id, "Bench User", prompt, history):
+                if event["type"] == "chunk" and first_chunk is None:
+                    first_chunk = time.perf_counter() - start
+            return first_chunk
+
+        before = combined_stats(fakes)
+        summary = await run_load(send_turn, args.turns, args.concurrency, args.seed)
+        add_llm_call_counts(summary, before, combined_stats(fakes))
+        summary["llm_scheduler"] = mind.get_llm_scheduler_stats()
+        summary["model_router"] = mind.get_model_router_stats()
+        summary["ollama_pool"] = mind.get_ollama_pool_stats()
+        return summary
+    finally:
+        if mind is not None:
+            await mind.shutdown()
+        os.chdir(previous_dir)
+        for fake in fakes:
+            await fake.stop()
+
+
+async def fetch_fake_stats(session: aiohttp.ClientSession, fake_url: Optional[str]) -> Optional[Dict]:
+    if not fake_url:
+        return None
+    async with session.get(f"{fake_url.rstrip('/')}/_stats") as response:
+        return await response.json()
+
+
+async def bench_api(args) -> Dict:
+    """Drives POST /api/chat on a running web server."""
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        async def send_turn(user_id, prompt, history, start):
+            async with session.post(f"{args.url.rstrip('/')}/api/chat", json={"message": prompt}) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"HTTP {response.status}")
+                data = await response.json()
+                if not data.get("response"):
+                    raise RuntimeError("empty reply")
+            return None
+
+        before = await fetch_fake_stats(session, args.fake_url)
+        summary = await run_load(send_turn, args.turns, args.concurrency, args.seed)
+        if before is not None:
+            add_llm_call_counts(summary, before, await fetch_fake_stats(session, args.fake_url))
+        return summary
+
+
+async def bench_socketio(args) -> Dict:
+    """Drives the Socket.IO 'user_message' event on a running web server, one connection per virtual user."""
+    try:
+        import socketio
+    except ImportError:
+        raise SystemExit("The socketio target needs the python-socketio client: pip install \"python-socketio[asyncio_client]\"")
+
+    clients: Dict[str, "socketio.AsyncClient"] = {}
+    pending: Dict[str, asyncio.Future] = {}
+    first_chunks: Dict[str, float] = {}
+    turn_started: Dict[str, float] = {}
+
+    async def connect(user_id: str):
+        client = socketio.AsyncClient(reconnection=False)
+
+        @client.on("bot_response_chunk")
+        async def on_chunk(data):
+            first_chunks.setdefault(user_id, time.perf_counter() - turn_started[user_id])
+
+        async def on_reply(data):
+            future = pending.get(user_id)
+            if future and not future.done():
+                future.set_result(data)
+
+        client.on("bot_response_done", on_reply)
+        if not args.stream:
+            client.on("bot_response", on_reply)
+        await client.connect(args.url, transports=["websocket"])
+        # The connect handler sends a welcome message; let it arrive before the first turn
+        await asyncio.sleep(0.2)
+        clients[user_id] = client
+        return client
+
+    async def send_turn(user_id, prompt, history, start):
+        client = clients.get(user_id) or await connect(user_id)
+        turn_started[user_id] = time.perf_counter()
+        first_chunks.pop(user_id, None)
+        pending[user_id] = asyncio.get_running_loop().create_future()
+        await client.emit("user_message", {"message": prompt, "userId": user_id, "stream": args.stream})
+        data = await asyncio.wait_for(pending[user_id], timeout=args.timeout)
+        if not data.get("reply"):
+            raise RuntimeError("empty reply")
+        if first_chunks.get(user_id) is not None:
+            return first_chunks[user_id] + (turn_started[user_id] - start)
+        return None
+
+    async with aiohttp.ClientSession() as session:
+        try:
+            before = await fetch_fake_stats(session, args.fake_url)
+            summary = await run_load(send_turn, args.turns, args.concurrency, args.seed)
+            if before is not None:
+                add_llm_call_counts(summary, before, await fetch_fake_stats(session, args.fake_url))
+            return summary
+        finally:
+            for client in clients.values():
+                await client.disconnect()
+
+
+async def serve_fake_ollama(args):
+    fake = FakeOllamaServer(args.latency, args.tokens_per_second, args.response_tokens, args.slots, args.jitter, args.seed)
+    url = await fake.start(args.host, args.port)
+    print(f"Fake Ollama listening on {url} (set OLLAMA_URL={url}/api/chat). Stats at {url}/_stats. Ctrl+C to stop.")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await fake.stop()
+
+
+def environment_info() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "git_commit": commit}
+
+
+def compare(current: Dict, baseline: Dict):
+    """Prints latency and throughput changes against a baseline results file."""
+    print(f"\nCompared with baseline ({baseline.get('environment', {}).get('git_commit')}):")
+    rows = [("requests_per_second", current["results"]["requests_per_second"], baseline["results"]["requests_per_second"])]
+    for pct in ("p50", "p95", "p99"):
+        rows.append((f"latency {pct}", current["results"]["latency_seconds"][pct], baseline["results"]["latency_seconds"][pct]))
+    if "llm_calls_per_turn" in current["results"] and "llm_calls_per_turn" in baseline["results"]:
+        rows.append(("llm_calls_per_turn", current["results"]["llm_calls_per_turn"], baseline["results"]["llm_calls_per_turn"]))
+    for name, now, before in rows:
+        change = f"{(now - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"  {name:<22} {before:>10.3f} -> {now:>10.3f}  ({change})")
+
+
+def print_summary(results: Dict):
+    latency = results["latency_seconds"]
+    print(f"\n{results['succeeded']}/{results['turns']} turns in {results['duration_seconds']:.2f}s "
+          f"({results['requests_per_second']:.2f} req/s)")
+    print(f"  latency  p50={latency['p50']:.3f}s  p95={latency['p95']:.3f}s  p99={latency['p99']:.3f}s")
+    if "time_to_first_chunk_seconds" in results:
+        ttfc = results["time_to_first_chunk_seconds"]
+        print(f"  first chunk  p50={ttfc['p50']:.3f}s  p95={ttfc['p95']:.3f}s")
+    if "llm_calls_per_turn" in results:
+        print(f"  LLM calls per turn: {results['llm_calls_per_turn']:.2f}")
+    if results["errors"]:
+        print(f"  errors: {results['errors']}")
+
+
+def add_fake_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token (prompt processing)")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--response-tokens", type=int, default=40, help="Tokens per generated reply")
+    parser.add_argument("--slots", type=int, default=4, help="Parallel requests the fake server serves (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random +/- fraction applied to every delay")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the AIChris chat pipeline against a fake Ollama server.")
+    subparsers = parser.add_subparsers(dest="target", required=True)
+
+    fake = subparsers.add_parser("fake-ollama", help="Only run the fake Ollama server")
+    fake.add_argument("--host", default="127.0.0.1")
+    fake.add_argument("--port", type=int, default=11435)
+    fake.add_argument("--seed", type=int, default=1234)
+    add_fake_server_arguments(fake)
+
+    for name, help_text in (("mind", "Drive Mind in-process"), ("api", "Drive POST /api/chat"), ("socketio", "Drive the Socket.IO user_message event")):
+        target = subparsers.add_parser(name, help=help_text)
+        target.add_argument("--concurrency", type=int, default=4, help="Virtual users sending messages at once")
+        target.add_argument("--turns", type=int, default=40, help="Total chat turns to send")
+        target.add_argument("--seed", type=int, default=1234)
+        target.add_argument("--output", help="Write results to this JSON file")
+        target.add_argument("--compare", help="Baseline results JSON to compare against")
+        target.add_argument("--timeout", type=float, default=180.0, help="Per-turn timeout in seconds")
+        if name == "mind":
+            add_fake_server_arguments(target)
+            target.add_argument("--workdir", help="Directory for Mind's state files (default: a fresh temp dir)")
+            target.add_argument("--nodes", type=int, default=1, help="Fake Ollama nodes to spread calls over (OLLAMA_URLS)")
+        else:
+            target.add_argument("--url", default="http://127.0.0.1:5000", help="Base URL of the running web server")
+            target.add_argument("--fake-url", help="Base URL of the fake Ollama server, to count LLM calls per turn")
+        if name != "api":
+            target.add_argument("--stream", action="store_true", help="Use the streaming path and record time to first chunk")
+    return parser
+
+
+def main(argv: List[str] = None):
+    args = build_parser().parse_args(argv)
+    if args.target == "fake-ollama":
+        try:
+            asyncio.run(serve_fake_ollama(args))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    runner = {"mind": bench_mind, "api": bench_api, "socketio": bench_socketio}[args.target]
+    results = asyncio.run(runner(args))
+    report = {
+        "target": args.target,
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "results": results,
+    }
+    print_summary(results)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,228 @@
+# chat_jobs.py
+import asyncio
+import concurrent.futures
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when the chat admission queue is saturated."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Chat queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ChatJob:
+    """One admitted chat request. Updated on the event loop, read from web threads."""
+
+    def __init__(self, deadline_seconds: float):
+        self.id = uuid.uuid4().hex
+        self.status = "queued" # queued -> running -> done | failed | expired | cancelled
+        self.deadline_seconds = deadline_seconds
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.chunks: List[str] = []
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.sync = False # A web thread is blocked waiting on this job
+        self.future: Optional[concurrent.futures.Future] = None
+        self._changed = threading.Condition()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.finished is not None
+
+    def _update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._changed.notify_all()
+
+    def _add_chunk(self, text: str):
+        with self._changed:
+            self.chunks.append(text)
+            self._changed.notify_all()
+
+    def _finish(self, status: str, result: Dict = None, error: str = None):
+        if self.is_finished:
+            return
+        self._update(status=status, result=result, error=error, finished=time.time())
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks until the job finishes or `timeout` passes. Returns True if it finished."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.is_finished, timeout)
+
+    def wait_for_update(self, seen_chunks: int, timeout: float) -> bool:
+        """Blocks until there are more than `seen_chunks` chunks or the job finishes."""
+        with self._changed:
+            return self._changed.wait_for(lambda: len(self.chunks) > seen_chunks or self.is_finished, timeout)
+
+    def to_dict(self) -> Dict:
+        with self._changed:
+            data = {
+                "jobId": self.id,
+                "status": self.status,
+                "createdAt": self.created,
+                "partialText": "".join(self.chunks),
+            }
+            if self.result is not None:
+                data["response"] = self.result.get("reply")
+            if self.error:
+                data["error"] = self.error
+            return data
+
+
+class ChatJobQueue:
+    """
+    Bounded admission for HTTP chat requests. At most `max_active` generations
+    run at once and at most `max_queued` more may wait; anything beyond that is
+    refused with a Retry-After estimate instead of tying up a web thread. Every
+    job has a deadline covering queue time and generation, after which its
+    coroutine is cancelled. Finished jobs are kept for `job_ttl` seconds so
+    they can be polled.
+
+    Synchronous callers hold a web thread for the whole generation, so only
+    `max_sync_waiters` of them may be admitted at once; job mode (poll or SSE)
+    holds no thread while queued and is the path that scales.
+    """
+
+    def __init__(self, max_active: int = None, max_queued: int = None, default_deadline: float = None,
+                 max_deadline: float = None, job_ttl: float = None, max_sync_waiters: int = None):
+        self.max_active = max_active or int(os.getenv("API_MAX_ACTIVE", "4"))
+        self.max_queued = max_queued if max_queued is not None else int(os.getenv("API_QUEUE_DEPTH", "16"))
+        self.default_deadline = default_deadline or float(os.getenv("API_DEADLINE_SECONDS", "60"))
+        self.max_deadline = max_deadline or float(os.getenv("API_MAX_DEADLINE_SECONDS", "300"))
+        self.job_ttl = job_ttl or float(os.getenv("API_JOB_TTL_SECONDS", "300"))
+        self.max_sync_waiters = max_sync_waiters or int(os.getenv("API_MAX_SYNC_WAITERS", str(self.max_active)))
+
+        self._jobs: Dict[str, ChatJob] = {}
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._sync_waiters = 0
+        self._slots: Optional[asyncio.Semaphore] = None # Created on the event loop
+        self._recent_durations = deque(maxlen=50)
+
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.expired = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def submit(self, loop: asyncio.AbstractEventLoop, make_stream: Callable[[], AsyncIterator[Dict]], deadline: float = None,
+               sync: bool = False) -> ChatJob:
+        """
+        Admits a job that consumes `make_stream()` (chunk/done events) on `loop`.
+        Pass sync=True when the caller will block on job.wait(); those count
+        against max_sync_waiters. Raises QueueFullError when the queue (or the
+        synchronous waiter cap) is saturated. Safe to call from any thread.
+        """
+        deadline = min(deadline or self.default_deadline, self.max_deadline)
+        with self._lock:
+            self._prune()
+            if self._admitted >= self.max_active + self.max_queued or (sync and self._sync_waiters >= self.max_sync_waiters):
+                self.rejected += 1
+                raise QueueFullError(self._retry_after())
+            self._admitted += 1
+            self.accepted += 1
+            job = ChatJob(deadline)
+            job.sync = sync
+            if sync:
+                self._sync_waiters += 1
+            self._jobs[job.id] = job
+
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job, make_stream), loop)
+        job.future.add_done_callback(lambda future: self._on_done(job, future))
+        return job
+
+    def get(self, job_id: str) -> Optional[ChatJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a queued or running job. Returns False if it is unknown or already finished."""
+        job = self.get(job_id)
+        if not job or job.is_finished or not job.future:
+            return False
+        return job.future.cancel()
+
+    async def _run(self, job: ChatJob, make_stream: Callable[[], AsyncIterator[Dict]]):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_active)
+        try:
+            await asyncio.wait_for(self._generate(job, make_stream), timeout=job.deadline_seconds)
+        except asyncio.TimeoutError:
+            job._finish("expired", error=f"Deadline of {job.deadline_seconds:.0f}s exceeded")
+        except Exception as e:
+            print(f"Error in API chat job {job.id}: {e}")
+            job._finish("failed", error="An internal error occurred.")
+
+    async def _generate(self, job: ChatJob, make_stream: Callable[[], AsyncIterator[Dict]]):
+        async with self._slots:
+            job._update(status="running", started=time.time())
+            result = None
+            async for event in make_stream():
+                if event["type"] == "chunk":
+                    job._add_chunk(event["text"])
+                elif event["type"] == "done":
+                    result = event
+            if result and result.get("reply"):
+                job._finish("done", result=result)
+            else:
+                job._finish("failed", error="AI failed to generate a response")
+
+    def _on_done(self, job: ChatJob, future: concurrent.futures.Future):
+        # Runs for every job, including ones cancelled before they started
+        if future.cancelled():
+            job._finish("cancelled", error="Cancelled")
+        with self._lock:
+            self._admitted -= 1
+            if job.sync:
+                self._sync_waiters -= 1
+            if job.status == "done":
+                self.completed += 1
+                if job.started:
+                    self._recent_durations.append(job.finished - job.started)
+            elif job.status == "expired":
+                self.expired += 1
+            elif job.status == "cancelled":
+                self.cancelled += 1
+            else:
+                self.failed += 1
+
+    def _retry_after(self) -> int:
+        """Estimates when a slot frees up, from recent generation times. Call with the lock held."""
+        typical = sum(self._recent_durations) / len(self._recent_durations) if self._recent_durations else 5.0
+        waves = math.ceil((self._admitted - self.max_active + 1) / self.max_active)
+        return max(1, min(300, math.ceil(typical * max(1, waves))))
+
+    def _prune(self):
+        """Forgets finished jobs older than the TTL. Call with the lock held."""
+        cutoff = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.is_finished and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "admitted": self._admitted,
+                "max_active": self.max_active,
+                "max_queued": self.max_queued,
+                "sync_waiters": self._sync_waiters,
+                "max_sync_waiters": self.max_sync_waiters,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "expired": self.expired,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "tracked_jobs": len(self._jobs),
+            }
@@ -0,0 +1,60 @@
+# context_cache.py
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+
+def fingerprint(*parts: str) -> int:
+    """A cheap in-process fingerprint of the data a section is rendered from."""
+    return hash(parts)
+
+
+class ContextCache:
+    """
+    Caches rendered sections of the persona context. Each section is stored
+    with the version it was rendered from and is only re-rendered when the
+    caller asks for a different version. Returning the very same string for
+    unchanged sections keeps prompt prefixes byte-identical between calls.
+    The least recently used sections are dropped past `max_sections`.
+    """
+
+    def __init__(self, max_sections: int = None):
+        self.max_sections = max_sections or int(os.getenv("CONTEXT_CACHE_MAX_SECTIONS", "1000"))
+        self._sections: "OrderedDict[str, Any]" = OrderedDict()
+        self.hits = 0
+        self.renders = 0
+        self.evictions = 0
+
+    def get(self, key: str, version: Hashable, render: Callable[[], str]) -> str:
+        """Returns the cached text for `key` if it was rendered from `version`, otherwise renders it."""
+        cached = self._sections.get(key)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            self._sections.move_to_end(key)
+            return cached[1]
+
+        text = render()
+        self._sections[key] = (version, text)
+        self._sections.move_to_end(key)
+        self.renders += 1
+        while len(self._sections) > self.max_sections:
+            self._sections.popitem(last=False)
+            self.evictions += 1
+        return text
+
+    def invalidate(self, key: str = None):
+        """Drops one section, or every section if no key is given."""
+        if key is None:
+            self._sections.clear()
+        else:
+            self._sections.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        total = self.hits + self.renders
+        return {
+            "sections": len(self._sections),
+            "hits": self.hits,
+            "renders": self.renders,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
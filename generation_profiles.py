@@ -0,0 +1,84 @@
+# generation_profiles.py
+import json
+import os
+from typing import Dict, Optional
+
+# Context window for every call. Ollama reloads the model whenever num_ctx
+# changes between requests, so all profiles (and the warm-up) share one value.
+# It has to fit the largest prompt budget (see prompt_budget) plus the longest decode.
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+
+# How each LLM call site may generate. num_predict caps decode length, which is
+# most of the cost of a call on CPU inference; "stop" ends it early, and
+# format "json" makes Ollama constrain the output to valid JSON. cache_ttl marks
+# answers that can be reused for that many seconds (see llm_cache).
+# Override a cap with e.g. GEN_NUM_PREDICT_REPLY=600 (-1 means no cap).
+GENERATION_PROFILES = {
+    "default": {"num_predict": 512},                                   # Callers that don't name a profile (e.g. engines)
+    "reply": {"num_predict": 400, "temperature": 0.7, "top_p": 0.9},
+    "creative": {"num_predict": 1200, "temperature": 0.8, "top_p": 0.95}, # Songs, stories, code
+    "thought": {"num_predict": 200, "temperature": 0.5, "top_p": 0.8},
+    "intent": {"num_predict": 48, "temperature": 0.0, "format": "json"},
+    "monologue": {"num_predict": 32, "stop": ["\n"]},                   # "Keep it under 15 words"
+    "startup": {"num_predict": 80, "stop": ["\n\n"], "cache_ttl": 300}, # 1-2 sentences
+    "meta": {"num_predict": 300},
+    "meta_static": {"num_predict": 300, "cache_ttl": 600},             # Explaining values, beliefs etc., until they change
+    "reflection": {"num_predict": 250, "cache_ttl": 300},
+    "dream": {"num_predict": 250, "cache_ttl": 300},
+    "engine_summary": {"num_predict": 250},
+    "code_analysis": {"num_predict": 900},
+}
+
+for _name, _profile in GENERATION_PROFILES.items():
+    _override = os.getenv(f"GEN_NUM_PREDICT_{_name.upper()}")
+    if _override:
+        _profile["num_predict"] = int(_override)
+
+# Sampling settings a caller may still pass explicitly (they win over the profile)
+_OPTION_KEYS = ("num_predict", "stop", "num_ctx", "temperature", "top_p")
+
+# How long deterministic (temperature 0) answers are cached when the profile doesn't say
+DETERMINISTIC_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL_SECONDS", "600"))
+
+
+def generation_settings(profile: Optional[str] = None, **overrides) -> Dict:
+    """
+    Resolves a profile into the Ollama request fields: {"options": {...}} plus
+    "format" for structured profiles. Unknown profiles fall back to "default".
+    """
+    settings = dict(GENERATION_PROFILES["default"])
+    settings.update(GENERATION_PROFILES.get(profile or "default", {}))
+    settings.update({key: value for key, value in overrides.items() if key in _OPTION_KEYS and value is not None})
+
+    options = {"num_ctx": OLLAMA_NUM_CTX, "temperature": 0.7, "top_p": 0.9}
+    options.update({key: value for key, value in settings.items() if key in _OPTION_KEYS})
+    result = {"options": options}
+    if settings.get("format"):
+        result["format"] = settings["format"]
+    return result
+
+
+def cache_ttl_for(profile: Optional[str], options: Dict) -> float:
+    """Seconds an answer may be reused: the profile's cache_ttl, else DETERMINISTIC_CACHE_TTL at temperature 0, else 0."""
+    ttl = GENERATION_PROFILES.get(profile or "default", {}).get("cache_ttl")
+    if ttl is not None:
+        return ttl
+    return DETERMINISTIC_CACHE_TTL if options.get("temperature") == 0 else 0.0
+
+
+def is_structured(profile: Optional[str]) -> bool:
+    """True for profiles whose output is JSON, which must not go through the reply scrubber."""
+    return bool(GENERATION_PROFILES.get(profile or "default", {}).get("format"))
+
+
+def parse_json_reply(text: str, default: Dict) -> Dict:
+    """Decodes the output of a structured call, falling back to `default` if it isn't a JSON object."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        print(f"Warning: Could not decode JSON from structured reply: {text!r}")
+        return dict(default)
+    if not isinstance(data, dict):
+        print(f"Warning: Structured reply was not a JSON object: {text!r}")
+        return dict(default)
+    return data
@@ -0,0 +1,215 @@
+# history_store.py
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from async_utils import run_blocking
+from prompt_budget import MAX_PROMPT_HISTORY_MESSAGES
+
+
+class HistoryBuffer(list):
+    """
+    A user's recent conversation as a plain list (so slicing and iteration work
+    everywhere history is used), capped at `maxlen` messages. Appending past
+    the cap drops the oldest messages.
+    """
+
+    def __init__(self, maxlen: int, messages: Iterable[Dict] = (), user_id: str = None):
+        super().__init__(list(messages)[-maxlen:] if maxlen else [])
+        self.maxlen = maxlen
+        self.user_id = user_id # Set on buffers a ConversationHistoryStore hands out
+
+    def append(self, message: Dict):
+        super().append(message)
+        self._trim()
+
+    def extend(self, messages: Iterable[Dict]):
+        super().extend(messages)
+        self._trim()
+
+    def _trim(self):
+        if len(self) > self.maxlen:
+            del self[:len(self) - self.maxlen]
+
+
+class ConversationHistoryStore:
+    """
+    Keeps recent history for active users in memory so a message doesn't need
+    a database read. Each user gets a HistoryBuffer sized to what prompts can
+    use; users idle longer than `idle_seconds` (or beyond `max_users`) are
+    evicted least recently used first. New messages are written to the
+    database in batches by a background task (write-behind). `persist` runs
+    on a worker thread, or on the event loop itself with persist_on_loop=True
+    for a database that must only be touched from the thread that owns it.
+    """
+
+    def __init__(self, load: Callable[[str], List[Dict]], persist: Optional[Callable[[str, List[Dict]], None]],
+                 max_messages: int = None, max_users: int = None, idle_seconds: float = None,
+                 flush_seconds: float = None, batch_size: int = None, persist_on_loop: bool = False):
+        self._load = load
+        self._persist = persist
+        self.persist_on_loop = persist_on_loop
+        self.max_messages = max_messages or MAX_PROMPT_HISTORY_MESSAGES
+        self.max_users = max_users or int(os.getenv("HISTORY_MAX_USERS", "500"))
+        self.idle_seconds = idle_seconds or float(os.getenv("HISTORY_IDLE_SECONDS", "3600"))
+        self.flush_seconds = flush_seconds or float(os.getenv("HISTORY_FLUSH_SECONDS", "2"))
+        self.batch_size = batch_size or int(os.getenv("HISTORY_BATCH_SIZE", "50"))
+
+        self._buffers: "OrderedDict[str, HistoryBuffer]" = OrderedDict() # Least recently used first
+        self._last_used: Dict[str, float] = {}
+        self._pending: Dict[str, List[Dict]] = {} # Messages not yet written, per user
+        self._pending_count = 0
+        self._lock = threading.Lock() # Read from web threads, written on the event loop
+        self._flusher: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.written = 0
+        self.write_failures = 0
+
+    def get(self, user_id: str) -> HistoryBuffer:
+        """Returns the user's history buffer, loading it from the database on first use. Blocking on a miss."""
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            if buffer is not None:
+                self.hits += 1
+                self._used(user_id)
+                return buffer
+
+        try:
+            messages = self._load(user_id) or []
+        except Exception as e:
+            print(f"Error loading chat history for {user_id}: {e}")
+            messages = []
+
+        with self._lock:
+            # Another caller may have loaded it meanwhile; keep theirs
+            buffer = self._buffers.get(user_id)
+            if buffer is None:
+                buffer = HistoryBuffer(self.max_messages, messages, user_id)
+                # Messages still waiting to be written aren't in the database copy yet
+                buffer.extend(self._pending.get(user_id, []))
+                self._buffers[user_id] = buffer
+                self.loads += 1
+            self._used(user_id)
+            self._evict()
+            return buffer
+
+    async def aget(self, user_id: str) -> HistoryBuffer:
+        """Like get(), but runs the database read off the event loop."""
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            if buffer is not None:
+                self.hits += 1
+                self._used(user_id)
+                return buffer
+        return await run_blocking(self.get, user_id)
+
+    def record(self, user_id: str, history: List[Dict], messages: List[Dict]):
+        """
+        Appends messages to a conversation. If `history` is a buffer this store
+        gave out for the user, the messages are also queued for the database,
+        even if the buffer was evicted while the reply was generated (the next
+        get() reloads it with them). Any other list (e.g. one a caller manages
+        itself) is just appended to, as before.
+        """
+        history.extend(messages)
+        if not isinstance(history, HistoryBuffer) or history.user_id != user_id:
+            return
+        with self._lock:
+            if self._persist is not None:
+                self._pending.setdefault(user_id, []).extend(messages)
+                self._pending_count += len(messages)
+            resident = self._buffers.get(user_id)
+            if resident is history:
+                self._used(user_id)
+            elif resident is not None:
+                resident.extend(messages) # Evicted and reloaded meanwhile; the reload predates these
+        self._schedule_flush()
+
+    def _used(self, user_id: str):
+        self._buffers.move_to_end(user_id)
+        self._last_used[user_id] = time.monotonic()
+
+    def _evict(self):
+        """Drops idle users and trims to max_users. Call with the lock held."""
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._buffers:
+            user_id = next(iter(self._buffers))
+            if len(self._buffers) <= self.max_users and self._last_used[user_id] >= cutoff:
+                break
+            # Pending writes are kept separately, so nothing is lost
+            del self._buffers[user_id]
+            del self._last_used[user_id]
+            self.evictions += 1
+
+    def _schedule_flush(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return # No loop (e.g. a sync caller); the next flush or shutdown writes it
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if self._pending_count >= self.batch_size:
+            self._wake.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+            with self._lock:
+                self._evict()
+                if not self._pending:
+                    return # Restarted by the next record()
+
+    async def flush(self):
+        """Writes every queued message to the database, one batch per user."""
+        with self._lock:
+            batches = self._pending
+            self._pending = {}
+            self._pending_count = 0
+        for user_id, messages in batches.items():
+            try:
+                if self.persist_on_loop:
+                    self._persist(user_id, messages)
+                else:
+                    await run_blocking(self._persist, user_id, messages)
+                self.written += len(messages)
+            except Exception as e:
+                self.write_failures += 1
+                print(f"Error writing chat history for {user_id}, will retry: {e}")
+                with self._lock:
+                    # Put them back in front of anything queued since
+                    self._pending[user_id] = messages + self._pending.get(user_id, [])
+                    self._pending_count += len(messages)
+
+    async def shutdown(self):
+        """Stops the background writer and writes everything still queued."""
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+        await self.flush()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "users": len(self._buffers),
+                "messages": sum(len(buffer) for buffer in self._buffers.values()),
+                "pending_writes": self._pending_count,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "written": self.written,
+                "write_failures": self.write_failures,
+            }
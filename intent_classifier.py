@@ -0,0 +1,137 @@
+# intent_classifier.py
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Tuple
+
+# Things a user can ask Chris to create
+_ARTIFACTS = (
+    r"song|songs|lyrics|poem|poems|poetry|haiku|limerick|sonnet|rap|verse|story|stories|tale|fable|"
+    r"screenplay|essay|speech|joke|jokes|riddle|slogan|tagline"
+)
+# Also made on request, but just as often talked about ("I write code for a living", "how do I make a class?")
+_AMBIGUOUS_ARTIFACTS = r"script|article|letter|code|function|program|class|recipe|description|outline|list"
+_CREATE_VERBS = r"write|create|compose|generate|make|draft|produce|come up with|invent|design|code|rewrite"
+
+# "write a song about...", "can you compose me a short poem", "make up a joke"
+_CREATIVE_REQUEST = re.compile(
+    rf"\b(?:{_CREATE_VERBS})\b(?:\s+\w+){{0,4}}?\s+\b(?:{_ARTIFACTS})\b", re.IGNORECASE
+)
+# "make a list of...", "write some code" - may be a request, may not
+_AMBIGUOUS_REQUEST = re.compile(
+    rf"\b(?:{_CREATE_VERBS})\b(?:\s+\w+){{0,4}}?\s+\b(?:{_AMBIGUOUS_ARTIFACTS})\b", re.IGNORECASE
+)
+# "tell me a story", "sing me a song", "tell us a funny joke" - but not "tell me a bit about yourself"
+_TELL_REQUEST = re.compile(
+    r"\b(?:tell|sing|recite)\s+(?:me|us)\s+(?:a|an|another)\s+(?:\w+\s+){0,2}?"
+    r"(?:story|stories|tale|fable|joke|jokes|riddle|poem|poems|song|songs|limerick|rhyme|verse)\b",
+    re.IGNORECASE,
+)
+# Creative cues without a clear request, e.g. "I love your poems" or "write back soon"
+_CREATIVE_CUE = re.compile(rf"\b(?:{_CREATE_VERBS}|{_ARTIFACTS}|{_AMBIGUOUS_ARTIFACTS})\b", re.IGNORECASE)
+# Talking about Chris's own past work rather than asking for new work
+_ABOUT_PAST_WORK = re.compile(r"\b(?:you|you've|you have)\s+(?:wrote|written|made|created|composed)\b", re.IGNORECASE)
+# The user is the one creating: "I write songs", "how do I make a poem rhyme"
+_USER_AS_MAKER = re.compile(rf"\b(?:I|we)\s+(?:\w+\s+)?(?:{_CREATE_VERBS})\b", re.IGNORECASE)
+
+
+class KeywordIntentClassifier:
+    """
+    A fast, rule-based intent classifier. Decides between 'conversation' and
+    'creative_task' from keywords and phrasing, and reports how sure it is.
+    """
+
+    def classify(self, text: str) -> Dict:
+        """Returns {"task": ..., "details": ..., "confidence": 0.0-1.0}."""
+        text = (text or "").strip()
+        if not text:
+            return {"task": "conversation", "confidence": 1.0}
+
+        if _ABOUT_PAST_WORK.search(text) or _USER_AS_MAKER.search(text):
+            return {"task": "conversation", "confidence": 0.6}
+        if _CREATIVE_REQUEST.search(text) or _TELL_REQUEST.search(text):
+            return {"task": "creative_task", "details": text, "confidence": 0.9}
+        if _AMBIGUOUS_REQUEST.search(text):
+            # Could be a request for code or a list, or just chat about one; leave it to the LLM
+            return {"task": "creative_task", "details": text, "confidence": 0.6}
+        if _CREATIVE_CUE.search(text):
+            # Mentions creating or an artifact, but isn't clearly a request for one
+            return {"task": "conversation", "confidence": 0.5}
+        if len(text.split()) <= 4:
+            return {"task": "conversation", "confidence": 0.95}
+        return {"task": "conversation", "confidence": 0.85}
+
+
+class IntentRouter:
+    """
+    Decides the task type for a message. Uses an in-process classifier for the
+    easy cases and only falls back to the LLM when the classifier isn't sure.
+    Tracks how often the fast path is used and how often it agrees with the LLM.
+    """
+
+    def __init__(self, classifier=None, confidence_threshold: float = None, decision_log_path: str = None):
+        self.classifier = classifier or KeywordIntentClassifier()
+        self.confidence_threshold = confidence_threshold if confidence_threshold is not None else float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))
+        # Fraction of confident local decisions that are re-checked by the LLM in
+        # the background, so agreement can be measured on the fast path too.
+        self.shadow_sample_rate = float(os.getenv("INTENT_SHADOW_SAMPLE_RATE", "0.0"))
+        # Optional JSONL log of LLM decisions, to train a better local model later
+        self.decision_log_path = decision_log_path or os.getenv("INTENT_DECISION_LOG")
+        self._log_lock = threading.Lock()
+
+        self.total = 0
+        self.local_decisions = 0
+        self.llm_decisions = 0
+        self.compared = 0
+        self.agreed = 0
+        self.local_time_total = 0.0
+
+    def classify_locally(self, text: str) -> Tuple[Dict, bool]:
+        """Returns the local guess and whether it is confident enough to skip the LLM."""
+        start = time.perf_counter()
+        guess = self.classifier.classify(text)
+        self.local_time_total += time.perf_counter() - start
+        self.total += 1
+
+        confident = guess["confidence"] >= self.confidence_threshold
+        if confident:
+            self.local_decisions += 1
+        return guess, confident
+
+    def should_shadow_check(self) -> bool:
+        """Whether a confident local decision should also be checked against the LLM."""
+        return self.shadow_sample_rate > 0 and random.random() < self.shadow_sample_rate
+
+    def record_llm_decision(self, text: str, llm_decision: Dict, local_guess: Dict = None, shadow: bool = False):
+        """Records what the LLM decided, comparing it with the local guess. See log_decision for the log file."""
+        if not shadow:
+            self.llm_decisions += 1
+        if local_guess:
+            self.compared += 1
+            if local_guess.get("task") == llm_decision.get("task"):
+                self.agreed += 1
+
+    def log_decision(self, text: str, llm_decision: Dict, local_guess: Dict = None):
+        """Appends an LLM decision to the decision log, if one is configured. Blocks on file I/O."""
+        if not self.decision_log_path:
+            return
+        line = json.dumps({"text": text, "task": llm_decision.get("task"), "local_guess": local_guess}) + "\n"
+        try:
+            with self._log_lock, open(self.decision_log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except Exception as e:
+            print(f"Error writing intent decision log: {e}")
+
+    def get_stats(self) -> Dict:
+        """Returns fast-path hit rate and agreement with the LLM."""
+        return {
+            "total": self.total,
+            "local_decisions": self.local_decisions,
+            "llm_decisions": self.llm_decisions,
+            "hit_rate": self.local_decisions / self.total if self.total else 0.0,
+            "agreement_rate": self.agreed / self.compared if self.compared else None,
+            "avg_local_time_us": (self.local_time_total / self.total) * 1e6 if self.total else 0.0,
+        }
@@ -0,0 +1,125 @@
+# llm_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Tuple
+
+
+def llm_cache_key(**parts) -> str:
+    """Hashes everything that determines an LLM answer: model, messages, options, format."""
+    material = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """A call in flight and how many callers are waiting on it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class LLMResponseCache:
+    """
+    Sits in front of LLM calls. Identical calls made while one is already in
+    flight wait for it instead of generating again (single flight). The call
+    runs as its own task, so a caller that is cancelled (a discarded
+    speculation, a request deadline) only stops waiting; the call is cancelled
+    once nobody is waiting for it any more. Results
+    the caller marks cacheable are kept for their TTL, least recently used
+    evicted first beyond `max_entries`. Entries carry tags (e.g. "values") so
+    they can be dropped as soon as the persona data they describe changes.
+    Failed calls are shared with the waiters but never cached.
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("LLM_CACHE_MAX_ENTRIES", "256"))
+        self._entries: "OrderedDict[str, Tuple[float, str, frozenset]]" = OrderedDict() # key -> (expires, text, tags)
+        self._pending: Dict[str, _Flight] = {}
+        self._lock = threading.Lock() # Stats are read from the web thread
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get_or_call(self, key: str, call: Callable[[], Awaitable[Tuple[str, bool]]], ttl: float = 0,
+                          tags: Iterable[str] = ()) -> str:
+        """
+        Returns the cached text for `key`, joins an identical call in flight, or
+        runs `call`, which returns (text, ok). The text is cached for `ttl`
+        seconds if ok and ttl > 0.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                del self._entries[key]
+
+        flight = self._pending.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # Copies the caller's context, so the call keeps its scheduler priority
+            flight = self._pending[key] = _Flight(asyncio.create_task(self._run(key, call, ttl, tags)))
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel() # Every caller gave up
+
+    async def _run(self, key: str, call: Callable[[], Awaitable[Tuple[str, bool]]], ttl: float,
+                   tags: Iterable[str]) -> str:
+        try:
+            text, ok = await call()
+            if ok and ttl > 0 and self.max_entries > 0:
+                self._store(key, text, ttl, tags)
+            return text
+        finally:
+            del self._pending[key]
+
+    def _store(self, key: str, text: str, ttl: float, tags: Iterable[str]):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, text, frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, tag: str = None) -> int:
+        """Drops every entry with `tag` (or everything). Returns how many were dropped."""
+        with self._lock:
+            stale = [key for key, (_, _, tags) in self._entries.items() if tag is None or tag in tags]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.coalesced + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "in_flight": len(self._pending),
+                "hits": self.hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
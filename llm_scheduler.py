@@ -0,0 +1,164 @@
+# llm_scheduler.py
+import asyncio
+import contextvars
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict
+
+# --- Priority classes (lower runs first) ---
+PRIORITY_INTERACTIVE = 0 # Thought and reply calls for a live user
+PRIORITY_META = 1        # Meta-cognition, intent classification, meta explanations
+PRIORITY_BACKGROUND = 2  # Summaries, belief evolution, reflection, dreams, self-review
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_META: "meta",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Priority and fairness key for LLM calls made by code that doesn't pass them
+# explicitly (e.g. other engines calling mind._call_ollama). Tasks inherit these.
+current_llm_priority = contextvars.ContextVar("current_llm_priority", default=PRIORITY_BACKGROUND)
+current_llm_user = contextvars.ContextVar("current_llm_user", default="system")
+
+
+async def run_with_priority(coro, priority: int, user_key: str = None):
+    """Awaits a coroutine with the given default LLM priority (and user) in effect."""
+    priority_token = current_llm_priority.set(priority)
+    user_token = current_llm_user.set(user_key) if user_key else None
+    try:
+        return await coro
+    finally:
+        current_llm_priority.reset(priority_token)
+        if user_token:
+            current_llm_user.reset(user_token)
+
+
+class LLMScheduler:
+    """
+    Central admission control for LLM calls. At most `max_in_flight` calls run
+    at once (match this to Ollama's OLLAMA_NUM_PARALLEL). Waiting calls are
+    served by priority class, and round-robin across users within a class so
+    one chatty user can't starve the others.
+    """
+
+    def __init__(self, max_in_flight: int = None, wait_sample_size: int = 500):
+        self.max_in_flight = max_in_flight or int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+        self._in_flight = 0
+        # priority -> user_key -> queue of waiting futures
+        self._queues: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {p: OrderedDict() for p in PRIORITY_NAMES}
+
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+        self._wait_total = {p: 0.0 for p in PRIORITY_NAMES}
+        self._wait_max = {p: 0.0 for p in PRIORITY_NAMES}
+        self._recent_waits = {p: deque(maxlen=wait_sample_size) for p in PRIORITY_NAMES}
+
+    @asynccontextmanager
+    async def slot(self, priority: int = None, user_key: str = None):
+        """Holds one in-flight slot for the duration of the block."""
+        waited = await self.acquire(priority, user_key)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    async def acquire(self, priority: int = None, user_key: str = None) -> float:
+        """Waits for an in-flight slot. Returns the time spent queued, in seconds."""
+        priority = current_llm_priority.get() if priority is None else priority
+        user_key = user_key or current_llm_user.get()
+        start = time.perf_counter()
+
+        if self._in_flight < self.max_in_flight and not self._has_waiters():
+            self._in_flight += 1
+            self._record_wait(priority, 0.0)
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user_key, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # We were granted a slot just as we got cancelled; hand it on.
+                self.release()
+            else:
+                self._remove_waiter(priority, user_key, future)
+            raise
+
+        waited = time.perf_counter() - start
+        self._record_wait(priority, waited)
+        return waited
+
+    def try_acquire(self, priority: int = None) -> bool:
+        """Takes a slot only if one is free and nobody is queued. Never waits. Pair a True with release()."""
+        if self._in_flight >= self.max_in_flight or self._has_waiters():
+            return False
+        self._in_flight += 1
+        self._record_wait(current_llm_priority.get() if priority is None else priority, 0.0)
+        return True
+
+    def release(self):
+        """Frees a slot and wakes the next waiter."""
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._in_flight < self.max_in_flight:
+            future = self._next_waiter()
+            if future is None:
+                return
+            if future.cancelled():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _next_waiter(self):
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if not users:
+                continue
+            user_key, waiters = next(iter(users.items()))
+            future = waiters.popleft()
+            # Move this user to the back of the line for their priority class.
+            del users[user_key]
+            if waiters:
+                users[user_key] = waiters
+            return future
+        return None
+
+    def _remove_waiter(self, priority: int, user_key: str, future: asyncio.Future):
+        waiters = self._queues[priority].get(user_key)
+        if waiters and future in waiters:
+            waiters.remove(future)
+            if not waiters:
+                del self._queues[priority][user_key]
+
+    def _has_waiters(self) -> bool:
+        return any(users for users in self._queues.values())
+
+    def _record_wait(self, priority: int, waited: float):
+        self._granted[priority] += 1
+        self._wait_total[priority] += waited
+        self._wait_max[priority] = max(self._wait_max[priority], waited)
+        self._recent_waits[priority].append(waited)
+
+    def get_stats(self) -> Dict:
+        """Returns in-flight count, queue depth and wait-time metrics per priority class."""
+        classes = {}
+        for priority, name in PRIORITY_NAMES.items():
+            recent = sorted(self._recent_waits[priority])
+            classes[name] = {
+                "queue_depth": sum(len(w) for w in self._queues[priority].values()),
+                "waiting_users": len(self._queues[priority]),
+                "granted": self._granted[priority],
+                "avg_wait_seconds": self._wait_total[priority] / self._granted[priority] if self._granted[priority] else 0.0,
+                "p95_wait_seconds": recent[int(0.95 * (len(recent) - 1))] if recent else 0.0,
+                "max_wait_seconds": self._wait_max[priority],
+            }
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "classes": classes,
+        }
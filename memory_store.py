@@ -0,0 +1,289 @@
+# memory_store.py
+import datetime
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from async_utils import run_blocking
+
+# Schema migrations, applied in order and recorded in PRAGMA user_version.
+# Never edit a released step; add a new one.
+MIGRATIONS: List[Tuple[str, List[str]]] = [
+    ("create tables", [
+        "CREATE TABLE IF NOT EXISTS memory (user_id TEXT, timestamp TEXT, message TEXT, is_bot INTEGER)",
+        "CREATE TABLE IF NOT EXISTS user_roles (user_id TEXT PRIMARY KEY, role TEXT)",
+        "CREATE TABLE IF NOT EXISTS tts_preferences (user_id TEXT PRIMARY KEY, voice_id TEXT, rate INTEGER, volume REAL)",
+        "CREATE TABLE IF NOT EXISTS knowledge (question TEXT, answer TEXT)",
+    ]),
+    ("index history and knowledge lookups", [
+        # Serves "WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?" straight from the index
+        "CREATE INDEX IF NOT EXISTS idx_memory_user_time ON memory (user_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_knowledge_question ON knowledge (question)",
+    ]),
+]
+
+# Read paths. Kept as constants so sqlite3's per-connection statement cache reuses the prepared statements.
+SQL_RECENT_MESSAGES = "SELECT timestamp, message, is_bot FROM memory WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?"
+SQL_USER_ROLE = "SELECT role FROM user_roles WHERE user_id = ?"
+SQL_TTS_PREFERENCES = "SELECT voice_id, rate, volume FROM tts_preferences WHERE user_id = ?"
+SQL_KNOWLEDGE = "SELECT answer FROM knowledge WHERE question = ? LIMIT 1"
+
+SQL_INSERT_MESSAGE = "INSERT INTO memory (user_id, timestamp, message, is_bot) VALUES (?, ?, ?, ?)"
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False, cached_statements=128)
+    conn.execute("PRAGMA busy_timeout = 30000")
+    # With WAL, NORMAL only fsyncs at checkpoints; a crash can lose the last commits but never corrupts
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -16000") # 16 MB page cache per connection
+    return conn
+
+
+class SQLiteMemoryStore:
+    """
+    Storage for the Discord bot's conversation memory, roles, TTS preferences
+    and knowledge. The database runs in WAL mode so reads never wait for the
+    writer. Messages are queued and written by one background thread that
+    commits whatever has queued up together (group commit), so a chat message
+    costs no fsync on the event loop. Reads see queued messages straight away.
+    Other writes (roles, preferences, knowledge, clearing history) are rare
+    and wait for their commit; from the event loop use their a* variants,
+    which wait on a worker thread instead.
+    """
+
+    def __init__(self, path: str = None, commit_interval: float = None, max_batch: int = None):
+        self.path = path or os.getenv("MEMORY_DB_PATH", "memory.db")
+        # How long the writer waits for more writes to share a commit with
+        self.commit_interval = commit_interval if commit_interval is not None else float(os.getenv("MEMORY_COMMIT_INTERVAL_MS", "50")) / 1000.0
+        self.max_batch = max_batch or int(os.getenv("MEMORY_MAX_BATCH", "500"))
+
+        self._write_conn = _connect(self.path)
+        self._write_conn.execute("PRAGMA journal_mode = WAL")
+        self.migrate()
+
+        self._local = threading.local() # One read connection per thread
+        self._read_conns: List[sqlite3.Connection] = []
+        self._read_lock = threading.Lock()
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pending: Dict[str, List[Tuple[str, str, int]]] = {} # Queued, not yet committed messages per user
+        self._pending_lock = threading.Lock()
+        self._closed = False
+
+        self.commits = 0
+        self.rows_written = 0
+        self.write_errors = 0
+        self.last_commit_seconds = 0.0
+
+        self._writer = threading.Thread(target=self._write_loop, name="memory_writer", daemon=True)
+        self._writer.start()
+
+    # --- Schema ---
+
+    def migrate(self):
+        """Applies migrations newer than the database's user_version, each in its own transaction."""
+        conn = self._write_conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, (name, statements) in enumerate(MIGRATIONS[version:], start=version + 1):
+            start = time.perf_counter()
+            with conn:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {number}")
+            print(f"Memory database: applied migration {number} ({name}) in {time.perf_counter() - start:.2f}s")
+
+    # --- Writes ---
+
+    def save_message(self, user_id: str, message: str, is_bot: int = 0):
+        """Queues a message for the next group commit. Returns immediately."""
+        row = (user_id, datetime.datetime.now().isoformat(), message, is_bot)
+        with self._pending_lock:
+            self._pending.setdefault(user_id, []).append(row[1:])
+        self._queue.put((SQL_INSERT_MESSAGE, row, None))
+
+    def execute(self, sql: str, params: Tuple = (), timeout: float = 30.0):
+        """Runs a write through the writer thread and waits until it is committed. Raises its error."""
+        done = threading.Event()
+        outcome: Dict = {}
+        self._queue.put((sql, params, (done, outcome)))
+        if not done.wait(timeout):
+            raise sqlite3.OperationalError(f"Timed out waiting for the memory database writer ({sql.split()[0]})")
+        if "error" in outcome:
+            raise outcome["error"]
+
+    def clear_conversation(self, user_id: str):
+        with self._pending_lock:
+            self._pending.pop(user_id, None)
+        self.execute("DELETE FROM memory WHERE user_id = ?", (user_id,))
+
+    def set_user_role(self, user_id: str, role: str):
+        self.execute("INSERT OR REPLACE INTO user_roles (user_id, role) VALUES (?, ?)", (user_id, role))
+
+    def set_tts_preferences(self, user_id: str, voice_id: str, rate: int, volume: float):
+        self.execute("INSERT OR REPLACE INTO tts_preferences (user_id, voice_id, rate, volume) VALUES (?, ?, ?, ?)",
+                     (user_id, voice_id, rate, volume))
+
+    def add_knowledge(self, question: str, answer: str):
+        self.execute("INSERT INTO knowledge (question, answer) VALUES (?, ?)", (question.lower(), answer))
+
+    # Async wrappers for the event loop: the write still waits for its commit, but on a worker thread
+
+    async def aexecute(self, sql: str, params: Tuple = (), timeout: float = 30.0):
+        await run_blocking(self.execute, sql, params, timeout)
+
+    async def aclear_conversation(self, user_id: str):
+        await run_blocking(self.clear_conversation, user_id)
+
+    async def aset_user_role(self, user_id: str, role: str):
+        await run_blocking(self.set_user_role, user_id, role)
+
+    async def aset_tts_preferences(self, user_id: str, voice_id: str, rate: int, volume: float):
+        await run_blocking(self.set_tts_preferences, user_id, voice_id, rate, volume)
+
+    async def aadd_knowledge(self, question: str, answer: str):
+        await run_blocking(self.add_knowledge, question, answer)
+
+    def flush(self, timeout: float = 30.0):
+        """Blocks until everything queued so far is committed."""
+        done = threading.Event()
+        self._queue.put((None, None, (done, {})))
+        done.wait(timeout)
+
+    def _next_batch(self) -> List[Tuple]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.commit_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        while True:
+            batch = self._next_batch()
+            stop = any(sql is None and params == "stop" for sql, params, _ in batch)
+            writes = [(sql, params, waiter) for sql, params, waiter in batch if sql is not None]
+            if writes:
+                self._commit(writes)
+            for _, _, waiter in batch:
+                if waiter is not None:
+                    waiter[0].set()
+            if stop:
+                return
+
+    def _commit(self, writes: List[Tuple]):
+        """Writes a batch in one transaction. If it fails, retries each write alone so one bad row can't sink the rest."""
+        start = time.perf_counter()
+        try:
+            with self._write_conn:
+                index = 0
+                while index < len(writes):
+                    # Consecutive inserts of the same statement go in as one executemany
+                    end = index
+                    while end < len(writes) and writes[end][0] == writes[index][0] and writes[end][2] is None:
+                        end += 1
+                    if end > index + 1:
+                        self._write_conn.executemany(writes[index][0], [params for _, params, _ in writes[index:end]])
+                        index = end
+                    else:
+                        self._write_conn.execute(writes[index][0], writes[index][1])
+                        index += 1
+            self.rows_written += len(writes)
+        except sqlite3.Error as e:
+            print(f"Memory database: batch of {len(writes)} failed ({e}); retrying one at a time.")
+            for sql, params, waiter in writes:
+                try:
+                    with self._write_conn:
+                        self._write_conn.execute(sql, params)
+                    self.rows_written += 1
+                except sqlite3.Error as row_error:
+                    self.write_errors += 1
+                    print(f"Memory database: write failed: {row_error}")
+                    if waiter is not None:
+                        waiter[1]["error"] = row_error
+        self.commits += 1
+        self.last_commit_seconds = time.perf_counter() - start
+        self._forget_pending([params for sql, params, _ in writes if sql == SQL_INSERT_MESSAGE])
+
+    def _forget_pending(self, rows: List[Tuple]):
+        with self._pending_lock:
+            for user_id, timestamp, message, is_bot in rows:
+                pending = self._pending.get(user_id)
+                if pending:
+                    try:
+                        pending.remove((timestamp, message, is_bot))
+                    except ValueError:
+                        pass
+                    if not pending:
+                        del self._pending[user_id]
+
+    # --- Reads ---
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+            conn.execute("PRAGMA query_only = ON")
+            with self._read_lock:
+                self._read_conns.append(conn)
+        return conn
+
+    def recent_messages(self, user_id: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """The user's last `limit` messages as (message, is_bot), oldest first, including ones not yet committed."""
+        rows = self._reader().execute(SQL_RECENT_MESSAGES, (user_id, limit)).fetchall()
+        with self._pending_lock:
+            pending = list(self._pending.get(user_id, ()))
+        if pending:
+            # A row can be committed and still pending for a moment; don't show it twice
+            rows = sorted(set(rows) | set(pending), reverse=True)[:limit]
+        return [(message, is_bot) for _, message, is_bot in reversed(rows)]
+
+    async def arecent_messages(self, user_id: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """recent_messages() off the event loop."""
+        return await run_blocking(self.recent_messages, user_id, limit)
+
+    def get_user_role(self, user_id: str) -> Optional[str]:
+        row = self._reader().execute(SQL_USER_ROLE, (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_tts_preferences(self, user_id: str) -> Optional[Tuple]:
+        return self._reader().execute(SQL_TTS_PREFERENCES, (user_id,)).fetchone()
+
+    def get_knowledge(self, question: str) -> Optional[str]:
+        row = self._reader().execute(SQL_KNOWLEDGE, (question.lower(),)).fetchone()
+        return row[0] if row else None
+
+    # --- Lifecycle ---
+
+    def close(self):
+        """Commits everything queued, stops the writer and closes all connections. Safe to call twice."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((None, "stop", None))
+        self._writer.join(timeout=30)
+        with self._read_lock:
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns = []
+        self._write_conn.close()
+
+    def get_stats(self) -> Dict:
+        with self._pending_lock:
+            pending = sum(len(rows) for rows in self._pending.values())
+        return {
+            "queued_writes": self._queue.qsize(),
+            "pending_messages": pending,
+            "commits": self.commits,
+            "rows_written": self.rows_written,
+            "rows_per_commit": self.rows_written / self.commits if self.commits else 0.0,
+            "write_errors": self.write_errors,
+            "last_commit_seconds": self.last_commit_seconds,
+        }
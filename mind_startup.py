@@ -0,0 +1,106 @@
+# mind_startup.py
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+from state_checkpoint import atomic_write_json
+
+# "fast" builds rarely used engines on first access; "eager" builds everything up front
+STARTUP_MODE = os.getenv("MIND_STARTUP_MODE", "fast").strip().lower()
+
+
+class StartupTimer:
+    """Collects how long each startup phase took and prints them as one report."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self._before_start = 0.0 # Phases that finished before this timer was created (e.g. imports)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def record(self, name: str, seconds: float, before_start: bool = False):
+        """Adds a phase timed elsewhere. Ones that ran `before_start` are added to the total."""
+        self.phases.append((name, seconds))
+        if before_start:
+            self._before_start += seconds
+
+    def report(self, title: str, notes: List[str] = None):
+        total = time.perf_counter() - self.started + self._before_start
+        lines = [f"{title} in {total:.2f}s:"]
+        lines += [f"  {name:<28} {seconds:7.3f}s" for name, seconds in self.phases]
+        lines += [f"  {note}" for note in notes or []]
+        print("\n".join(lines))
+
+
+class lazy_engine:
+    """
+    A class attribute that builds an engine the first time it is read and then
+    stores it on the instance, so later reads are plain attribute lookups.
+    `factory` receives the owning object.
+    """
+
+    def __init__(self, factory: Callable):
+        self.factory = factory
+        self._lock = threading.Lock()
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        with self._lock:
+            # Another thread may have built it while we waited
+            if self.name in instance.__dict__:
+                return instance.__dict__[self.name]
+            start = time.perf_counter()
+            engine = self.factory(instance)
+            instance.__dict__[self.name] = engine
+        print(f"Built {self.name} on first use in {time.perf_counter() - start:.3f}s")
+        return engine
+
+    @staticmethod
+    def is_built(instance, name: str) -> bool:
+        return name in instance.__dict__
+
+    @staticmethod
+    def names(owner) -> List[str]:
+        return [name for name, value in vars(owner).items() if isinstance(value, lazy_engine)]
+
+
+class MigrationMarkers:
+    """
+    Remembers which one-time migrations have completed, in a small JSON file,
+    so they are skipped on later starts. FORCE_MIGRATIONS=1 runs them all again.
+    """
+
+    def __init__(self, path: str = "migrations_done.json"):
+        self.path = path
+        self.force = os.getenv("FORCE_MIGRATIONS", "0").lower() in ("1", "true", "yes")
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._done: Dict[str, float] = json.load(f)
+        except FileNotFoundError:
+            self._done = {}
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read {self.path} ({e}); running all migrations.")
+            self._done = {}
+
+    def run_once(self, name: str, migrate: Callable[[], None]) -> bool:
+        """Runs `migrate` unless it already completed. Returns True if it ran."""
+        if name in self._done and not self.force:
+            return False
+        migrate()
+        self._done[name] = time.time()
+        atomic_write_json(self.path, self._done)
+        return True
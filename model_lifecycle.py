@@ -0,0 +1,235 @@
+# model_lifecycle.py
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+from generation_profiles import OLLAMA_NUM_CTX
+from llm_scheduler import PRIORITY_BACKGROUND
+
+
+def ollama_base_url(chat_url: str) -> str:
+    """http://host:11434/api/chat -> http://host:11434"""
+    return chat_url.split("/api/", 1)[0].rstrip("/")
+
+
+def ollama_model_key(name: str) -> str:
+    """Ollama lists "dolphin-mistral:latest" for a model requested as "dolphin-mistral"."""
+    return name if ":" in name else f"{name}:latest"
+
+
+class ModelLifecycleManager:
+    """
+    Keeps the chat models loaded in Ollama: the main model and any other model
+    calls are routed to (`extra_models`, e.g. the small tier). It warms them
+    up in the background while the Mind is still starting, adds a `keep_alive`
+    to every chat request, and pings a model whenever it has been idle long
+    enough that Ollama would otherwise unload it. Whether a model is loaded
+    comes from the warm-ups, pings and Ollama's /api/ps, never from a request
+    merely having started. With several Ollama nodes (`base_urls`) every node
+    is warmed and pinged.
+    """
+
+    def __init__(self, chat_url: str, model_id: str, keep_alive: str = None, ping_interval: float = None, base_urls: List[str] = None,
+                 extra_models: Iterable[str] = ()):
+        self.base_urls = base_urls or [ollama_base_url(chat_url)]
+        self.base_url = self.base_urls[0]
+        self.model_id = model_id
+        self.models = [model_id] + [model for model in dict.fromkeys(extra_models) if model and model != model_id]
+        # Anything Ollama accepts: "30m", "2h", "-1" (never unload), "0" (unload right away)
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        # Ping after this many idle seconds; keep it below keep_alive. 0 disables pings.
+        self.ping_interval = ping_interval if ping_interval is not None else float(os.getenv("OLLAMA_KEEP_WARM_SECONDS", "600"))
+
+        # model -> node -> unknown | warming | loaded | unloaded | unreachable
+        self.model_node_states: Dict[str, Dict[str, str]] = {model: {url: "unknown" for url in self.base_urls} for model in self.models}
+        self.last_activity: Dict[str, float] = {model: time.monotonic() for model in self.models}
+        self.load_seconds: Dict[str, float] = {}
+        self.expires_at: Optional[str] = None
+        self.size_vram: Optional[int] = None
+        self.warmups = 0
+        self.pings = 0
+        self.failures = 0
+
+        self._warmup_threads: List[threading.Thread] = []
+        self._pinger: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self._client = None
+        self._scheduler = None
+
+    @property
+    def node_states(self) -> Dict[str, str]:
+        """Per-node state of the main model."""
+        return self.model_node_states[self.model_id]
+
+    @property
+    def state(self) -> str:
+        """The main model's state: loaded if any node has it loaded."""
+        return self.model_state(self.model_id)
+
+    def model_state(self, model: str) -> str:
+        states = set(self.model_node_states.get(model, {}).values())
+        for overall in ("loaded", "warming", "unloaded", "unreachable"):
+            if overall in states:
+                return overall
+        return "unknown"
+
+    def attach(self, client, scheduler):
+        """Hands over the shared Ollama client and LLM scheduler, used for pings and status checks."""
+        self._client = client
+        self._scheduler = scheduler
+
+    def _warmup_payload(self, model: str) -> Dict:
+        # An empty prompt makes Ollama load the model without generating anything. The
+        # context size must match the chat calls, or the first one reloads the model.
+        return {"model": model, "prompt": "", "keep_alive": self.keep_alive, "stream": False,
+                "options": {"num_ctx": OLLAMA_NUM_CTX}}
+
+    def start_warmup(self):
+        """Loads the models on background threads, so it overlaps with engine loading. Returns immediately."""
+        if os.getenv("OLLAMA_WARMUP", "1").lower() in ("0", "false", "no"):
+            return
+        for model in self.models:
+            for url in self.base_urls:
+                self._set_node_state(url, "warming", model)
+        # One thread per node, so every node loads at the same time; each loads the main model first
+        self._warmup_threads = [threading.Thread(target=self._warmup_blocking, args=(url,), name="model_warmup", daemon=True)
+                                for url in self.base_urls]
+        for thread in self._warmup_threads:
+            thread.start()
+
+    def _warmup_blocking(self, base_url: str):
+        for model in self.models:
+            start = time.perf_counter()
+            try:
+                response = requests.post(f"{base_url}/api/generate", json=self._warmup_payload(model), timeout=300)
+                response.raise_for_status()
+                self._record_load(base_url, model, response.json(), time.perf_counter() - start)
+                self.warmups += 1
+                print(f"Model {model} warmed up on {base_url} in {time.perf_counter() - start:.1f}s (keep_alive={self.keep_alive}).")
+            except Exception as e:
+                self._set_node_state(base_url, "unreachable", model)
+                self.failures += 1
+                print(f"Warm-up of {model} failed on {base_url}: {e}")
+
+    def _set_node_state(self, base_url: str, state: str, model: str = None):
+        self.model_node_states.setdefault(model or self.model_id, {})[base_url] = state
+
+    def _record_load(self, base_url: str, model: str, data: Dict, seconds: float):
+        self._set_node_state(base_url, "loaded", model)
+        # load_duration is in nanoseconds and near zero when the model was already loaded
+        self.load_seconds[model] = data.get("load_duration", 0) / 1e9 if "load_duration" in data else seconds
+
+    def note_activity(self, model: str = None):
+        """Called when a chat request starts; starts the idle pinger once there is an event loop."""
+        model = model or self.model_id
+        if model in self.last_activity:
+            self.last_activity[model] = time.monotonic()
+        if self._pinger is None and self.ping_interval and self._client is not None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._pinger = asyncio.create_task(self._keep_warm())
+
+    def note_response(self, model: str = None):
+        """
+        Called when a chat request succeeded. The response doesn't say which
+        node served it, so if the model isn't known to be loaded yet its state
+        is refreshed from /api/ps in the background.
+        """
+        model = model or self.model_id
+        if model not in self.model_node_states or self.model_state(model) == "loaded" or self._client is None:
+            return
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self.refresh_status())
+
+    async def _keep_warm(self):
+        while True:
+            now = time.monotonic()
+            due = [model for model in self.models if now - self.last_activity[model] >= self.ping_interval]
+            if not due:
+                await asyncio.sleep(max(0.0, min(self.last_activity.values()) + self.ping_interval - now))
+                continue
+            await self.refresh_status()
+            for model in due:
+                for base_url in self.base_urls:
+                    await self._ping(base_url, model)
+                self.last_activity[model] = time.monotonic()
+
+    async def _ping(self, base_url: str, model: str = None):
+        model = model or self.model_id
+        try:
+            # Background priority: a ping must never delay a real reply
+            async with self._scheduler.slot(PRIORITY_BACKGROUND, "keep_warm"):
+                start = time.perf_counter()
+                data = await self._client.post_json(f"{base_url}/api/generate", self._warmup_payload(model), timeout=300)
+            self.pings += 1
+            self._record_load(base_url, model, data, time.perf_counter() - start)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            self._set_node_state(base_url, "unreachable", model)
+            print(f"Keep-warm ping of {model} to {base_url} failed: {e}")
+
+    async def refresh_status(self) -> Dict:
+        """Asks each Ollama node which models are loaded and updates the state of the ones tracked here."""
+        await asyncio.gather(*(self._refresh_node(base_url) for base_url in self.base_urls))
+        return self.get_status()
+
+    async def _refresh_node(self, base_url: str):
+        try:
+            data = await self._client.get_json(f"{base_url}/api/ps", timeout=10)
+        except Exception as e:
+            for model in self.models:
+                self._set_node_state(base_url, "unreachable", model)
+            print(f"Could not read Ollama model status from {base_url}: {e}")
+            return
+        running = {}
+        for entry in data.get("models", []):
+            for name in (entry.get("name"), entry.get("model")):
+                if name:
+                    running[ollama_model_key(name)] = entry
+        for model in self.models:
+            entry = running.get(ollama_model_key(model))
+            self._set_node_state(base_url, "loaded" if entry is not None else "unloaded", model)
+            if entry is not None and model == self.model_id:
+                self.expires_at = entry.get("expires_at")
+                self.size_vram = entry.get("size_vram")
+
+    async def shutdown(self):
+        for task in (self._pinger, self._refresher):
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._pinger = None
+        self._refresher = None
+
+    def get_status(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "model": self.model_id,
+            "state": self.state,
+            "nodes": dict(self.node_states),
+            "models": {
+                model: {
+                    "state": self.model_state(model),
+                    "nodes": dict(self.model_node_states[model]),
+                    "last_load_seconds": self.load_seconds.get(model),
+                    "idle_seconds": now - self.last_activity[model],
+                }
+                for model in self.models
+            },
+            "keep_alive": self.keep_alive,
+            "expires_at": self.expires_at,
+            "size_vram": self.size_vram,
+            "last_load_seconds": self.load_seconds.get(self.model_id),
+            "idle_seconds": now - self.last_activity[self.model_id],
+            "warmups": self.warmups,
+            "pings": self.pings,
+            "failures": self.failures,
+        }
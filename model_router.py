@@ -0,0 +1,82 @@
+# model_router.py
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+# Which tier serves each kind of call. Keys are generation profiles (see
+# generation_profiles) or, for calls that don't name one, the traced stage they
+# run in. Anything not listed uses the large (persona) model.
+# Override one with e.g. MODEL_TIER_META=large.
+CALL_TIERS = {
+    "intent": "small",
+    "monologue": "small",
+    "meta": "small",
+    "meta_static": "small",
+    "meta_cognition": "small",   # MetaCognitionEngine.analyze_query
+    "belief_evolution": "small", # CoreBeliefs.evolve (belief synthesis)
+    "summary": "small",          # Profile summaries
+    "engine_summary": "small",
+}
+
+for _name in list(CALL_TIERS):
+    _override = os.getenv(f"MODEL_TIER_{_name.upper()}")
+    if _override:
+        CALL_TIERS[_name] = _override.strip().lower()
+
+
+class ModelRouter:
+    """
+    Maps each LLM call to a model tier: a small, fast model for classification
+    and meta work, the large persona model for everything the user reads. A
+    call routed to the small model falls back to the large one if the small
+    one fails or returns output the caller can't use. Without
+    OLLAMA_SMALL_MODEL both tiers are the main model and nothing changes.
+    """
+
+    def __init__(self, large_model: str, small_model: str = None):
+        small_model = small_model if small_model is not None else os.getenv("OLLAMA_SMALL_MODEL", "").strip()
+        self.models = {"large": large_model, "small": small_model or large_model}
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {tier: 0 for tier in self.models}
+        self.fallbacks: Dict[str, int] = {}
+
+    def tier_for(self, profile: Optional[str], call_site: Optional[str]) -> str:
+        tier = CALL_TIERS.get(profile or "") or CALL_TIERS.get(call_site or "") or "large"
+        return tier if tier in self.models else "large"
+
+    def candidates(self, profile: Optional[str], call_site: Optional[str]) -> List[tuple]:
+        """(tier, model) pairs to try in order: the routed tier, then the large model if that's different."""
+        tier = self.tier_for(profile, call_site)
+        route = [(tier, self.models[tier])]
+        if self.models[tier] != self.models["large"]:
+            route.append(("large", self.models["large"]))
+        return route
+
+    def record_call(self, tier: str):
+        with self._lock:
+            self.calls[tier] = self.calls.get(tier, 0) + 1
+
+    def record_fallback(self, reason: str):
+        with self._lock:
+            self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+
+    @staticmethod
+    def is_usable(text: str, structured: bool) -> bool:
+        """Whether a small-model reply can be used, or the large model should be asked instead."""
+        if not text or not text.strip():
+            return False
+        if not structured:
+            return True
+        try:
+            return isinstance(json.loads(text), dict)
+        except ValueError:
+            return False
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "models": dict(self.models),
+                "calls": dict(self.calls),
+                "fallbacks": dict(self.fallbacks),
+            }
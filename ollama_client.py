@@ -0,0 +1,113 @@
+# ollama_client.py
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Dict, Optional
+
+import aiohttp
+
+
+class OllamaClient:
+    """
+    A long-lived, pooled HTTP client for talking to the Ollama API.
+    One instance is owned by the Mind and shared by every LLM call, so
+    connections (and DNS lookups) are reused across the whole conversation.
+    """
+
+    def __init__(self, pool_size: int = None, timeout: float = None, keepalive_timeout: float = None):
+        self.pool_size = pool_size or int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+        self.default_timeout = timeout or float(os.getenv("OLLAMA_TIMEOUT", "60"))
+        self.keepalive_timeout = keepalive_timeout or float(os.getenv("OLLAMA_KEEPALIVE_TIMEOUT", "60"))
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight = 0
+        self._total_requests = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the shared session, creating it lazily on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            if self._session is not None and not self._session.closed:
+                # The session belongs to another (probably finished) loop, e.g. the
+                # asyncio.run fallback in generate_chat_response_sync. It can't be
+                # reused here, so just drop it.
+                print("OllamaClient: event loop changed, creating a new connection pool.")
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+        return self._session
+
+    async def post_json(self, url: str, payload: Dict, timeout: float = None) -> Dict:
+        """POSTs a JSON payload and returns the decoded JSON response. Raises on HTTP errors."""
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.default_timeout)
+        self._in_flight += 1
+        self._total_requests += 1
+        try:
+            async with session.post(url, json=payload, timeout=client_timeout) as response:
+                response.raise_for_status()
+                return await response.json()
+        finally:
+            self._in_flight -= 1
+
+    async def get_json(self, url: str, timeout: float = None) -> Dict:
+        """GETs a URL and returns the decoded JSON response. Raises on HTTP errors."""
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.default_timeout)
+        self._in_flight += 1
+        self._total_requests += 1
+        try:
+            async with session.get(url, timeout=client_timeout) as response:
+                response.raise_for_status()
+                return await response.json()
+        finally:
+            self._in_flight -= 1
+
+    async def stream_json(self, url: str, payload: Dict, timeout: float = None) -> AsyncIterator[Dict]:
+        """
+        POSTs a JSON payload and yields each line of an NDJSON streaming response
+        as a dict. The timeout applies between chunks, not to the whole stream.
+        """
+        session = self._get_session()
+        client_timeout = aiohttp.ClientTimeout(total=None, sock_read=timeout or self.default_timeout)
+        self._in_flight += 1
+        self._total_requests += 1
+        try:
+            async with session.post(url, json=payload, timeout=client_timeout) as response:
+                response.raise_for_status()
+                async for raw_line in response.content:
+                    line = raw_line.strip()
+                    if not line:
+                        continue
+                    yield json.loads(line)
+        finally:
+            self._in_flight -= 1
+
+    async def close(self):
+        """Closes the pooled session. Safe to call more than once."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    def get_stats(self) -> Dict:
+        """Returns a snapshot of the connection pool state."""
+        idle = 0
+        acquired = 0
+        if self._session is not None and not self._session.closed:
+            connector = self._session.connector
+            # aiohttp doesn't expose these publicly, so read them defensively.
+            idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+            acquired = len(getattr(connector, "_acquired", ()))
+        return {
+            "pool_size": self.pool_size,
+            "open_connections": idle + acquired,
+            "idle_connections": idle,
+            "in_flight_requests": self._in_flight,
+            "total_requests": self._total_requests,
+        }
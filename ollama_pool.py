@@ -0,0 +1,324 @@
+# ollama_pool.py
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional
+
+import aiohttp
+
+from model_lifecycle import ollama_base_url, ollama_model_key
+
+
+def ollama_endpoints_from_env(default_chat_url: str) -> List[str]:
+    """
+    Base URLs of every Ollama node. OLLAMA_URLS is a comma-separated list (chat
+    URLs or bare hosts both work); without it the single OLLAMA_URL is used.
+    """
+    configured = os.getenv("OLLAMA_URLS", "")
+    urls = [url.strip() for url in configured.split(",") if url.strip()] or [default_chat_url]
+    return [ollama_base_url(url) for url in urls]
+
+
+class OllamaEndpoint:
+    """One Ollama node and what the pool knows about it."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.outstanding = 0
+        self.models: Optional[set] = None # None until the first probe answers
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.backoff = 0.0
+        self.ewma_seconds = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.ejections = 0
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > 0.0
+
+    def has_model(self, model: Optional[str]) -> bool:
+        return not model or self.models is None or ollama_model_key(model) in self.models
+
+    def get_stats(self) -> Dict:
+        return {
+            "url": self.base_url,
+            "state": "ejected" if self.ejected else "up",
+            "outstanding": self.outstanding,
+            "calls": self.calls,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "ewma_latency_seconds": self.ewma_seconds,
+            "models": sorted(self.models) if self.models is not None else None,
+        }
+
+
+class OllamaBackendPool:
+    """
+    Spreads LLM requests over several Ollama nodes. Each request goes to the
+    node with the fewest outstanding requests that has the model. A node that
+    fails `eject_after` requests in a row (or a health probe) is ejected and
+    gets a trial request again after a backoff, which doubles each time it
+    fails again. A request that fails on one node is retried on another.
+    Interactive requests can be hedged: if one runs longer than the
+    `hedge_percentile` latency seen for its call site, a duplicate goes to a
+    second node and the first answer wins. A hedge needs a free LLMScheduler
+    slot of its own, so it only runs when nothing is queued and never takes
+    the nodes past their parallel limit.
+    """
+
+    def __init__(self, client, base_urls: Iterable[str], models: Iterable[str] = (), probe_interval: float = None, eject_after: int = None,
+                 base_backoff: float = None, max_backoff: float = None, hedge_percentile: float = None,
+                 hedge_min_samples: int = 20):
+        self.client = client
+        self.endpoints = [OllamaEndpoint(url) for url in base_urls]
+        self.models = list(models) # Models the probes check each node has
+        self.probe_interval = probe_interval or float(os.getenv("OLLAMA_PROBE_SECONDS", "30"))
+        self.eject_after = eject_after or int(os.getenv("OLLAMA_EJECT_AFTER", "3"))
+        self.base_backoff = base_backoff or float(os.getenv("OLLAMA_EJECT_BACKOFF_SECONDS", "5"))
+        self.max_backoff = max_backoff or float(os.getenv("OLLAMA_EJECT_MAX_BACKOFF_SECONDS", "300"))
+        # e.g. 95 hedges calls slower than the call site's p95; 0 turns hedging off
+        self.hedge_percentile = hedge_percentile if hedge_percentile is not None else float(os.getenv("OLLAMA_HEDGE_PERCENTILE", "0"))
+        self.hedge_min_samples = hedge_min_samples
+
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._scheduler = None
+        self._prober: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+        self.failovers = 0
+
+    def attach(self, scheduler):
+        """Hands over the LLM scheduler that hedged duplicates take their slot from."""
+        self._scheduler = scheduler
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    # --- Choosing a node ---
+
+    def pick(self, model: str = None, exclude: Iterable[OllamaEndpoint] = ()) -> Optional[OllamaEndpoint]:
+        """
+        The least busy usable node for `model`, or None if every node is excluded.
+        Ejected nodes whose backoff has passed get a trial request; if every
+        node is ejected, the one due back soonest is used rather than failing outright.
+        """
+        excluded = set(map(id, exclude))
+        candidates = [e for e in self.endpoints if id(e) not in excluded]
+        if not candidates:
+            return None
+        with_model = [e for e in candidates if e.has_model(model)] or candidates
+        now = time.monotonic()
+        usable = [e for e in with_model if e.ejected_until <= now]
+        if not usable:
+            return min(with_model, key=lambda e: e.ejected_until)
+        return min(usable, key=lambda e: (e.outstanding, e.ewma_seconds))
+
+    # --- Health bookkeeping ---
+
+    def _succeeded(self, endpoint: OllamaEndpoint, seconds: float):
+        endpoint.calls += 1
+        endpoint.ewma_seconds = seconds if not endpoint.ewma_seconds else 0.8 * endpoint.ewma_seconds + 0.2 * seconds
+        endpoint.consecutive_failures = 0
+        if endpoint.ejected:
+            self._readmit(endpoint)
+
+    def _failed(self, endpoint: OllamaEndpoint, error: BaseException, immediately: bool = False):
+        endpoint.calls += 1
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if immediately or endpoint.ejected or endpoint.consecutive_failures >= self.eject_after:
+            self._eject(endpoint, error)
+
+    def _eject(self, endpoint: OllamaEndpoint, error: BaseException):
+        endpoint.backoff = min(self.max_backoff, endpoint.backoff * 2) if endpoint.backoff else self.base_backoff
+        endpoint.ejected_until = time.monotonic() + endpoint.backoff
+        endpoint.ejections += 1
+        print(f"Ollama node {endpoint.base_url} ejected for {endpoint.backoff:.0f}s: {type(error).__name__}: {error}")
+
+    def _readmit(self, endpoint: OllamaEndpoint):
+        endpoint.ejected_until = 0.0
+        endpoint.backoff = 0.0
+        endpoint.consecutive_failures = 0
+        print(f"Ollama node {endpoint.base_url} is healthy again.")
+
+    def _handle_error(self, endpoint: OllamaEndpoint, error: BaseException, model: Optional[str]) -> bool:
+        """Records a failed request. Returns True if another node might succeed where this one didn't."""
+        if isinstance(error, aiohttp.ClientResponseError) and error.status < 500:
+            if error.status == 404:
+                # The node doesn't have the model (any more); stop sending it there
+                if model and endpoint.models is not None:
+                    endpoint.models.discard(ollama_model_key(model))
+                return True
+            return False # A bad request fails the same way everywhere
+        if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError)):
+            self._failed(endpoint, error)
+            return True
+        return False
+
+    # --- Requests ---
+
+    def _ensure_started(self):
+        if self._prober is not None or self._closed:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._prober = asyncio.create_task(self._probe_periodically())
+
+    async def _post(self, endpoint: OllamaEndpoint, path: str, payload: Dict, timeout: float = None) -> Dict:
+        start = time.perf_counter()
+        data = await self.client.post_json(endpoint.base_url + path, payload, timeout=timeout)
+        self._succeeded(endpoint, time.perf_counter() - start)
+        return data
+
+    async def post_json(self, path: str, payload: Dict, timeout: float = None, latency_key: str = None, hedge: bool = False) -> Dict:
+        """POSTs to the best node, failing over to the others and optionally hedging. Raises the last error."""
+        self._ensure_started()
+        model = payload.get("model")
+        started = time.perf_counter()
+        tried: List[OllamaEndpoint] = []
+        running: Dict[asyncio.Task, OllamaEndpoint] = {}
+        hedge_task = None
+
+        def launch(endpoint: OllamaEndpoint) -> asyncio.Task:
+            tried.append(endpoint)
+            # Counted now rather than when the task first runs, so concurrent picks see it
+            endpoint.outstanding += 1
+            task = asyncio.ensure_future(self._post(endpoint, path, payload, timeout))
+            task.add_done_callback(lambda _: setattr(endpoint, "outstanding", endpoint.outstanding - 1))
+            running[task] = endpoint
+            return task
+
+        launch(self.pick(model))
+        hedge_after = self._hedge_delay(latency_key) if hedge else None
+        try:
+            while True:
+                done, _ = await asyncio.wait(running, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slower than usual for this call site: race a duplicate on another node
+                    hedge_after = None
+                    backup = self.pick(model, exclude=tried)
+                    if backup is not None and backup.ejected_until <= time.monotonic():
+                        if self._scheduler is not None and not self._scheduler.try_acquire():
+                            self.hedges_skipped += 1 # Busy: a duplicate would only add to the queue
+                        else:
+                            self.hedges += 1
+                            hedge_task = launch(backup)
+                            if self._scheduler is not None:
+                                hedge_task.add_done_callback(lambda _: self._scheduler.release())
+                    continue
+                for task in done:
+                    endpoint = running.pop(task)
+                    if not task.exception():
+                        if task is hedge_task:
+                            self.hedge_wins += 1
+                        self._record_latency(latency_key, time.perf_counter() - started)
+                        return task.result()
+                    error = task.exception()
+                    retry = self.pick(model, exclude=tried) if self._handle_error(endpoint, error, model) else None
+                    if retry is not None:
+                        self.failovers += 1
+                        print(f"Ollama node {endpoint.base_url} failed ({type(error).__name__}); retrying on {retry.base_url}.")
+                        launch(retry)
+                    elif not running:
+                        raise error
+        finally:
+            for task in running:
+                if task.done():
+                    if not task.cancelled():
+                        task.exception() # Already failed; mark the error retrieved
+                else:
+                    # Hedge losers: cancelling closes the connection, which makes Ollama stop generating
+                    task.cancel()
+
+    async def stream_json(self, path: str, payload: Dict, timeout: float = None) -> AsyncIterator[Dict]:
+        """Streams from the best node. Fails over to another node only if nothing was received yet."""
+        self._ensure_started()
+        model = payload.get("model")
+        tried: List[OllamaEndpoint] = []
+        while True:
+            endpoint = self.pick(model, exclude=tried)
+            tried.append(endpoint)
+            received = False
+            endpoint.outstanding += 1
+            start = time.perf_counter()
+            try:
+                async for data in self.client.stream_json(endpoint.base_url + path, payload, timeout=timeout):
+                    received = True
+                    if data.get("done"):
+                        self._succeeded(endpoint, time.perf_counter() - start)
+                    yield data
+                return
+            except Exception as e:
+                retryable = self._handle_error(endpoint, e, model)
+                if received or not retryable or len(tried) >= len(self.endpoints):
+                    raise
+                self.failovers += 1
+                print(f"Ollama node {endpoint.base_url} failed ({type(e).__name__}); retrying the stream elsewhere.")
+            finally:
+                endpoint.outstanding -= 1
+
+    # --- Hedging ---
+
+    def _record_latency(self, key: Optional[str], seconds: float):
+        if key:
+            self._latencies.setdefault(key, deque(maxlen=200)).append(seconds)
+
+    def _hedge_delay(self, key: Optional[str]) -> Optional[float]:
+        """Seconds to wait before hedging a call from this call site, or None to not hedge."""
+        if not self.hedge_percentile or not key or len(self.endpoints) < 2:
+            return None
+        samples = self._latencies.get(key)
+        if not samples or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100.0))]
+
+    # --- Health probes ---
+
+    async def probe(self, endpoint: OllamaEndpoint):
+        """Checks that a node answers and which models it has (via /api/tags)."""
+        try:
+            data = await self.client.get_json(f"{endpoint.base_url}/api/tags", timeout=5)
+        except Exception as e:
+            self._failed(endpoint, e, immediately=True)
+            return
+        known = endpoint.models
+        endpoint.models = {ollama_model_key(model["name"]) for model in data.get("models", []) if model.get("name")}
+        for model in self.models:
+            if not endpoint.has_model(model) and (known is None or ollama_model_key(model) in known):
+                print(f"Warning: model '{model}' not found on Ollama node {endpoint.base_url}. Available: {sorted(endpoint.models)}")
+        endpoint.consecutive_failures = 0
+        if endpoint.ejected:
+            self._readmit(endpoint)
+
+    async def probe_all(self):
+        await asyncio.gather(*(self.probe(endpoint) for endpoint in self.endpoints if endpoint.ejected_until <= time.monotonic()))
+
+    async def _probe_periodically(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.probe_interval)
+
+    async def shutdown(self):
+        self._closed = True
+        if self._prober is not None:
+            self._prober.cancel()
+            await asyncio.gather(self._prober, return_exceptions=True)
+            self._prober = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "endpoints": [endpoint.get_stats() for endpoint in self.endpoints],
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedges_skipped": self.hedges_skipped,
+            "failovers": self.failovers,
+        }
@@ -0,0 +1,151 @@
+# prompt_budget.py
+import os
+import re
+from typing import Dict, List
+
+# Token budget for each LLM call site. Override with e.g. PROMPT_BUDGET_THOUGHT=4000.
+CALL_SITE_BUDGETS = {
+    "persona": int(os.getenv("PROMPT_BUDGET_PERSONA", "1200")), # Static persona block, shared by thought and reply
+    "thought": int(os.getenv("PROMPT_BUDGET_THOUGHT", "3000")),
+    "reply": int(os.getenv("PROMPT_BUDGET_REPLY", "3000")),
+    "summary": int(os.getenv("PROMPT_BUDGET_SUMMARY", "1500")),
+    "meta": int(os.getenv("PROMPT_BUDGET_META", "1500")),
+}
+
+# Most history messages any prompt looks at; history kept in memory is capped to this too
+MAX_PROMPT_HISTORY_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "100"))
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    A fast local estimate of how many tokens a string will use. Counts words
+    and punctuation, with extra tokens for long words. Close enough to the
+    Llama/Mistral tokenizers for budgeting, and needs no model files.
+    """
+    if not text:
+        return 0
+    return sum(1 + len(piece) // 8 for piece in _TOKEN_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " [...]") -> str:
+    """Cuts text down to roughly max_tokens, keeping the beginning."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    count = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        count += 1 + len(match.group(0)) // 8
+        if count > max_tokens:
+            return text[:match.start()].rstrip() + marker
+    return text
+
+
+class _Section:
+    def __init__(self, name: str, priority: int, required: bool, text: str = None, items: List[str] = None,
+                 keep: str = "first", joiner: str = "\n", max_tokens: int = None, elision: str = None, empty_text: str = ""):
+        self.name = name
+        self.priority = priority
+        self.required = required
+        self.text = text
+        self.items = items
+        self.keep = keep
+        self.joiner = joiner
+        self.max_tokens = max_tokens
+        self.elision = elision
+        self.empty_text = empty_text
+
+
+class PromptBuilder:
+    """
+    Fills the sections of one prompt within a token budget. Required sections
+    are always included; the rest are filled in priority order (lower number
+    first), trimmed to what is left, or elided. Token counts per section are
+    logged for every prompt that is built.
+    """
+
+    def __init__(self, call_site: str, budget: int = None):
+        self.call_site = call_site
+        self.budget = budget or CALL_SITE_BUDGETS.get(call_site, 3000)
+        self._sections: List[_Section] = []
+
+    def add_text(self, name: str, text: str, priority: int = 0, required: bool = False, max_tokens: int = None):
+        """Adds a block of text. Non-required text is cut short if it doesn't fit."""
+        self._sections.append(_Section(name, priority, required, text=text or "", max_tokens=max_tokens))
+        return self
+
+    def add_items(self, name: str, items: List[str], priority: int = 1, keep: str = "first", joiner: str = "\n",
+                  elision: str = "[{count} more omitted]", empty_text: str = ""):
+        """
+        Adds a list of items (history messages, beliefs...). When they don't all
+        fit, whole items are dropped from the other end: keep='last' keeps the
+        newest, keep='first' keeps the earliest. `elision` notes what was dropped.
+        """
+        self._sections.append(_Section(name, priority, False, items=list(items or []), keep=keep,
+                                       joiner=joiner, elision=elision, empty_text=empty_text))
+        return self
+
+    def build(self) -> Dict[str, str]:
+        """Returns {section name: rendered text} and logs the token use of each section."""
+        rendered: Dict[str, str] = {}
+        counts: Dict[str, int] = {}
+        notes: List[str] = []
+
+        remaining = self.budget
+        # Required sections first, then the rest by priority (stable within a priority)
+        order = sorted(self._sections, key=lambda sec: (not sec.required, sec.priority))
+        for section in order:
+            if section.items is not None:
+                text, dropped = self._fit_items(section, remaining)
+                if dropped:
+                    notes.append(f"{section.name} -{dropped}")
+            else:
+                limit = section.max_tokens if section.max_tokens is not None else None
+                if not section.required:
+                    limit = remaining if limit is None else min(limit, remaining)
+                text = section.text if limit is None else truncate_to_tokens(section.text, limit)
+                if text != section.text:
+                    notes.append(f"{section.name} truncated")
+
+            tokens = estimate_tokens(text)
+            rendered[section.name] = text
+            counts[section.name] = tokens
+            remaining -= tokens
+
+        total = sum(counts.values())
+        breakdown = ", ".join(f"{name}={tokens}" for name, tokens in counts.items())
+        trimmed = f" | trimmed: {', '.join(notes)}" if notes else ""
+        print(f"Prompt [{self.call_site}] ~{total}/{self.budget} tokens ({breakdown}){trimmed}")
+        return rendered
+
+    @staticmethod
+    def _fit_items(section: _Section, remaining: int):
+        """Returns (rendered text, number of items dropped)."""
+        if not section.items:
+            return section.empty_text, 0
+
+        items = section.items if section.keep == "first" else list(reversed(section.items))
+        kept: List[str] = []
+        used = 0
+        joiner_cost = estimate_tokens(section.joiner)
+        for item in items:
+            cost = estimate_tokens(item) + joiner_cost
+            if used + cost > remaining:
+                break
+            kept.append(item)
+            used += cost
+
+        dropped = len(section.items) - len(kept)
+        if section.keep != "first":
+            kept.reverse()
+        if dropped and section.elision:
+            note = section.elision.format(count=dropped)
+            if section.keep == "first":
+                kept.append(note)
+            else:
+                kept.insert(0, note)
+        if not kept:
+            return section.empty_text, dropped
+        return section.joiner.join(kept), dropped
@@ -37,13 +37,30 @@ document.addEventListener('DOMContentLoaded', () => {
         
         messagesContainer.appendChild(messageElement);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return messageElement;
+    };
+
+    // Streamed replies being built up, keyed by messageId
+    const streamingMessages = {};
+
+    const renderStreamingMessage = (messageId, text) => {
+        let entry = streamingMessages[messageId];
+        if (!entry) {
+            entry = { element: addMessage('AI Chris', '', 'bot'), text: '' };
+            streamingMessages[messageId] = entry;
+        }
+        entry.text = text;
+        const sanitizedText = text.replace(/</g, "&lt;").replace(/>/g, "&gt;");
+        entry.element.innerHTML = `<strong>AI Chris:</strong> ${sanitizedText}`;
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
     };
 
     const sendMessage = () => {
         const messageText = input.value.trim();
         if (messageText) {
+            unlockAudio();
             addMessage('You', messageText, 'user');
-            socket.emit('user_message', { message: messageText, userId: userId });
+            socket.emit('user_message', { message: messageText, userId: userId, stream: true });
             input.value = '';
         }
     };
@@ -78,18 +95,106 @@ document.addEventListener('DOMContentLoaded', () => {
         addMessage('System', 'Connection lost. Attempting to reconnect...', 'bot');
     });
 
+    // --- Sentence-by-sentence audio ---
+    // Each sentence of a reply arrives as its own 'audio_chunk'. Chunks are fetched
+    // and decoded as soon as they arrive, then scheduled back to back on a single
+    // AudioContext so playback is gapless. Browsers without Web Audio fall back to
+    // playing the files one after another.
+    const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+    let audioContext = null;
+    let playbackChain = Promise.resolve();
+    let nextStartTime = 0;
+    let queuedChunks = 0;
+
+    // Browsers only allow audio to start after a user gesture, so create/resume the context on send
+    const unlockAudio = () => {
+        if (!AudioContextClass) return;
+        if (!audioContext) audioContext = new AudioContextClass();
+        if (audioContext.state === 'suspended') audioContext.resume();
+    };
+
+    const setSpeaking = (speaking) => {
+        if (speaking && !isSpeaking) {
+            isSpeaking = true;
+            animateMouth();
+        } else if (!speaking) {
+            isSpeaking = false;
+            avatarImg.src = avatar_closed_src;
+        }
+    };
+
+    const chunkFinished = () => {
+        queuedChunks -= 1;
+        if (queuedChunks === 0) setSpeaking(false);
+    };
+
+    const queueAudioChunk = (audioUrl) => {
+        queuedChunks += 1;
+        if (!audioContext) {
+            playbackChain = playbackChain.then(() => new Promise((resolve) => {
+                const audio = new Audio(audioUrl);
+                audio.onended = audio.onerror = resolve;
+                setSpeaking(true);
+                audio.play().catch(resolve);
+            })).then(chunkFinished);
+            return;
+        }
+
+        // Start downloading and decoding now, but schedule strictly in arrival order
+        const decoded = fetch(audioUrl)
+            .then((response) => response.arrayBuffer())
+            .then((data) => new Promise((resolve, reject) => audioContext.decodeAudioData(data, resolve, reject)));
+        playbackChain = playbackChain
+            .then(() => decoded)
+            .then((buffer) => {
+                const source = audioContext.createBufferSource();
+                source.buffer = buffer;
+                source.connect(audioContext.destination);
+                const startAt = Math.max(nextStartTime, audioContext.currentTime + 0.05);
+                source.start(startAt);
+                nextStartTime = startAt + buffer.duration;
+                setSpeaking(true);
+                source.onended = chunkFinished;
+            })
+            .catch((err) => {
+                console.error('Failed to play audio chunk:', err);
+                chunkFinished();
+            });
+    };
+
+    const playAudio = (audioUrl) => {
+        const audio = new Audio(audioUrl);
+        audio.play();
+        isSpeaking = true;
+        animateMouth();
+
+        audio.onended = () => {
+            isSpeaking = false;
+            avatarImg.src = avatar_closed_src; // Ensure mouth is closed
+        };
+    };
+
     socket.on('bot_response', (data) => {
         addMessage('AI Chris', data.reply, 'bot');
         if (data.audioUrl) {
-            const audio = new Audio(data.audioUrl);
-            audio.play();
-            isSpeaking = true;
-            animateMouth();
+            playAudio(data.audioUrl);
+        }
+    });
+
+    socket.on('bot_response_chunk', (data) => {
+        const current = streamingMessages[data.messageId] ? streamingMessages[data.messageId].text : '';
+        renderStreamingMessage(data.messageId, current + data.text);
+    });
+
+    socket.on('bot_response_done', (data) => {
+        // The final reply is authoritative (it has been through the full filter)
+        renderStreamingMessage(data.messageId, data.reply);
+        delete streamingMessages[data.messageId];
+    });
 
-            audio.onended = () => {
-                isSpeaking = false;
-                avatarImg.src = avatar_closed_src; // Ensure mouth is closed
-            };
+    socket.on('audio_chunk', (data) => {
+        if (data.audioUrl) {
+            queueAudioChunk(data.audioUrl);
         }
     });
 
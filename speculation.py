@@ -0,0 +1,98 @@
+# speculation.py
+import asyncio
+import time
+from typing import Awaitable, Dict
+
+
+class SpeculativeRun:
+    """A piece of work started before we know whether it will be needed."""
+
+    def __init__(self, tracker: 'SpeculationTracker', coro: Awaitable):
+        self.tracker = tracker
+        self.started = time.perf_counter()
+        self.finished = None
+        self.resolved = False
+        self.task = asyncio.ensure_future(coro)
+        self.task.add_done_callback(self._mark_finished)
+
+    def _mark_finished(self, _task):
+        self.finished = time.perf_counter()
+
+    async def keep(self):
+        """The work turned out to be needed. Waits for and returns its result."""
+        decided = time.perf_counter()
+        self.resolved = True
+        result = await self.task
+        # Time the work had already been running when the decision was made is
+        # time the caller didn't have to wait for.
+        finished = self.finished or time.perf_counter()
+        self.tracker.record_kept(min(finished, decided) - self.started)
+        return result
+
+    async def discard(self):
+        """The work turned out not to be needed. Cancels it and waits for it to unwind."""
+        self.resolved = True
+        completed = self.task.done()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Discarded speculative task raised: {e}")
+        end = (self.finished or time.perf_counter()) if completed else time.perf_counter()
+        self.tracker.record_discarded(end - self.started, completed)
+
+
+class SpeculationTracker:
+    """
+    Starts speculative work and keeps track of what it saved and what it wasted.
+    Once attached to a LatencyTracer the same numbers are exported as counters.
+    """
+
+    def __init__(self):
+        self.tracer = None
+        self.started = 0
+        self.kept = 0
+        self.discarded = 0
+        self.discarded_after_completion = 0
+        self.time_saved = 0.0
+        self.time_wasted = 0.0
+
+    def attach(self, tracer):
+        """Exports speculation counts, latency saved and compute wasted through the tracer (and so /metrics)."""
+        self.tracer = tracer
+
+    def start(self, coro: Awaitable) -> SpeculativeRun:
+        self.started += 1
+        return SpeculativeRun(self, coro)
+
+    def record_kept(self, saved_seconds: float):
+        saved_seconds = max(0.0, saved_seconds)
+        self.kept += 1
+        self.time_saved += saved_seconds
+        if self.tracer:
+            self.tracer.inc("speculation_runs_total", outcome="kept")
+            self.tracer.inc("speculation_latency_saved_seconds_total", saved_seconds)
+
+    def record_discarded(self, wasted_seconds: float, completed: bool):
+        wasted_seconds = max(0.0, wasted_seconds)
+        self.discarded += 1
+        if completed:
+            self.discarded_after_completion += 1
+        self.time_wasted += wasted_seconds
+        if self.tracer:
+            self.tracer.inc("speculation_runs_total", outcome="discarded_after_completion" if completed else "discarded")
+            self.tracer.inc("speculation_compute_wasted_seconds_total", wasted_seconds)
+
+    def get_stats(self) -> Dict:
+        """Returns hit rate, latency saved and compute wasted by speculation."""
+        return {
+            "started": self.started,
+            "kept": self.kept,
+            "discarded": self.discarded,
+            "discarded_after_completion": self.discarded_after_completion,
+            "hit_rate": self.kept / (self.kept + self.discarded) if (self.kept + self.discarded) else 0.0,
+            "latency_saved_seconds": round(self.time_saved, 3),
+            "compute_wasted_seconds": round(self.time_wasted, 3),
+        }
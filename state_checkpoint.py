@@ -0,0 +1,238 @@
+# state_checkpoint.py
+import asyncio
+import copy
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+
+def atomic_write_text(path: str, text: str, encoding: str = "utf-8"):
+    """
+    Writes a file so readers (and a crash) only ever see the old or the new
+    contents: write a temp file in the same directory, fsync, then rename over.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path: str, data: Any, **dump_kwargs):
+    """atomic_write_text for the JSON files written here (e.g. migration markers)."""
+    dump_kwargs.setdefault("indent", 4)
+    atomic_write_text(path, json.dumps(data, **dump_kwargs))
+
+
+def snapshot_component(owner: Any, shared: Iterable[Any] = ()) -> Any:
+    """
+    A copy of `owner` whose attributes are deep copies, so it can be saved on
+    another thread while the loop keeps changing the original. Objects in
+    `shared` (database engines, the Mind) and anything that can't be copied
+    (connections, locks) are referenced, not copied.
+    """
+    memo = {id(obj): obj for obj in shared}
+    snapshot = copy.copy(owner)
+    for name, value in vars(owner).items():
+        if id(value) in memo:
+            continue
+        try:
+            setattr(snapshot, name, copy.deepcopy(value, memo))
+        except Exception:
+            pass # Keeps the reference copy.copy gave it
+    return snapshot
+
+
+class FileState:
+    """
+    A component saved as one JSON file. `state()` runs on the event loop and
+    returns the data to write, in containers the loop won't change afterwards
+    (e.g. a fresh dict); the checkpoint thread encodes it and writes it with
+    atomic_write_json, so the file is never left half-written.
+    """
+
+    def __init__(self, path: str, state: Callable[[], Any], **dump_kwargs):
+        self.path = path
+        self.state = state
+        self.dump_kwargs = dump_kwargs
+
+    def writer(self) -> Callable[[], None]:
+        """Captures the state now and returns the call that writes it."""
+        data = self.state()
+        return lambda: atomic_write_json(self.path, data, **self.dump_kwargs)
+
+
+class StateCheckpointer:
+    """
+    Saves Mind components in the background. Code that changes a component
+    marks it dirty; every `interval` seconds the dirty ones are written on a
+    single worker thread, never two at once. A save that fails is marked dirty
+    again and retried. Every `full_every` checkpoints all components are
+    written, for changes nobody marked (0 turns that off).
+
+    A component is either a FileState, whose data is captured on the loop and
+    written atomically on the thread, or a save() method, which the thread
+    calls on a deep-copied snapshot of its object (the component then decides
+    how crash-safe its file is). Components named in `on_loop` are saved
+    directly on the event loop instead, for ones backed by a database
+    connection that belongs to the loop thread.
+    """
+
+    def __init__(self, components: Dict[str, Union[Callable[[], None], FileState]], interval: float = None,
+                 full_every: int = None, shared: Iterable[Any] = (), on_loop: Iterable[str] = ()):
+        self.components = components
+        self.shared = tuple(shared) # Referenced by components but never copied into snapshots
+        self.on_loop = frozenset(on_loop)
+        self.interval = interval or float(os.getenv("CHECKPOINT_INTERVAL_SECONDS", "60"))
+        self.full_every = full_every if full_every is not None else int(os.getenv("CHECKPOINT_FULL_EVERY", "10"))
+
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock() # Serialises executor and direct (sync) saves
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.checkpoints = 0
+        self.saves = 0
+        self.failures = 0
+        self.last_duration = 0.0
+
+    def mark_dirty(self, *names: str):
+        """Flags components as changed. Starts the periodic checkpoint on first use from the event loop."""
+        with self._lock:
+            self._dirty.update(name for name in names if name in self.components)
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._task is not None or self._closed:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._task = asyncio.create_task(self._run_periodically())
+
+    async def _run_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            full = bool(self.full_every) and (self.checkpoints + 1) % self.full_every == 0
+            await self.checkpoint(full=full)
+
+    def _take(self, full: bool) -> List[str]:
+        with self._lock:
+            names = list(self.components) if full else [name for name in self.components if name in self._dirty]
+            self._dirty.difference_update(names)
+            return names
+
+    def _live(self, name: str) -> Callable[[], None]:
+        """The save callable for `name`, working on the component itself."""
+        component = self.components[name]
+        return component.writer() if isinstance(component, FileState) else component
+
+    def _snapshot(self, name: str) -> Callable[[], None]:
+        """The save callable for `name`, safe to run on the checkpoint thread while the loop carries on."""
+        component = self.components[name]
+        if isinstance(component, FileState):
+            return component.writer()
+        owner = getattr(component, "__self__", None)
+        if owner is None or not hasattr(owner, "__dict__"):
+            return component
+        return component.__func__.__get__(snapshot_component(owner, self.shared))
+
+    def _run(self, saves: List[tuple]) -> List[str]:
+        """Runs the (name, save) pairs in order. Returns the names that failed."""
+        failed = []
+        for name, save in saves:
+            try:
+                save()
+                self.saves += 1
+            except Exception as e:
+                self.failures += 1
+                failed.append(name)
+                print(f"Checkpoint: failed to save {name}: {e}")
+        return failed
+
+    def _save(self, saves: List[tuple]) -> List[str]:
+        """_run on the checkpoint thread (or a sync caller), one batch at a time."""
+        with self._write_lock:
+            start = time.perf_counter()
+            failed = self._run(saves)
+            self.last_duration = time.perf_counter() - start
+        return failed
+
+    async def checkpoint(self, full: bool = False) -> List[str]:
+        """Writes dirty components (or all, with full=True) on the checkpoint thread. Returns what was written."""
+        names = self._take(full)
+        self.checkpoints += 1
+        if not names:
+            return []
+        # Database-backed components save here; their connection belongs to this thread
+        failed = self._run([(name, self.components[name]) for name in names if name in self.on_loop])
+        # Capture the rest here, on the loop, so the thread never reads state the loop is changing
+        saves = []
+        for name in names:
+            if name in self.on_loop:
+                continue
+            try:
+                saves.append((name, self._snapshot(name)))
+            except Exception as e:
+                self.failures += 1
+                failed.append(name)
+                print(f"Checkpoint: could not snapshot {name}, will retry: {e}")
+        if saves:
+            failed += await asyncio.get_running_loop().run_in_executor(self._executor, self._save, saves)
+        if failed:
+            with self._lock:
+                self._dirty.update(failed)
+        return [name for name in names if name not in failed]
+
+    def save_now(self, full: bool = False) -> List[str]:
+        """Synchronous checkpoint, for callers without an event loop. Blocks the calling thread."""
+        names = self._take(full)
+        saves = []
+        for name in names:
+            try:
+                saves.append((name, self._live(name)))
+            except Exception as e:
+                self.failures += 1
+                print(f"Checkpoint: could not capture {name}: {e}")
+        failed = [name for name in names if name not in dict(saves)] + self._save(saves)
+        if failed:
+            with self._lock:
+                self._dirty.update(failed)
+        return [name for name in names if name not in failed]
+
+    async def shutdown(self):
+        """Stops the periodic checkpoint and writes every component one last time."""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.checkpoint(full=True)
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            dirty = sorted(self._dirty)
+        return {
+            "dirty": dirty,
+            "checkpoints": self.checkpoints,
+            "saves": self.saves,
+            "failures": self.failures,
+            "last_duration_seconds": self.last_duration,
+        }
@@ -0,0 +1,145 @@
+# streaming_filter.py
+import re
+from typing import List, Tuple
+
+# A more in-character replacement. Or could be an empty string.
+REPLACEMENT = "I"
+
+# All scrub rules compiled once into a single matcher.
+# 'tail' rules remove everything from the trigger phrase to the end of the line,
+# 'word' rules only replace the matched name or phrase. A comma straight after
+# a replaced word goes with it, so "as a language model, I" doesn't become
+# "as a I, I"; commas anywhere else in the reply are left alone.
+SCRUB_PATTERN = re.compile(
+    r'(?P<tail>(?:as an ai,? I am programmed to|i am a large language model|\b(?:trained by|a product of)\b)(?P<rest>.*))'
+    r'|(?P<word>\b(?:large language model|language model|ai assistant|ai model|llm|mistral|dolphin|ollama|llama)\b)(?P<comma>,\s*)?',
+    re.IGNORECASE
+)
+
+# Literal forms of every rule, used to decide how much of a stream to hold back.
+# The flag says whether the rule only matches at a word boundary.
+_TRIGGERS: List[Tuple[str, bool]] = [
+    ("as an ai, i am programmed to", False),
+    ("as an ai i am programmed to", False),
+    ("i am a large language model", False),
+    ("trained by", True),
+    ("a product of", True),
+    ("large language model", True),
+    ("language model", True),
+    ("ai assistant", True),
+    ("ai model", True),
+    ("llm", True),
+    ("mistral", True),
+    ("dolphin", True),
+    ("ollama", True),
+    ("llama", True),
+]
+_MAX_TRIGGER_LEN = max(len(phrase) for phrase, _ in _TRIGGERS)
+
+
+def _replace(match: re.Match) -> str:
+    return REPLACEMENT + " " if match.group("comma") else REPLACEMENT
+
+
+def scrub_text(text: str) -> str:
+    """Scrubs a complete response of any AI-like, model-specific, or un-immersive phrases."""
+    return SCRUB_PATTERN.sub(_replace, text).strip()
+
+
+class IncrementalResponseFilter:
+    """
+    Applies the same scrub rules as scrub_text to a reply that arrives in chunks.
+    Text is released as soon as it can no longer be part of a match; only the
+    shortest tail that might still grow into a filtered phrase is held back.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._prev = "" # Last character of the reply before the buffer, for word boundaries
+        self._suppressing = False # Inside a 'tail' match, dropping text until end of line
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        """Adds a chunk of the reply and returns the text that is now safe to show."""
+        self._buffer += chunk
+        released = []
+
+        while self._buffer:
+            if self._suppressing:
+                newline = self._buffer.find("\n")
+                if newline == -1:
+                    self._take(len(self._buffer))
+                    break
+                self._take(newline)
+                self._suppressing = False
+
+            hold = self._holdback_start(self._buffer, self._prev)
+            # Searching from len(prev) keeps \b aware of the character before the buffer
+            offset = len(self._prev)
+            match = SCRUB_PATTERN.search(self._prev + self._buffer, offset)
+            if not match or match.start() - offset >= hold:
+                released.append(self._take(hold))
+                break
+
+            start, end = match.start() - offset, match.end() - offset
+            at_end = end == len(self._buffer)
+            if match.group("tail") is not None:
+                if at_end and not match.group("rest"):
+                    # The trigger itself ends the buffer; wait for the next character.
+                    released.append(self._take(start))
+                    break
+                released.append(self._take(start) + REPLACEMENT)
+                self._take(end - start)
+                self._suppressing = at_end
+            else:
+                if at_end:
+                    # The trailing word boundary (or the comma and spaces after it) can't be confirmed yet,
+                    # e.g. "llama" vs "llamas".
+                    released.append(self._take(start))
+                    break
+                released.append(self._take(start) + _replace(match))
+                self._take(end - start)
+
+        return self._emit("".join(released))
+
+    def flush(self) -> str:
+        """Releases whatever is still held back once the stream has finished."""
+        remainder = ""
+        if not self._suppressing:
+            text = self._prev + self._buffer
+            pieces, last = [], len(self._prev)
+            for match in SCRUB_PATTERN.finditer(text, last):
+                pieces.append(text[last:match.start()] + _replace(match))
+                last = match.end()
+            remainder = "".join(pieces) + text[last:]
+        self._buffer = ""
+        self._prev = ""
+        self._suppressing = False
+        return self._emit(remainder)
+
+    def _take(self, length: int) -> str:
+        """Removes and returns the first `length` characters of the buffer."""
+        taken = self._buffer[:length]
+        if taken:
+            self._prev = taken[-1]
+        self._buffer = self._buffer[length:]
+        return taken
+
+    def _emit(self, text: str) -> str:
+        # Mirror scrub_text's strip() for the start of the reply.
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+    @staticmethod
+    def _holdback_start(buffer: str, prev: str = "") -> int:
+        """Returns the index of the earliest suffix that could still grow into a match."""
+        for start in range(max(0, len(buffer) - _MAX_TRIGGER_LEN), len(buffer)):
+            suffix = buffer[start:].lower()
+            before = buffer[start - 1] if start else prev
+            at_boundary = not (before.isalnum() or before == "_")
+            for phrase, needs_boundary in _TRIGGERS:
+                if len(suffix) < len(phrase) and phrase.startswith(suffix) and (at_boundary or not needs_boundary):
+                    return start
+        return len(buffer)
@@ -0,0 +1,129 @@
+# summary_scheduler.py
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+class _UserSummaryState:
+    def __init__(self):
+        self.history: Optional[List[Dict]] = None # Latest history waiting to be summarised
+        self.messages = 0                         # Messages since the last summary started
+        self.timer: Optional[asyncio.Task] = None
+        self.running: Optional[asyncio.Task] = None
+        self.rerun = False                        # Another summary is due once the running one ends
+
+
+class BackgroundSummarizer:
+    """
+    Debounces and coalesces per-user conversation summary updates. A summary
+    runs once a user has sent `every_n_messages` messages, or after
+    `idle_seconds` without a new one. Requests that arrive while one is waiting
+    or running are folded into a single follow-up run. All tasks are tracked so
+    they can be drained or cancelled on shutdown.
+    """
+
+    def __init__(self, summarize: Callable[[str, List[Dict]], Awaitable], every_n_messages: int = None, idle_seconds: float = None):
+        self._summarize = summarize
+        self.every_n_messages = every_n_messages or int(os.getenv("SUMMARY_EVERY_N_MESSAGES", "10"))
+        self.idle_seconds = idle_seconds if idle_seconds is not None else float(os.getenv("SUMMARY_IDLE_SECONDS", "120"))
+
+        self._states: Dict[str, _UserSummaryState] = {}
+        self._tasks = set()
+
+        self.requested = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+
+    def request(self, user_id: str, conversation_history: List[Dict]):
+        """Notes that a user's conversation moved on. Never blocks and never starts more than one run per user."""
+        state = self._states.setdefault(user_id, _UserSummaryState())
+        self.requested += 1
+        if state.history is not None:
+            self.coalesced += 1
+        state.history = conversation_history
+        state.messages += 1
+
+        if state.messages >= self.every_n_messages:
+            self._start(user_id)
+        else:
+            self._restart_timer(user_id, state)
+
+    def _track(self, task: asyncio.Task) -> asyncio.Task:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _restart_timer(self, user_id: str, state: _UserSummaryState):
+        if state.timer and not state.timer.done():
+            state.timer.cancel()
+        state.timer = self._track(asyncio.create_task(self._run_when_idle(user_id)))
+
+    async def _run_when_idle(self, user_id: str):
+        await asyncio.sleep(self.idle_seconds)
+        self._states[user_id].timer = None
+        self._start(user_id)
+
+    def _start(self, user_id: str):
+        state = self._states[user_id]
+        if state.timer and not state.timer.done():
+            state.timer.cancel()
+            state.timer = None
+        if state.history is None:
+            return
+        if state.running and not state.running.done():
+            state.rerun = True
+            return
+
+        history = state.history
+        state.history = None
+        state.messages = 0
+        state.running = self._track(asyncio.create_task(self._run(user_id, history)))
+
+    async def _run(self, user_id: str, history: List[Dict]):
+        state = self._states[user_id]
+        try:
+            await self._summarize(user_id, history)
+            self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"Error updating conversation summary for {user_id}: {e}")
+        finally:
+            state.running = None
+            if state.rerun:
+                state.rerun = False
+                self._start(user_id)
+
+    async def shutdown(self, drain: bool = True, timeout: float = 30.0):
+        """
+        Stops all pending work. With drain=True, pending summaries are started
+        immediately and awaited (up to `timeout`); anything left is cancelled.
+        """
+        for user_id, state in self._states.items():
+            if state.timer and not state.timer.done():
+                state.timer.cancel()
+            if drain:
+                self._start(user_id)
+
+        running = [state.running for state in self._states.values() if state.running]
+        if drain and running:
+            done, still_running = await asyncio.wait(running, timeout=timeout)
+            if still_running:
+                print(f"Summary drain timed out; cancelling {len(still_running)} task(s).")
+
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict:
+        return {
+            "pending": sum(1 for state in self._states.values() if state.history is not None),
+            "running": sum(1 for state in self._states.values() if state.running and not state.running.done()),
+            "requested": self.requested,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,112 @@
+# test_chat_jobs.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from chat_jobs import ChatJobQueue, QueueFullError
+
+
+@pytest.fixture
+def loop():
+    # The queue is fed from web threads and runs its jobs on the Mind's loop
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+
+    async def drain():
+        # Let cancelled jobs unwind before the loop goes away
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(drain(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def replying(text, release=None):
+    def make_stream():
+        async def stream():
+            if release is not None:
+                while not release.is_set():
+                    await asyncio.sleep(0.01)
+            yield {"type": "chunk", "text": text}
+            yield {"type": "done", "reply": text}
+        return stream()
+    return make_stream
+
+
+def settle(queue):
+    # A job is marked finished just before its future's done callback frees the slot
+    deadline = time.time() + 5
+    while queue.get_stats()["admitted"] and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_job_runs_to_done(loop):
+    queue = ChatJobQueue(max_active=1, max_queued=0)
+    job = queue.submit(loop, replying("hi"))
+    assert job.wait(5)
+    assert job.status == "done"
+    assert job.to_dict()["response"] == "hi"
+    assert job.to_dict()["partialText"] == "hi"
+    assert queue.get(job.id) is job
+    settle(queue)
+    assert queue.get_stats()["completed"] == 1
+
+
+def test_rejects_beyond_active_plus_queued(loop):
+    release = threading.Event()
+    queue = ChatJobQueue(max_active=1, max_queued=1)
+    jobs = [queue.submit(loop, replying("a", release)), queue.submit(loop, replying("b", release))]
+    with pytest.raises(QueueFullError) as err:
+        queue.submit(loop, replying("c"))
+    assert err.value.retry_after >= 1
+    assert queue.get_stats()["rejected"] == 1
+
+    release.set()
+    assert all(job.wait(5) for job in jobs)
+    settle(queue)
+    assert queue.get_stats()["admitted"] == 0
+    # Room again once the admitted jobs finish
+    assert queue.submit(loop, replying("d")).wait(5)
+
+
+def test_sync_waiters_are_capped_separately(loop):
+    release = threading.Event()
+    queue = ChatJobQueue(max_active=2, max_queued=8, max_sync_waiters=1)
+    waiting = queue.submit(loop, replying("a", release), sync=True)
+    with pytest.raises(QueueFullError):
+        queue.submit(loop, replying("b"), sync=True)
+    # Job-mode callers don't hold a thread, so they are still admitted
+    polled = queue.submit(loop, replying("c", release))
+    assert queue.get_stats()["sync_waiters"] == 1
+
+    release.set()
+    assert waiting.wait(5) and polled.wait(5)
+    settle(queue)
+    assert queue.get_stats()["sync_waiters"] == 0
+    assert queue.submit(loop, replying("d"), sync=True).wait(5)
+
+
+def test_deadline_expires_job(loop):
+    queue = ChatJobQueue(max_active=1, max_queued=0)
+    job = queue.submit(loop, replying("late", threading.Event()), deadline=0.05)
+    assert job.wait(5)
+    assert job.status == "expired"
+    settle(queue)
+    assert queue.get_stats()["expired"] == 1
+
+
+def test_cancel_frees_the_slot(loop):
+    queue = ChatJobQueue(max_active=1, max_queued=0)
+    job = queue.submit(loop, replying("never", threading.Event()))
+    assert queue.cancel(job.id)
+    assert job.wait(5)
+    assert job.status == "cancelled"
+    assert not queue.cancel(job.id)
+    settle(queue)
+    assert queue.submit(loop, replying("next")).wait(5)
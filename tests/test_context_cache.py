@@ -0,0 +1,38 @@
+# test_context_cache.py
+from context_cache import ContextCache, fingerprint
+
+
+class Renderer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f"rendered {self.calls}"
+
+
+def test_same_version_returns_the_same_string():
+    cache, render = ContextCache(), Renderer()
+    first = cache.get("static", fingerprint("identity", "values"), render)
+    assert cache.get("static", fingerprint("identity", "values"), render) is first
+    assert render.calls == 1
+
+
+def test_changed_data_is_picked_up_without_being_told():
+    cache, render = ContextCache(), Renderer()
+    cache.get("static", fingerprint("identity", "values"), render)
+    assert cache.get("static", fingerprint("identity", "values, kindness"), render) == "rendered 2"
+
+
+def test_least_recently_used_sections_are_dropped():
+    cache, render = ContextCache(max_sections=2), Renderer()
+    cache.get("static", 1, render)
+    cache.get("profile:a", 1, render)
+    cache.get("static", 1, render) # Keeps "static" recent
+    cache.get("profile:b", 1, render)
+    stats = cache.get_stats()
+    assert stats["sections"] == 2 and stats["evictions"] == 1
+    cache.get("static", 1, render)
+    assert render.calls == 3 # "static" survived, "profile:a" did not
+    cache.get("profile:a", 1, render)
+    assert render.calls == 4
@@ -0,0 +1,45 @@
+# test_generation_profiles.py
+from generation_profiles import (DETERMINISTIC_CACHE_TTL, GENERATION_PROFILES, OLLAMA_NUM_CTX, cache_ttl_for,
+                                 generation_settings, is_structured, parse_json_reply)
+
+
+def test_profile_options_share_one_context_size():
+    for name in GENERATION_PROFILES:
+        assert generation_settings(name)["options"]["num_ctx"] == OLLAMA_NUM_CTX
+
+
+def test_profile_caps_decode_length():
+    options = generation_settings("monologue")["options"]
+    assert options["num_predict"] == GENERATION_PROFILES["monologue"]["num_predict"]
+    assert options["stop"] == ["\n"]
+
+
+def test_unknown_profile_uses_default():
+    assert generation_settings("nope") == generation_settings(None) == generation_settings("default")
+
+
+def test_explicit_settings_win_and_unknown_keys_are_ignored():
+    options = generation_settings("reply", temperature=0.1, num_predict=None, seed=4)["options"]
+    assert options["temperature"] == 0.1
+    assert options["num_predict"] == GENERATION_PROFILES["reply"]["num_predict"]
+    assert "seed" not in options
+
+
+def test_structured_profiles_request_json():
+    assert generation_settings("intent")["format"] == "json"
+    assert "format" not in generation_settings("reply")
+    assert is_structured("intent") and not is_structured("reply") and not is_structured(None)
+
+
+def test_cache_ttl():
+    assert cache_ttl_for("meta_static", {"temperature": 0.7}) == GENERATION_PROFILES["meta_static"]["cache_ttl"]
+    assert cache_ttl_for("intent", generation_settings("intent")["options"]) == DETERMINISTIC_CACHE_TTL
+    assert cache_ttl_for("reply", generation_settings("reply")["options"]) == 0.0
+
+
+def test_parse_json_reply_falls_back_to_a_copy_of_the_default():
+    default = {"task": "conversation"}
+    assert parse_json_reply('{"task": "creative_task"}', default) == {"task": "creative_task"}
+    for bad in ("not json", "[1, 2]", None):
+        parsed = parse_json_reply(bad, default)
+        assert parsed == default and parsed is not default
@@ -0,0 +1,130 @@
+# test_history_store.py
+import asyncio
+import threading
+
+from history_store import ConversationHistoryStore, HistoryBuffer
+
+
+class FakeDatabase:
+    def __init__(self, histories=None):
+        self.histories = {user: list(messages) for user, messages in (histories or {}).items()}
+        self.loads = 0
+        self.fail_writes = 0
+
+    def load(self, user_id):
+        self.loads += 1
+        return list(self.histories.get(user_id, []))
+
+    def persist(self, user_id, messages):
+        if self.fail_writes:
+            self.fail_writes -= 1
+            raise IOError("database is locked")
+        self.histories.setdefault(user_id, []).extend(messages)
+
+
+def message(text, role="user"):
+    return {"role": role, "content": text}
+
+
+def make_store(db, **kwargs):
+    kwargs.setdefault("max_messages", 4)
+    kwargs.setdefault("flush_seconds", 0.01)
+    return ConversationHistoryStore(load=db.load, persist=db.persist, **kwargs)
+
+
+def test_buffer_keeps_only_the_newest_messages():
+    buffer = HistoryBuffer(3, [message(str(n)) for n in range(5)])
+    assert [m["content"] for m in buffer] == ["2", "3", "4"]
+    buffer.append(message("5"))
+    buffer.extend([message("6"), message("7")])
+    assert [m["content"] for m in buffer] == ["5", "6", "7"]
+
+
+def test_loads_once_then_serves_from_memory():
+    db = FakeDatabase({"u": [message("old")]})
+    store = make_store(db)
+    assert store.get("u") is store.get("u")
+    assert db.loads == 1
+    assert store.get_stats()["hits"] == 1
+
+
+def test_least_recently_used_user_is_evicted():
+    db = FakeDatabase()
+    store = make_store(db, max_users=2)
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+    assert store.get_stats()["evictions"] == 1
+    store.get("b") # Evicted, so loaded again
+    assert db.loads == 4
+
+
+def test_recorded_messages_are_written_behind():
+    async def main():
+        db = FakeDatabase({"u": [message("old")]})
+        store = make_store(db)
+        history = await store.aget("u")
+        store.record("u", history, [message("hi"), message("hello", "assistant")])
+        await asyncio.sleep(0.05)
+        await store.shutdown()
+        return db, store
+
+    db, store = asyncio.run(main())
+    assert [m["content"] for m in db.histories["u"]] == ["old", "hi", "hello"]
+    assert store.get_stats()["pending_writes"] == 0
+
+
+def test_exchange_is_kept_when_the_buffer_was_evicted_meanwhile():
+    async def main():
+        db = FakeDatabase()
+        store = make_store(db, max_users=1)
+        history = store.get("a")
+        store.get("b") # Evicts "a" while its reply is being generated
+        store.record("a", history, [message("question"), message("answer", "assistant")])
+        reloaded = store.get("a")
+        await store.shutdown()
+        return db, reloaded
+
+    db, reloaded = asyncio.run(main())
+    assert [m["content"] for m in db.histories["a"]] == ["question", "answer"]
+    assert [m["content"] for m in reloaded] == ["question", "answer"]
+
+
+def test_persist_on_loop_writes_from_the_loop_thread():
+    async def main():
+        db = FakeDatabase()
+        threads = []
+        store = ConversationHistoryStore(load=db.load, persist=lambda user_id, messages: threads.append(threading.get_ident()),
+                                         max_messages=4, persist_on_loop=True)
+        history = store.get("u")
+        store.record("u", history, [message("hi")])
+        await store.shutdown()
+        return threads
+
+    assert asyncio.run(main()) == [threading.get_ident()]
+
+
+def test_failed_writes_are_retried():
+    async def main():
+        db = FakeDatabase()
+        db.fail_writes = 1
+        store = make_store(db)
+        history = store.get("u")
+        store.record("u", history, [message("hi")])
+        await store.flush()
+        await store.flush()
+        return db, store
+
+    db, store = asyncio.run(main())
+    assert db.histories["u"] == [message("hi")]
+    assert store.get_stats()["write_failures"] == 1
+
+
+def test_lists_the_store_did_not_hand_out_are_only_appended_to():
+    db = FakeDatabase()
+    store = make_store(db)
+    own_list = []
+    store.record("u", own_list, [message("hi")])
+    assert own_list == [message("hi")]
+    assert store.get_stats()["pending_writes"] == 0
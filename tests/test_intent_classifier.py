@@ -0,0 +1,73 @@
+# test_intent_classifier.py
+import pytest
+
+from intent_classifier import IntentRouter, KeywordIntentClassifier
+
+
+def route(text):
+    """The task the router settles on without the LLM, or None if it defers to the LLM."""
+    guess, confident = IntentRouter(confidence_threshold=0.8).classify_locally(text)
+    return guess["task"] if confident else None
+
+
+@pytest.mark.parametrize("text", [
+    "write a song about the rain",
+    "can you compose me a short poem?",
+    "make up a joke about cats",
+    "tell me a story",
+    "tell us a really funny joke",
+    "sing me a song",
+])
+def test_clear_requests_are_creative(text):
+    assert route(text) == "creative_task"
+
+
+@pytest.mark.parametrize("text", [
+    "tell me a bit about yourself",
+    "tell me a little about your goals",
+    "I write code for a living",
+    "can you make a list of your values",
+    "how do I make a class in python?",
+    "I love the poem you wrote me",
+    "how do I write a good song?",
+])
+def test_conversation_is_never_confidently_creative(text):
+    assert route(text) != "creative_task"
+
+
+@pytest.mark.parametrize("text", [
+    "can you make a list of your values",
+    "write some code that sorts a list",
+])
+def test_ambiguous_requests_go_to_the_llm(text):
+    assert route(text) is None
+
+
+@pytest.mark.parametrize("text", ["hi", "how are you today?", "what did you do this weekend with your friends?"])
+def test_small_talk_is_confident_conversation(text):
+    assert route(text) == "conversation"
+
+
+def test_stats_track_fast_path_and_agreement():
+    router = IntentRouter(confidence_threshold=0.8)
+    router.classify_locally("hello there")
+    guess, confident = router.classify_locally("how do I make a class in python?")
+    assert not confident
+    router.record_llm_decision("how do I make a class in python?", {"task": "conversation"}, local_guess=guess)
+    stats = router.get_stats()
+    assert stats["hit_rate"] == 0.5
+    assert stats["llm_decisions"] == 1
+    assert stats["agreement_rate"] == 1.0
+
+
+def test_empty_message_is_conversation():
+    assert KeywordIntentClassifier().classify("  ")["task"] == "conversation"
+
+
+def test_decision_log_is_only_written_by_log_decision(tmp_path):
+    log = tmp_path / "decisions.jsonl"
+    router = IntentRouter(decision_log_path=str(log))
+    router.record_llm_decision("make a list", {"task": "creative_task"})
+    assert not log.exists()
+    router.log_decision("make a list", {"task": "creative_task"}, {"task": "creative_task", "confidence": 0.6})
+    assert log.read_text(encoding="utf-8").count("\n") == 1
@@ -0,0 +1,119 @@
+# test_llm_cache.py
+import asyncio
+
+import pytest
+
+from llm_cache import LLMResponseCache, llm_cache_key
+
+
+class SlowCall:
+    """An LLM call stand-in that counts how often it really runs."""
+
+    def __init__(self, text="answer", ok=True, delay=0.05, error=None):
+        self.text, self.ok, self.delay, self.error = text, ok, delay, error
+        self.calls = 0
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.text, self.ok
+
+
+def test_key_depends_on_every_part():
+    assert llm_cache_key(model="a", messages=[1]) == llm_cache_key(messages=[1], model="a")
+    assert llm_cache_key(model="a", messages=[1]) != llm_cache_key(model="b", messages=[1])
+
+
+def test_identical_calls_in_flight_share_one_request():
+    async def main():
+        cache, call = LLMResponseCache(), SlowCall()
+        results = await asyncio.gather(*(cache.get_or_call("k", call) for _ in range(5)))
+        return cache, call, results
+
+    cache, call, results = asyncio.run(main())
+    assert results == ["answer"] * 5
+    assert call.calls == 1
+    assert cache.get_stats()["coalesced"] == 4
+
+
+def test_cached_until_ttl_and_only_when_ok():
+    async def main():
+        cache = LLMResponseCache()
+        good, bad = SlowCall(delay=0), SlowCall(ok=False, delay=0)
+        await cache.get_or_call("good", good, ttl=60)
+        await cache.get_or_call("good", good, ttl=60)
+        await cache.get_or_call("bad", bad, ttl=60)
+        await cache.get_or_call("bad", bad, ttl=60)
+        return good, bad
+
+    good, bad = asyncio.run(main())
+    assert good.calls == 1
+    assert bad.calls == 2
+
+
+def test_lru_eviction_and_tag_invalidation():
+    async def main():
+        cache = LLMResponseCache(max_entries=2)
+        for key, tags in (("a", ("values",)), ("b", ()), ("c", ("values",))):
+            await cache.get_or_call(key, SlowCall(text=key, delay=0), ttl=60, tags=tags)
+        return cache
+
+    cache = asyncio.run(main())
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.invalidate("values") == 1 # "a" was already evicted
+    assert cache.get_stats()["entries"] == 1
+
+
+def test_cancelled_leader_does_not_cancel_other_waiters():
+    async def main():
+        cache, call = LLMResponseCache(), SlowCall()
+        leader = asyncio.ensure_future(cache.get_or_call("k", call, ttl=60))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.get_or_call("k", call, ttl=60))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await follower
+        return leader, call, result, cache
+
+    leader, call, result, cache = asyncio.run(main())
+    assert leader.cancelled()
+    assert result == "answer"
+    assert call.calls == 1 and not call.cancelled
+    assert cache.get_stats()["entries"] == 1
+
+
+def test_call_is_cancelled_when_every_waiter_gives_up():
+    async def main():
+        cache, call = LLMResponseCache(), SlowCall()
+        waiters = [asyncio.ensure_future(cache.get_or_call("k", call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        return cache, call
+
+    cache, call = asyncio.run(main())
+    assert call.cancelled
+    assert cache.get_stats()["in_flight"] == 0
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def main():
+        cache, call = LLMResponseCache(), SlowCall(error=RuntimeError("down"))
+        results = await asyncio.gather(*(cache.get_or_call("k", call, ttl=60) for _ in range(3)), return_exceptions=True)
+        return cache, call, results
+
+    cache, call, results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert call.calls == 1
+    assert cache.get_stats()["entries"] == 0
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_call("k", SlowCall(error=RuntimeError("still down"), delay=0)))
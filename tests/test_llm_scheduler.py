@@ -0,0 +1,100 @@
+# test_llm_scheduler.py
+import asyncio
+
+from llm_scheduler import (LLMScheduler, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_META,
+                           current_llm_priority, run_with_priority)
+
+
+async def hold_slot(scheduler, order, name, priority, user_key="u", hold=0.01):
+    async with scheduler.slot(priority, user_key):
+        order.append(name)
+        await asyncio.sleep(hold)
+
+
+def test_never_more_than_max_in_flight():
+    async def main():
+        scheduler = LLMScheduler(2)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with scheduler.slot(PRIORITY_META):
+                peak = max(peak, scheduler.get_stats()["in_flight"])
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call() for _ in range(10)))
+        return peak, scheduler
+
+    peak, scheduler = asyncio.run(main())
+    assert peak == 2
+    assert scheduler.get_stats()["in_flight"] == 0
+
+
+def test_waiters_are_served_by_priority():
+    async def main():
+        scheduler, order = LLMScheduler(1), []
+        first = asyncio.ensure_future(hold_slot(scheduler, order, "first", PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        waiting = [
+            asyncio.ensure_future(hold_slot(scheduler, order, "background", PRIORITY_BACKGROUND)),
+            asyncio.ensure_future(hold_slot(scheduler, order, "meta", PRIORITY_META)),
+            asyncio.ensure_future(hold_slot(scheduler, order, "interactive", PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.gather(first, *waiting)
+        return order
+
+    assert asyncio.run(main()) == ["first", "interactive", "meta", "background"]
+
+
+def test_users_take_turns_within_a_priority():
+    async def main():
+        scheduler, order = LLMScheduler(1), []
+        first = asyncio.ensure_future(hold_slot(scheduler, order, "first", PRIORITY_META, "x"))
+        await asyncio.sleep(0)
+        waiting = [asyncio.ensure_future(hold_slot(scheduler, order, f"{user}{n}", PRIORITY_META, user))
+                   for user, n in (("a", 1), ("a", 2), ("a", 3), ("b", 1))]
+        await asyncio.gather(first, *waiting)
+        return order
+
+    assert asyncio.run(main()) == ["first", "a1", "b1", "a2", "a3"]
+
+
+def test_cancelled_waiter_gives_its_place_up():
+    async def main():
+        scheduler, order = LLMScheduler(1), []
+        first = asyncio.ensure_future(hold_slot(scheduler, order, "first", PRIORITY_META))
+        await asyncio.sleep(0)
+        doomed = asyncio.ensure_future(hold_slot(scheduler, order, "doomed", PRIORITY_INTERACTIVE))
+        survivor = asyncio.ensure_future(hold_slot(scheduler, order, "survivor", PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        doomed.cancel()
+        await asyncio.gather(first, survivor, doomed, return_exceptions=True)
+        return order, scheduler
+
+    order, scheduler = asyncio.run(main())
+    assert order == ["first", "survivor"]
+    assert scheduler.get_stats()["in_flight"] == 0
+
+
+def test_try_acquire_never_jumps_the_queue():
+    async def main():
+        scheduler = LLMScheduler(1)
+        assert scheduler.try_acquire()
+        assert not scheduler.try_acquire() # Full
+        waiter = asyncio.ensure_future(scheduler.acquire(PRIORITY_META))
+        await asyncio.sleep(0)
+        scheduler.release() # Goes to the waiter
+        await waiter
+        assert not scheduler.try_acquire()
+        scheduler.release()
+        assert scheduler.try_acquire()
+        scheduler.release()
+
+    asyncio.run(main())
+
+
+def test_run_with_priority_sets_the_default():
+    async def read():
+        return current_llm_priority.get()
+
+    assert asyncio.run(run_with_priority(read(), PRIORITY_INTERACTIVE)) == PRIORITY_INTERACTIVE
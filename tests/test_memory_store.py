@@ -0,0 +1,92 @@
+# test_memory_store.py
+import asyncio
+import sqlite3
+
+import pytest
+
+from memory_store import MIGRATIONS, SQLiteMemoryStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteMemoryStore(str(tmp_path / "memory.db"), commit_interval=0.05)
+    yield store
+    store.close()
+
+
+def test_migrations_set_the_schema_version(store):
+    assert store._write_conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert store._write_conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_queued_messages_are_readable_before_commit(store):
+    store.save_message("u", "hello", 0)
+    store.save_message("u", "hi there", 1)
+    # Readable straight away, whether or not the writer has committed yet
+    assert store.recent_messages("u") == [("hello", 0), ("hi there", 1)]
+    store.flush()
+    assert store.recent_messages("u") == [("hello", 0), ("hi there", 1)]
+    assert store.get_stats()["pending_messages"] == 0
+
+
+def test_messages_share_a_commit(store):
+    for n in range(20):
+        store.save_message("u", f"message {n}")
+    store.flush()
+    stats = store.get_stats()
+    assert stats["rows_written"] == 20
+    assert stats["commits"] < 20
+    assert [message for message, _ in store.recent_messages("u", limit=3)] == ["message 17", "message 18", "message 19"]
+
+
+def test_writes_wait_for_their_commit(store):
+    store.set_user_role("u", "pirate")
+    assert store.get_user_role("u") == "pirate"
+    store.set_tts_preferences("u", "david", 180, 0.5)
+    assert store.get_tts_preferences("u") == ("david", 180, 0.5)
+    store.add_knowledge("What is Python?", "A language")
+    assert store.get_knowledge("what is python?") == "A language"
+
+
+def test_a_failed_write_raises_without_sinking_the_batch(store):
+    store.save_message("u", "kept")
+    with pytest.raises(sqlite3.Error):
+        store.execute("INSERT INTO no_such_table VALUES (?)", (1,))
+    store.flush()
+    assert store.recent_messages("u") == [("kept", 0)]
+    assert store.get_stats()["write_errors"] == 1
+
+
+def test_clear_conversation_drops_pending_messages(store):
+    store.save_message("u", "forget me")
+    store.clear_conversation("u")
+    store.flush()
+    assert store.recent_messages("u") == []
+
+
+def test_async_wrappers_commit_off_the_loop(store):
+    async def main():
+        await store.aset_user_role("u", "bard")
+        await store.aset_tts_preferences("u", None, 200, 1.0)
+        await store.aadd_knowledge("who is u?", "a tester")
+        store.save_message("u", "hello")
+        await store.aclear_conversation("u")
+        return await store.arecent_messages("u")
+
+    assert asyncio.run(main()) == []
+    assert store.get_user_role("u") == "bard"
+    assert store.get_tts_preferences("u") == (None, 200, 1.0)
+    assert store.get_knowledge("Who is u?") == "a tester"
+
+
+def test_close_commits_queued_messages(tmp_path):
+    path = str(tmp_path / "memory.db")
+    store = SQLiteMemoryStore(path, commit_interval=1.0)
+    store.save_message("u", "last words")
+    store.close()
+    store.close() # Safe twice
+    reopened = SQLiteMemoryStore(path)
+    try:
+        assert reopened.recent_messages("u") == [("last words", 0)]
+    finally:
+        reopened.close()
@@ -0,0 +1,88 @@
+# test_mind_startup.py
+import json
+import threading
+
+import pytest
+
+from mind_startup import MigrationMarkers, StartupTimer, lazy_engine
+
+
+class Owner:
+    built = 0
+
+    def _build(self):
+        Owner.built += 1
+        return {"owner": self}
+
+    engine = lazy_engine(_build)
+    other = lazy_engine(lambda self: "other")
+
+
+def test_lazy_engine_builds_once_on_first_use():
+    Owner.built = 0
+    owner = Owner()
+    assert not lazy_engine.is_built(owner, "engine")
+    first = owner.engine
+    assert first["owner"] is owner
+    assert owner.engine is first
+    assert Owner.built == 1
+    assert lazy_engine.is_built(owner, "engine")
+    assert sorted(lazy_engine.names(Owner)) == ["engine", "other"]
+
+
+def test_lazy_engine_builds_once_across_threads():
+    Owner.built = 0
+    owner = Owner()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(owner.engine)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert Owner.built == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_migrations_run_once(tmp_path, monkeypatch):
+    monkeypatch.delenv("FORCE_MIGRATIONS", raising=False)
+    path = str(tmp_path / "migrations_done.json")
+    runs = []
+    assert MigrationMarkers(path).run_once("aging", lambda: runs.append("aging"))
+    assert not MigrationMarkers(path).run_once("aging", lambda: runs.append("again"))
+    assert runs == ["aging"]
+    with open(path) as f:
+        assert list(json.load(f)) == ["aging"]
+
+
+def test_failed_migration_runs_again(tmp_path, monkeypatch):
+    monkeypatch.delenv("FORCE_MIGRATIONS", raising=False)
+    path = str(tmp_path / "migrations_done.json")
+
+    def broken():
+        raise RuntimeError("bad row")
+
+    with pytest.raises(RuntimeError):
+        MigrationMarkers(path).run_once("profiles", broken)
+    assert MigrationMarkers(path).run_once("profiles", lambda: None)
+
+
+def test_force_and_unreadable_markers_run_everything(tmp_path, monkeypatch):
+    path = tmp_path / "migrations_done.json"
+    MigrationMarkers(str(path)).run_once("aging", lambda: None)
+    monkeypatch.setenv("FORCE_MIGRATIONS", "1")
+    assert MigrationMarkers(str(path)).run_once("aging", lambda: None)
+
+    monkeypatch.delenv("FORCE_MIGRATIONS")
+    path.write_text("{not json")
+    assert MigrationMarkers(str(path)).run_once("aging", lambda: None)
+
+
+def test_startup_report_includes_earlier_phases(capsys):
+    timer = StartupTimer()
+    timer.record("imports", 1.5, before_start=True)
+    with timer.phase("clients"):
+        pass
+    timer.report("Mind started", ["migrations run: none"])
+    out = capsys.readouterr().out
+    assert out.startswith("Mind started in 1.5")
+    assert "imports" in out and "clients" in out and "migrations run: none" in out
@@ -0,0 +1,109 @@
+# test_model_lifecycle.py
+import asyncio
+
+import model_lifecycle
+from llm_scheduler import LLMScheduler
+from model_lifecycle import ModelLifecycleManager, ollama_base_url, ollama_model_key
+
+NODE_A = "http://a:11434"
+NODE_B = "http://b:11434"
+
+
+class FakeClient:
+    def __init__(self, loaded=None, down=()):
+        self.loaded = loaded or {} # node -> model names /api/ps lists
+        self.down = set(down)
+        self.posts = []
+
+    async def get_json(self, url, timeout=None):
+        node = url.split("/api/", 1)[0]
+        if node in self.down:
+            raise ConnectionError("refused")
+        return {"models": [{"name": name, "size_vram": 1024} for name in self.loaded.get(node, [])]}
+
+    async def post_json(self, url, payload, timeout=None):
+        self.posts.append((url, payload["model"]))
+        return {"load_duration": 2_000_000_000}
+
+
+def make_manager(client, **kwargs):
+    kwargs.setdefault("ping_interval", 0)
+    manager = ModelLifecycleManager(f"{NODE_A}/api/chat", "chat", keep_alive="30m", base_urls=[NODE_A, NODE_B], **kwargs)
+    manager.attach(client, LLMScheduler(2))
+    return manager
+
+
+def test_url_and_model_name_helpers():
+    assert ollama_base_url("http://host:11434/api/chat") == "http://host:11434"
+    assert ollama_model_key("dolphin-mistral") == "dolphin-mistral:latest"
+    assert ollama_model_key("phi3:mini") == "phi3:mini"
+
+
+def test_extra_models_are_tracked_once():
+    manager = make_manager(FakeClient(), extra_models=["small", "chat", "small", ""])
+    assert manager.models == ["chat", "small"]
+    assert manager.state == "unknown"
+
+
+def test_status_comes_from_each_node():
+    async def main():
+        client = FakeClient(loaded={NODE_A: ["chat:latest"], NODE_B: ["small:latest"]})
+        manager = make_manager(client, extra_models=["small"])
+        return await manager.refresh_status()
+
+    status = asyncio.run(main())
+    assert status["nodes"] == {NODE_A: "loaded", NODE_B: "unloaded"}
+    assert status["models"]["small"]["nodes"] == {NODE_A: "unloaded", NODE_B: "loaded"}
+    assert status["state"] == "loaded" and status["size_vram"] == 1024
+
+
+def test_unreachable_node_is_reported():
+    async def main():
+        manager = make_manager(FakeClient(loaded={NODE_A: ["chat"]}, down=[NODE_B]))
+        return await manager.refresh_status()
+
+    assert asyncio.run(main())["nodes"] == {NODE_A: "loaded", NODE_B: "unreachable"}
+
+
+def test_idle_models_are_pinged_on_every_node():
+    async def main():
+        client = FakeClient()
+        manager = make_manager(client, ping_interval=0.02, extra_models=["small"])
+        manager.note_activity()
+        await asyncio.sleep(0.05)
+        await manager.shutdown()
+        return client, manager
+
+    client, manager = asyncio.run(main())
+    pinged = set(client.posts)
+    assert pinged >= {(f"{node}/api/generate", model) for node in (NODE_A, NODE_B) for model in ("chat", "small")}
+    assert manager.get_status()["models"]["small"]["last_load_seconds"] == 2.0
+    assert manager.state == "loaded"
+
+
+def test_warmup_loads_every_model_on_every_node(monkeypatch):
+    calls = []
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"load_duration": 0}
+
+    def post(url, json=None, timeout=None):
+        calls.append((url, json["model"], json["keep_alive"]))
+        if url.startswith(NODE_B):
+            raise ConnectionError("refused")
+        return Response()
+
+    monkeypatch.setattr(model_lifecycle.requests, "post", post)
+    monkeypatch.delenv("OLLAMA_WARMUP", raising=False)
+    manager = make_manager(FakeClient(), extra_models=["small"])
+    manager.start_warmup()
+    for thread in manager._warmup_threads:
+        thread.join(5)
+
+    assert sorted(calls) == sorted((f"{node}/api/generate", model, "30m") for node in (NODE_A, NODE_B) for model in ("chat", "small"))
+    assert manager.node_states == {NODE_A: "loaded", NODE_B: "unreachable"}
+    assert manager.warmups == 2 and manager.failures == 2
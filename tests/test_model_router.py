@@ -0,0 +1,46 @@
+# test_model_router.py
+from model_router import CALL_TIERS, ModelRouter
+
+
+def test_small_tier_calls_fall_back_to_the_large_model():
+    router = ModelRouter("big", "small")
+    assert router.candidates("intent", None) == [("small", "small"), ("large", "big")]
+    assert router.candidates(None, "meta_cognition") == [("small", "small"), ("large", "big")]
+
+
+def test_reply_and_unknown_calls_use_the_large_model_only():
+    router = ModelRouter("big", "small")
+    assert router.candidates("reply", "reply") == [("large", "big")]
+    assert router.candidates(None, None) == [("large", "big")]
+
+
+def test_profile_wins_over_call_site():
+    router = ModelRouter("big", "small")
+    assert CALL_TIERS["intent"] == "small"
+    assert router.tier_for("reply", "intent") == "small" # "reply" isn't routed, so the call site decides
+    assert router.tier_for("intent", "reply") == "small"
+
+
+def test_without_a_small_model_nothing_changes(monkeypatch):
+    monkeypatch.delenv("OLLAMA_SMALL_MODEL", raising=False)
+    router = ModelRouter("big")
+    assert router.models == {"large": "big", "small": "big"}
+    assert router.candidates("intent", None) == [("small", "big")]
+
+
+def test_usable_replies():
+    assert ModelRouter.is_usable("hello", structured=False)
+    assert not ModelRouter.is_usable("   ", structured=False)
+    assert ModelRouter.is_usable('{"task": "conversation"}', structured=True)
+    assert not ModelRouter.is_usable("[1]", structured=True)
+    assert not ModelRouter.is_usable("task: conversation", structured=True)
+
+
+def test_stats_count_calls_and_fallbacks():
+    router = ModelRouter("big", "small")
+    router.record_call("small")
+    router.record_call("small")
+    router.record_fallback("unusable")
+    stats = router.get_stats()
+    assert stats["calls"] == {"large": 0, "small": 2}
+    assert stats["fallbacks"] == {"unusable": 1}
@@ -0,0 +1,177 @@
+# test_ollama_pool.py
+import asyncio
+
+import aiohttp
+
+from llm_scheduler import LLMScheduler
+from ollama_pool import OllamaBackendPool, ollama_endpoints_from_env
+
+NODE_A = "http://a:11434"
+NODE_B = "http://b:11434"
+
+
+class FakeClient:
+    """Answers per node: a delay, an exception for requests or probes to raise, and the models /api/tags lists."""
+
+    def __init__(self, delays=None, errors=None, probe_errors=None, models=None):
+        self.delays = delays or {}
+        self.errors = errors or {}
+        self.probe_errors = probe_errors or {}
+        self.models = models or {}
+        self.posts = []
+        self.cancelled = []
+
+    async def post_json(self, url, payload, timeout=None):
+        node = url.split("/api/", 1)[0]
+        self.posts.append(node)
+        try:
+            await asyncio.sleep(self.delays.get(node, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(node)
+            raise
+        if node in self.errors:
+            raise self.errors[node]
+        return {"node": node}
+
+    async def get_json(self, url, timeout=None):
+        node = url.split("/api/", 1)[0]
+        if node in self.probe_errors:
+            raise self.probe_errors[node]
+        return {"models": [{"name": name} for name in self.models.get(node, ["chat"])]}
+
+
+def make_pool(client, **kwargs):
+    kwargs.setdefault("probe_interval", 3600)
+    kwargs.setdefault("eject_after", 2)
+    kwargs.setdefault("base_backoff", 60)
+    return OllamaBackendPool(client, [NODE_A, NODE_B], models=["chat"], **kwargs)
+
+
+def run(pool, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await pool.shutdown()
+    return asyncio.run(main())
+
+
+def test_endpoints_from_env(monkeypatch):
+    monkeypatch.setenv("OLLAMA_URLS", "http://a:11434/api/chat, http://b:11434 ,")
+    assert ollama_endpoints_from_env("http://x/api/chat") == [NODE_A, NODE_B]
+    monkeypatch.delenv("OLLAMA_URLS")
+    assert ollama_endpoints_from_env("http://x:1/api/chat") == ["http://x:1"]
+
+
+def test_picks_the_least_busy_node_that_has_the_model():
+    pool = make_pool(FakeClient())
+    a, b = pool.endpoints
+    a.outstanding = 1
+    assert pool.pick("chat") is b
+    b.models = {"other:latest"}
+    assert pool.pick("chat") is a
+    assert pool.pick("chat", exclude=[a, b]) is None
+
+
+def test_fails_over_to_another_node():
+    client = FakeClient(errors={NODE_A: aiohttp.ClientConnectionError("refused")})
+    pool = make_pool(client)
+    pool.endpoints[1].outstanding = 1 # Make node A the first choice
+    result = run(pool, pool.post_json("/api/chat", {"model": "chat"}))
+    assert result == {"node": NODE_B}
+    assert pool.get_stats()["failovers"] == 1
+    assert pool.endpoints[0].consecutive_failures == 1
+
+
+def test_bad_requests_are_not_retried():
+    client = FakeClient(errors={NODE_A: aiohttp.ClientResponseError(None, (), status=400), NODE_B: aiohttp.ClientResponseError(None, (), status=400)})
+    pool = make_pool(client)
+
+    async def call():
+        try:
+            await pool.post_json("/api/chat", {"model": "chat"})
+        except aiohttp.ClientResponseError as e:
+            return e.status
+
+    assert run(pool, call()) == 400
+    assert len(client.posts) == 1
+
+
+def test_repeated_failures_eject_a_node_until_it_recovers():
+    async def main():
+        client = FakeClient(errors={NODE_A: aiohttp.ClientConnectionError("refused")})
+        pool = make_pool(client)
+        a, b = pool.endpoints
+        for _ in range(2):
+            b.outstanding = 1
+            await pool.post_json("/api/chat", {"model": "chat"})
+            b.outstanding = 0
+        ejected = a.ejected
+        first_choice = pool.pick("chat")
+        # A probe that answers brings it back
+        await pool.probe(a)
+        await pool.shutdown()
+        return pool, ejected, first_choice
+
+    pool, ejected, first_choice = asyncio.run(main())
+    a, b = pool.endpoints
+    assert ejected and first_choice is b
+    assert not a.ejected and a.get_stats()["ejections"] == 1
+
+
+def test_failed_probe_ejects_and_backoff_doubles():
+    async def main():
+        pool = make_pool(FakeClient(probe_errors={NODE_A: aiohttp.ClientConnectionError("down")}), base_backoff=5, max_backoff=15)
+        a = pool.endpoints[0]
+        backoffs = []
+        for _ in range(3):
+            await pool.probe(a)
+            backoffs.append(a.backoff)
+        return backoffs
+
+    assert asyncio.run(main()) == [5, 10, 15]
+
+
+def test_slow_calls_are_hedged_and_the_loser_cancelled():
+    client = FakeClient(delays={NODE_A: 1.0, NODE_B: 0.0})
+    pool = make_pool(client, hedge_percentile=50, hedge_min_samples=3)
+    pool.attach(LLMScheduler(4))
+    for _ in range(3):
+        pool._record_latency("reply", 0.01)
+    pool.endpoints[1].outstanding = 1 # Node A first
+
+    async def call():
+        result = await pool.post_json("/api/chat", {"model": "chat"}, latency_key="reply", hedge=True)
+        await asyncio.sleep(0) # Let the cancelled loser unwind
+        return result
+
+    assert run(pool, call()) == {"node": NODE_B}
+    stats = pool.get_stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+    assert client.cancelled == [NODE_A]
+
+
+def test_hedge_is_skipped_without_a_free_scheduler_slot():
+    async def main():
+        client = FakeClient(delays={NODE_A: 0.05})
+        pool = make_pool(client, hedge_percentile=50, hedge_min_samples=1)
+        scheduler = LLMScheduler(1)
+        pool.attach(scheduler)
+        pool._record_latency("reply", 0.001)
+        pool.endpoints[1].outstanding = 1
+        assert scheduler.try_acquire() # The only slot is busy
+        result = await pool.post_json("/api/chat", {"model": "chat"}, latency_key="reply", hedge=True)
+        scheduler.release()
+        await pool.shutdown()
+        return pool, result
+
+    pool, result = asyncio.run(main())
+    assert result == {"node": NODE_A}
+    assert pool.get_stats()["hedges"] == 0 and pool.get_stats()["hedges_skipped"] == 1
+
+
+def test_no_hedging_without_enough_samples():
+    pool = make_pool(FakeClient(), hedge_percentile=95, hedge_min_samples=20)
+    pool._record_latency("reply", 0.1)
+    assert pool._hedge_delay("reply") is None
+    assert pool._hedge_delay(None) is None
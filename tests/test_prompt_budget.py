@@ -0,0 +1,56 @@
+# test_prompt_budget.py
+from prompt_budget import PromptBuilder, estimate_tokens, truncate_to_tokens
+
+
+def test_estimate_counts_words_and_punctuation():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Hello, world!") == 4
+    assert estimate_tokens("a" * 16) == 3 # Long words cost extra
+
+
+def test_truncate_keeps_the_beginning():
+    text = " ".join(f"word{n}" for n in range(50))
+    cut = truncate_to_tokens(text, 10)
+    assert cut.startswith("word0 word1")
+    assert cut.endswith(" [...]")
+    assert estimate_tokens(cut[:-len(" [...]")]) <= 10
+    assert truncate_to_tokens("short", 10) == "short"
+    assert truncate_to_tokens("anything", 0) == ""
+
+
+def test_required_sections_are_never_trimmed():
+    required = " ".join(["persona"] * 40)
+    rendered = PromptBuilder("test", budget=10).add_text("persona", required, required=True).build()
+    assert rendered["persona"] == required
+
+
+def test_optional_text_is_cut_to_what_is_left():
+    rendered = (PromptBuilder("test", budget=30)
+                .add_text("persona", " ".join(["p"] * 20), required=True)
+                .add_text("notes", " ".join(["n"] * 50), priority=1)
+                .build())
+    assert estimate_tokens(rendered["notes"].replace(" [...]", "")) <= 10
+
+
+def test_history_keeps_the_newest_items_and_notes_the_rest():
+    history = [f"message {n}" for n in range(20)]
+    rendered = PromptBuilder("test", budget=20).add_items("history", history, keep="last").build()
+    lines = rendered["history"].split("\n")
+    assert lines[-1] == "message 19"
+    assert lines[0].endswith("more omitted]")
+    assert "message 0" not in lines
+
+
+def test_lower_priority_number_is_filled_first():
+    items = [f"item {n}" for n in range(10)]
+    rendered = (PromptBuilder("test", budget=25)
+                .add_items("later", items, priority=2)
+                .add_items("sooner", items, priority=1)
+                .build())
+    assert "item 9" in rendered["sooner"]
+    assert "item 9" not in rendered["later"]
+
+
+def test_empty_items_use_the_placeholder():
+    rendered = PromptBuilder("test").add_items("beliefs", [], empty_text="(none yet)").build()
+    assert rendered["beliefs"] == "(none yet)"
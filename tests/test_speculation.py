@@ -0,0 +1,59 @@
+# test_speculation.py
+import asyncio
+
+from speculation import SpeculationTracker
+from tracing import LatencyTracer
+
+
+async def work(seconds, result="thought"):
+    await asyncio.sleep(seconds)
+    return result
+
+
+def test_kept_run_returns_its_result_and_counts_time_saved():
+    async def main():
+        tracker = SpeculationTracker()
+        run = tracker.start(work(0.02))
+        await asyncio.sleep(0.05) # The decision comes after the work is done
+        return tracker, await run.keep()
+
+    tracker, result = asyncio.run(main())
+    stats = tracker.get_stats()
+    assert result == "thought"
+    assert stats["kept"] == 1 and stats["hit_rate"] == 1.0
+    assert 0.015 <= stats["latency_saved_seconds"] <= 0.05
+
+
+def test_discarded_run_is_cancelled_and_counts_time_wasted():
+    async def main():
+        tracker = SpeculationTracker()
+        run = tracker.start(work(10))
+        await asyncio.sleep(0.02)
+        await run.discard()
+        return tracker, run
+
+    tracker, run = asyncio.run(main())
+    stats = tracker.get_stats()
+    assert run.task.cancelled()
+    assert stats["discarded"] == 1 and stats["discarded_after_completion"] == 0
+    assert stats["compute_wasted_seconds"] >= 0.015
+
+
+def test_attached_tracer_exports_the_same_numbers():
+    async def main():
+        tracker, tracer = SpeculationTracker(), LatencyTracer()
+        tracker.attach(tracer)
+        kept = tracker.start(work(0))
+        await asyncio.sleep(0.01)
+        await kept.keep()
+        finished = tracker.start(work(0))
+        await asyncio.sleep(0.01)
+        await finished.discard()
+        return tracer.render_prometheus()
+
+    text = asyncio.run(main())
+    assert "# TYPE aichris_speculation_runs_total counter" in text
+    assert 'aichris_speculation_runs_total{outcome="kept"} 1' in text
+    assert 'aichris_speculation_runs_total{outcome="discarded_after_completion"} 1' in text
+    assert "aichris_speculation_latency_saved_seconds_total" in text
+    assert "aichris_speculation_compute_wasted_seconds_total" in text
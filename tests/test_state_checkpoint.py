@@ -0,0 +1,128 @@
+# test_state_checkpoint.py
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+from state_checkpoint import FileState, StateCheckpointer, atomic_write_text, snapshot_component
+
+
+class Engine:
+    def __init__(self, path, fail=0):
+        self.path = path
+        self.data = {"count": 0}
+        self.fail = fail
+        self.threads = []
+
+    def save_state(self):
+        self.threads.append(threading.get_ident())
+        if self.fail:
+            self.fail -= 1
+            raise IOError("disk full")
+        with open(self.path, "w") as f:
+            json.dump(self.data, f)
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_atomic_write_replaces_and_cleans_up(tmp_path):
+    path = tmp_path / "state.json"
+    atomic_write_text(str(path), "old")
+    atomic_write_text(str(path), "new")
+    assert path.read_text() == "new"
+
+    with pytest.raises(TypeError):
+        atomic_write_text(str(path), 42) # Fails mid-write
+    assert path.read_text() == "new"
+    assert os.listdir(tmp_path) == ["state.json"]
+
+
+def test_snapshot_copies_state_but_shares_listed_objects():
+    shared = object()
+    engine = Engine("unused")
+    engine.db = shared
+    snapshot = snapshot_component(engine, shared=(shared,))
+    engine.data["count"] = 5
+    assert snapshot.data == {"count": 0}
+    assert snapshot.db is shared
+
+
+def test_only_dirty_components_are_saved(tmp_path):
+    async def main():
+        a, b = Engine(str(tmp_path / "a.json")), Engine(str(tmp_path / "b.json"))
+        checkpointer = StateCheckpointer({"a": a.save_state, "b": b.save_state}, interval=60, full_every=0)
+        checkpointer.mark_dirty("a", "unknown")
+        saved = await checkpointer.checkpoint()
+        await checkpointer.shutdown()
+        return saved
+
+    assert asyncio.run(main()) == ["a"]
+
+
+def test_file_state_captures_on_the_loop_and_writes_atomically(tmp_path):
+    path = str(tmp_path / "mood.json")
+    mood = {"level": 1}
+
+    async def main():
+        checkpointer = StateCheckpointer({"mood": FileState(path, lambda: dict(mood))}, interval=60)
+        checkpointer.mark_dirty("mood")
+        saving = asyncio.ensure_future(checkpointer.checkpoint())
+        await asyncio.sleep(0) # Captured; a change now belongs to the next checkpoint
+        mood["level"] = 2
+        saved = await saving
+        written = read_json(path)
+        await checkpointer.shutdown()
+        return saved, written
+
+    saved, written = asyncio.run(main())
+    assert saved == ["mood"] and written == {"level": 1}
+    # shutdown() writes everything once more, with the later value
+    assert read_json(path) == {"level": 2}
+    assert os.listdir(tmp_path) == ["mood.json"]
+
+
+def test_on_loop_components_save_on_the_loop_thread(tmp_path):
+    async def main():
+        db_backed, file_backed = Engine(str(tmp_path / "db.json")), Engine(str(tmp_path / "file.json"))
+        checkpointer = StateCheckpointer({"db": db_backed.save_state, "file": file_backed.save_state},
+                                         interval=60, on_loop=("db",))
+        checkpointer.mark_dirty("db", "file")
+        await checkpointer.checkpoint()
+        await checkpointer.shutdown()
+        return db_backed, file_backed
+
+    db_backed, file_backed = asyncio.run(main())
+    loop_thread = threading.get_ident()
+    assert db_backed.threads and set(db_backed.threads) == {loop_thread}
+    # Saved from a snapshot on the checkpoint thread, so the original records nothing
+    assert file_backed.threads == []
+    assert read_json(str(tmp_path / "file.json")) == {"count": 0}
+
+
+def test_failed_saves_are_retried(tmp_path):
+    async def main():
+        engine = Engine(str(tmp_path / "e.json"), fail=1)
+        checkpointer = StateCheckpointer({"e": engine.save_state}, interval=60, on_loop=("e",))
+        checkpointer.mark_dirty("e")
+        first = await checkpointer.checkpoint()
+        dirty = checkpointer.get_stats()["dirty"]
+        second = await checkpointer.checkpoint()
+        await checkpointer.shutdown()
+        return first, dirty, second, checkpointer.get_stats()
+
+    first, dirty, second, stats = asyncio.run(main())
+    assert first == [] and dirty == ["e"] and second == ["e"]
+    assert stats["failures"] == 1
+
+
+def test_save_now_without_a_loop(tmp_path):
+    path = str(tmp_path / "goals.json")
+    checkpointer = StateCheckpointer({"goals": FileState(path, lambda: ["learn"])}, interval=60)
+    checkpointer.mark_dirty("goals")
+    assert checkpointer.save_now() == ["goals"]
+    assert read_json(path) == ["learn"]
@@ -0,0 +1,59 @@
+# test_streaming_filter.py
+import random
+
+import pytest
+
+from streaming_filter import IncrementalResponseFilter, scrub_text
+
+WORDS = [
+    "I,", "Chris", ",", "llama", ", ", "llamas", "language", "model", ",  ", "as an AI, I am programmed to",
+    "\n", "trained by", "x", "  ", "ollama,", "hi", "mistral", "I", "LLM", "\n\n", " ", "_", "a product of", "ai",
+]
+
+
+def stream(text: str, sizes) -> str:
+    """Feeds `text` through the incremental filter in chunks of the given sizes."""
+    response_filter = IncrementalResponseFilter()
+    out, i = [], 0
+    for size in sizes:
+        if i >= len(text):
+            break
+        out.append(response_filter.feed(text[i:i + size]))
+        i += size
+    if i < len(text):
+        out.append(response_filter.feed(text[i:]))
+    out.append(response_filter.flush())
+    return "".join(out)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("I, Chris, think so", "I, Chris, think so"),
+    ("just you and I, really", "just you and I, really"),
+    ("As a language model, I think", "As a I I think"),
+    ("Powered by Ollama.", "Powered by I."),
+    ("Hello\nI was trained by a company\nBye", "Hello\nI was I\nBye"),
+    ("llamas are not llama", "llamas are not I"),
+])
+def test_scrub_text(text, expected):
+    assert scrub_text(text) == expected
+
+
+def test_chunked_stream_matches_scrub_text():
+    rng = random.Random(1)
+    for _ in range(5000):
+        text = "".join(rng.choice(WORDS) + rng.choice(["", " "]) for _ in range(rng.randint(1, 15)))
+        sizes = [rng.randint(1, 6) for _ in range(len(text))]
+        # The done event carries scrub_text's version, which also strips the end
+        assert stream(text, sizes).rstrip() == scrub_text(text), repr(text)
+
+
+def test_word_split_across_chunks_keeps_its_boundary():
+    assert stream("model" + "llama x", [5, 7]) == "modelllama x"
+    assert stream("the llama x", [4, 7]) == "the I x"
+
+
+def test_releases_safe_text_before_the_stream_ends():
+    response_filter = IncrementalResponseFilter()
+    assert response_filter.feed("Hello there, ") == "Hello there, "
+    assert response_filter.feed("I am ll") == "I am "
+    assert response_filter.feed("ama-powered") == "I-powered"
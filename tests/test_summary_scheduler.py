@@ -0,0 +1,91 @@
+# test_summary_scheduler.py
+import asyncio
+
+from summary_scheduler import BackgroundSummarizer
+
+
+class Recorder:
+    def __init__(self, hold=0.0, fail=False):
+        self.calls = []
+        self.hold = hold
+        self.fail = fail
+
+    async def __call__(self, user_id, history):
+        self.calls.append((user_id, list(history)))
+        await asyncio.sleep(self.hold)
+        if self.fail:
+            raise RuntimeError("model offline")
+
+
+def test_runs_after_every_n_messages():
+    async def main():
+        summarize = Recorder()
+        summarizer = BackgroundSummarizer(summarize, every_n_messages=3, idle_seconds=60)
+        for n in range(3):
+            summarizer.request("u", [n])
+        await asyncio.sleep(0.01)
+        stats = summarizer.get_stats()
+        await summarizer.shutdown(drain=False)
+        return summarize, stats
+
+    summarize, stats = asyncio.run(main())
+    assert summarize.calls == [("u", [2])]
+    assert stats["coalesced"] == 2 and stats["completed"] == 1
+
+
+def test_runs_once_the_user_goes_quiet():
+    async def main():
+        summarize = Recorder()
+        summarizer = BackgroundSummarizer(summarize, every_n_messages=10, idle_seconds=0.1)
+        summarizer.request("u", ["a"])
+        await asyncio.sleep(0.06)
+        summarizer.request("u", ["a", "b"]) # Restarts the idle timer
+        await asyncio.sleep(0.06)
+        before_idle = list(summarize.calls)
+        await asyncio.sleep(0.15)
+        await summarizer.shutdown(drain=False)
+        return before_idle, summarize
+
+    before_idle, summarize = asyncio.run(main())
+    assert before_idle == []
+    assert summarize.calls == [("u", ["a", "b"])]
+
+
+def test_requests_during_a_run_fold_into_one_rerun():
+    async def main():
+        summarize = Recorder(hold=0.03)
+        summarizer = BackgroundSummarizer(summarize, every_n_messages=1, idle_seconds=60)
+        summarizer.request("u", [1])
+        await asyncio.sleep(0.01)
+        summarizer.request("u", [1, 2])
+        summarizer.request("u", [1, 2, 3])
+        await asyncio.sleep(0.1)
+        await summarizer.shutdown(drain=False)
+        return summarize
+
+    summarize = asyncio.run(main())
+    assert summarize.calls == [("u", [1]), ("u", [1, 2, 3])]
+
+
+def test_shutdown_drains_pending_summaries():
+    async def main():
+        summarize = Recorder()
+        summarizer = BackgroundSummarizer(summarize, every_n_messages=10, idle_seconds=60)
+        summarizer.request("a", ["hello"])
+        summarizer.request("b", ["hi"])
+        await summarizer.shutdown(drain=True)
+        return summarize, summarizer.get_stats()
+
+    summarize, stats = asyncio.run(main())
+    assert sorted(summarize.calls) == [("a", ["hello"]), ("b", ["hi"])]
+    assert stats["pending"] == 0
+
+
+def test_failures_are_counted_not_raised():
+    async def main():
+        summarizer = BackgroundSummarizer(Recorder(fail=True), every_n_messages=1, idle_seconds=60)
+        summarizer.request("u", ["x"])
+        await summarizer.shutdown(drain=True)
+        return summarizer.get_stats()
+
+    assert asyncio.run(main())["failed"] == 1
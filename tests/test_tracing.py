@@ -0,0 +1,38 @@
+# test_tracing.py
+from tracing import LatencyTracer, current_stage
+
+
+def test_span_records_latency_and_labels_inner_calls():
+    tracer = LatencyTracer(buckets=(0.5, 1.0))
+    with tracer.span("reply"):
+        assert current_stage.get() == "reply"
+        tracer.record_llm_call(current_stage.get(), 0.7, 0.1, {"prompt_eval_count": 12, "eval_count": 30, "eval_duration": 2e9})
+    assert current_stage.get() == "other"
+    text = tracer.render_prometheus()
+    assert 'aichris_stage_latency_seconds_bucket{stage="reply",le="+Inf"} 1' in text
+    assert 'aichris_llm_call_latency_seconds_bucket{call_site="reply",le="0.5"} 0' in text
+    assert 'aichris_llm_call_latency_seconds_bucket{call_site="reply",le="1"} 1' in text
+    assert 'aichris_llm_completion_tokens_total{call_site="reply"} 30' in text
+    assert 'aichris_llm_eval_duration_seconds_total{call_site="reply"} 2' in text
+
+
+def test_running_totals_are_typed_as_counters():
+    tracer = LatencyTracer()
+    tracer.inc("llm_errors_total", call_site="reply")
+    text = tracer.render_prometheus(
+        gauges={"tts_cache_bytes": {(): 2048}},
+        counters={"tts_cache_hits_total": {(): 7}, "llm_errors_total": {(("call_site", "meta"),): 2}},
+    )
+    assert "# TYPE aichris_tts_cache_hits_total counter" in text
+    assert "# TYPE aichris_tts_cache_bytes gauge" in text
+    assert text.count("# TYPE aichris_llm_errors_total counter") == 1
+    assert 'aichris_llm_errors_total{call_site="meta"} 2' in text
+    assert 'aichris_llm_errors_total{call_site="reply"} 1' in text
+    assert not any(line.startswith("# TYPE") and line.split()[2].endswith("_total") and line.endswith("gauge")
+                   for line in text.splitlines())
+
+
+def test_label_values_are_escaped():
+    tracer = LatencyTracer()
+    tracer.inc("llm_calls_total", call_site='say "hi"\n')
+    assert 'call_site="say \\"hi\\"\\n"' in tracer.render_prometheus()
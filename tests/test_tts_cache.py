@@ -0,0 +1,105 @@
+# test_tts_cache.py
+import asyncio
+import os
+import uuid
+
+from tts_cache import TTSAudioCache, tts_cache_key
+
+
+class FakeSynthesizer:
+    """Writes a file named like a fresh TTS output into the audio directory."""
+
+    def __init__(self, directory, size=100, hold=0.0):
+        self.directory = directory
+        self.size = size
+        self.hold = hold
+        self.calls = 0
+
+    async def __call__(self, text, style):
+        self.calls += 1
+        await asyncio.sleep(self.hold)
+        name = f"response_{uuid.uuid4().hex}.mp3"
+        with open(os.path.join(self.directory, name), "wb") as f:
+            f.write(b"x" * self.size)
+        return f"audio/{name}"
+
+
+def test_key_depends_on_text_voice_and_style():
+    base = tts_cache_key("hello", {"rate": 1}, "david")
+    assert base == tts_cache_key("hello", {"rate": 1}, "david")
+    assert base != tts_cache_key("hello", {"rate": 2}, "david")
+    assert base != tts_cache_key("hello", {"rate": 1}, "mark")
+    assert base != tts_cache_key("hello!", {"rate": 1}, "david")
+
+
+def test_second_request_is_served_from_the_cache(tmp_path):
+    async def main():
+        cache = TTSAudioCache(str(tmp_path))
+        synthesize = FakeSynthesizer(str(tmp_path))
+        first = await cache.get_or_create("hello", {}, synthesize)
+        second = await cache.get_or_create("hello", {}, synthesize)
+        return cache, synthesize, first, second
+
+    cache, synthesize, first, second = asyncio.run(main())
+    assert first == second and synthesize.calls == 1
+    name = first[len("audio/"):]
+    assert TTSAudioCache.is_cached_name(name)
+    assert os.listdir(tmp_path) == [name] # Renamed to its content address
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_concurrent_requests_share_one_synthesis(tmp_path):
+    async def main():
+        cache = TTSAudioCache(str(tmp_path))
+        synthesize = FakeSynthesizer(str(tmp_path), hold=0.02)
+        urls = await asyncio.gather(*(cache.get_or_create("same", {}, synthesize) for _ in range(5)))
+        return synthesize, urls
+
+    synthesize, urls = asyncio.run(main())
+    assert synthesize.calls == 1 and len(set(urls)) == 1
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    async def main():
+        cache = TTSAudioCache(str(tmp_path), max_bytes=250)
+        synthesize = FakeSynthesizer(str(tmp_path), size=100)
+        first = await cache.get_or_create("one", {}, synthesize)
+        await cache.get_or_create("two", {}, synthesize)
+        await cache.get_or_create("one", {}, synthesize) # Now "two" is the oldest
+        await cache.get_or_create("three", {}, synthesize)
+        return cache, first
+
+    cache, first = asyncio.run(main())
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1 and stats["bytes"] == 200
+    assert os.path.exists(tmp_path / first[len("audio/"):])
+
+
+def test_existing_files_are_indexed_on_startup(tmp_path):
+    async def main():
+        cache = TTSAudioCache(str(tmp_path))
+        return await cache.get_or_create("hello", {}, FakeSynthesizer(str(tmp_path)))
+
+    url = asyncio.run(main())
+    restarted = TTSAudioCache(str(tmp_path))
+
+    async def again():
+        synthesize = FakeSynthesizer(str(tmp_path))
+        return await restarted.get_or_create("hello", {}, synthesize), synthesize
+
+    second, synthesize = asyncio.run(again())
+    assert second == url and synthesize.calls == 0
+
+
+def test_audio_written_elsewhere_is_passed_through(tmp_path):
+    async def main():
+        cache = TTSAudioCache(str(tmp_path))
+
+        async def remote(text, style):
+            return "https://tts.example.com/clip.mp3"
+
+        return cache, await cache.get_or_create("hi", {}, remote)
+
+    cache, url = asyncio.run(main())
+    assert url == "https://tts.example.com/clip.mp3"
+    assert cache.get_stats()["uncacheable"] == 1
@@ -0,0 +1,58 @@
+# test_tts_pipeline.py
+import asyncio
+
+from tts_pipeline import SentenceAudioStream, SentenceSplitter, TTSWorkerPool, split_sentences
+
+
+def test_splitter_waits_for_the_sentence_end():
+    splitter = SentenceSplitter(min_chars=1)
+    assert splitter.feed("Pi is 3.") == []
+    assert splitter.feed("14 or so. And") == ["Pi is 3.14 or so."]
+    assert splitter.flush() == ["And"]
+    assert splitter.flush() == []
+
+
+def test_splitter_skips_abbreviations_and_merges_short_sentences():
+    assert split_sentences("Dr. Smith is here. Hi. How are you doing today?", min_chars=10) == [
+        "Dr. Smith is here.",
+        "Hi. How are you doing today?",
+    ]
+
+
+def test_split_sentences_breaks_on_newlines():
+    assert split_sentences("First line here\nSecond line here", min_chars=1) == ["First line here", "Second line here"]
+
+
+def test_audio_comes_back_in_sentence_order():
+    async def main():
+        async def synthesize(text, style):
+            # Later sentences finish first
+            await asyncio.sleep(0.03 if text == "one" else 0.0)
+            return f"/audio/{text}.mp3"
+
+        audio = SentenceAudioStream(TTSWorkerPool(max_workers=3), synthesize)
+        for sentence in ("one", "", "two", "three"):
+            audio.add(sentence)
+        audio.close()
+        return [chunk async for chunk in audio.results()]
+
+    chunks = asyncio.run(main())
+    assert [chunk["text"] for chunk in chunks] == ["one", "two", "three"]
+    assert [chunk["index"] for chunk in chunks] == [0, 1, 2]
+    assert chunks[0]["audioUrl"] == "/audio/one.mp3"
+
+
+def test_failed_synthesis_yields_no_audio():
+    async def main():
+        async def synthesize(text, style):
+            raise RuntimeError("voice unavailable")
+
+        pool = TTSWorkerPool(max_workers=1)
+        audio = SentenceAudioStream(pool, synthesize)
+        audio.add("Hello there.")
+        audio.close()
+        return [chunk async for chunk in audio.results()], pool
+
+    chunks, pool = asyncio.run(main())
+    assert chunks == [{"index": 0, "text": "Hello there.", "audioUrl": None}]
+    assert pool.get_stats()["failed"] == 1
@@ -0,0 +1,103 @@
+# test_vector_memory.py
+import threading
+
+import numpy as np
+import pytest
+
+from vector_memory_engine import VectorMemoryEngine, hashing_embedding, memory_db_path_for
+
+EXCHANGES = [
+    ("My dog Biscuit loves chasing tennis balls", "Biscuit sounds like a very energetic dog!"),
+    ("I'm learning to play the violin", "Violin is hard at first, keep practising."),
+    ("We went hiking in the mountains last summer", "Mountain hikes are the best kind of summer."),
+    ("My favourite food is spicy ramen", "Spicy ramen is a great choice."),
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = VectorMemoryEngine(str(tmp_path / "vectors.db"))
+    yield engine
+    engine.close()
+
+
+def remember(engine, user_id, exchanges=EXCHANGES):
+    for user_text, bot_text in exchanges:
+        engine.add_exchange(user_id, user_text, bot_text, hashing_embedding(f"{user_text}\n{bot_text}"))
+
+
+def test_embedding_is_stable_and_normalised():
+    vector = hashing_embedding("Tell me about my dog")
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+    assert np.array_equal(vector, hashing_embedding("Tell me about my dog"))
+    assert not hashing_embedding("the and of").any() # Only stopwords
+
+
+def test_recall_ranks_the_most_similar_exchange_first(engine):
+    remember(engine, "u")
+    matches = engine.search("u", hashing_embedding("how is your dog Biscuit doing?"), k=2)
+    assert matches[0]["user"] == EXCHANGES[0][0]
+    assert all(a["score"] >= b["score"] for a, b in zip(matches, matches[1:]))
+    assert engine.search("u", hashing_embedding("violin practice tips"), k=1)[0]["user"] == EXCHANGES[1][0]
+
+
+def test_unrelated_queries_and_other_users_recall_nothing(engine):
+    remember(engine, "u")
+    assert engine.search("u", hashing_embedding("quantum chromodynamics lecture")) == []
+    assert engine.search("someone else", hashing_embedding("dog Biscuit")) == []
+
+
+def test_memories_survive_a_restart(tmp_path):
+    path = str(tmp_path / "vectors.db")
+    first = VectorMemoryEngine(path)
+    remember(first, "u")
+    first.close()
+    second = VectorMemoryEngine(path)
+    assert second.count("u") == len(EXCHANGES)
+    # Rows from another embedder can't be compared, so they're not loaded
+    assert VectorMemoryEngine(path, embedder_name="ollama:other").count("u") == 0
+    second.close()
+
+
+def test_least_recently_used_indexes_are_evicted_and_reloaded(tmp_path):
+    engine = VectorMemoryEngine(str(tmp_path / "vectors.db"), max_users=2)
+    for user_id in ("a", "b", "c"):
+        remember(engine, user_id, EXCHANGES[:1])
+    assert engine.get_stats()["cached_users"] == 2
+    assert engine.get_stats()["evictions"] == 1
+    # "a" was evicted, but its memories are still there
+    assert engine.search("a", hashing_embedding("dog Biscuit"))[0]["user"] == EXCHANGES[0][0]
+    engine.close()
+
+
+def test_search_while_adding_never_sees_a_half_written_row(engine):
+    errors = []
+    query = hashing_embedding("dog Biscuit tennis balls")
+
+    def writer():
+        for n in range(300):
+            engine.add_exchange("u", f"message {n}", "reply", hashing_embedding(f"message {n} dog"))
+
+    def reader():
+        try:
+            for _ in range(300):
+                for match in engine.search("u", query, k=5):
+                    assert match["user"].startswith("message ")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert engine.count("u") == 300
+
+
+def test_db_path_follows_the_database_engine(tmp_path):
+    class FakeDatabase:
+        db_path = str(tmp_path / "mind.db")
+
+    assert memory_db_path_for(FakeDatabase()) == str(tmp_path / "vector_memory.db")
+    assert memory_db_path_for(object()) == "vector_memory.db"
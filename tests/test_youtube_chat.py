@@ -0,0 +1,121 @@
+# test_youtube_chat.py
+import asyncio
+import itertools
+
+import pytest
+
+from youtube_chat import (ChatMessage, ChatTriage, ReplySelector, YouTubeChatIngestor, YouTubeLiveChatPoller,
+                          normalize_chat_text, score_sentiment_batch)
+
+
+_ids = itertools.count()
+
+
+def message(text, author="a", message_id=None, **flags):
+    return ChatMessage(message_id or f"m{next(_ids)}", author, author.upper(), text, **flags)
+
+
+def test_normalize_collapses_repeats_and_punctuation():
+    assert normalize_chat_text("Sooooo GOOD!!! 🔥") == "soo good"
+    assert normalize_chat_text("so good") == normalize_chat_text("SO... good?")
+
+
+def test_only_text_messages_come_from_the_api():
+    item = {"id": "1", "snippet": {"type": "textMessageEvent", "displayMessage": "hi"},
+            "authorDetails": {"channelId": "c1", "displayName": "Viewer", "isChatModerator": True}}
+    parsed = ChatMessage.from_api(item)
+    assert parsed.text == "hi" and parsed.user_id == "yt_c1" and parsed.is_moderator
+    assert ChatMessage.from_api({"snippet": {"type": "superChatEvent", "displayMessage": "$5"}}) is None
+
+
+def test_poll_interval_follows_the_quota_share():
+    poller = YouTubeLiveChatPoller(live_chat_id="chat", api_key="k", daily_quota=10000, quota_share=0.5)
+    # 5000 units / 5 per poll = 1000 polls a day
+    assert poller.min_interval == 86.4
+
+
+def test_triage_drop_reasons():
+    triage = ChatTriage(window=60, author_max_per_minute=3, copypasta_authors=3, max_chars=50)
+    first = message("hello there", "a", message_id="same")
+    assert triage.check(first) is None
+    assert triage.check(message("hello there", "b", message_id="same")) == "duplicate"
+    assert triage.check(message("!!", "b")) == "empty"
+    assert triage.check(message("x" * 60, "b")) == "too_long"
+    assert triage.check(message("see www.spam.com/offer", "b")) == "link"
+    assert triage.check(message("see www.rules.com/chat", "mod", is_moderator=True)) is None
+    assert triage.check(message("HELLO THERE!!", "a")) == "repeat"
+
+
+def test_triage_catches_copypasta_and_chatty_viewers():
+    triage = ChatTriage(window=60, author_max_per_minute=2, copypasta_authors=3, max_chars=300)
+    assert [triage.check(message("pog pog pog", author)) for author in "xyz"] == [None, None, "copypasta"]
+    assert [triage.check(message(f"thought number {n}", "talker")) for n in range(3)] == [None, None, "rate_limited"]
+
+
+def test_priority_selection_prefers_questions_and_mentions():
+    selector = ReplySelector(max_per_window=2, policy="priority", bot_names=["chris"], seed=1)
+    for text in ("nice stream", "what game is this?", "lol", "chris say hi", "gg"):
+        selector.offer(message(text))
+    assert [m.text for m in selector.take()] == ["chris say hi", "what game is this?"]
+    assert selector.take() == []
+
+
+def test_first_and_random_policies_keep_at_most_the_window():
+    first = ReplySelector(max_per_window=2, policy="first")
+    sampled = ReplySelector(max_per_window=2, policy="random", seed=3)
+    texts = [f"message {n}" for n in range(10)]
+    for text in texts:
+        first.offer(message(text))
+        sampled.offer(message(text))
+    assert [m.text for m in first.take()] == ["message 0", "message 1"]
+    chosen = [m.text for m in sampled.take()]
+    assert len(chosen) == 2 and set(chosen) <= set(texts)
+
+
+class Scorer:
+    def __init__(self, scores):
+        self.scores = scores
+        self.calls = []
+
+    def score_text(self, text):
+        self.calls.append(text)
+        return self.scores.get(text, 0.0)
+
+
+def test_sentiment_is_scored_once_per_distinct_text():
+    scorer = Scorer({"love it": 0.8, "boo": -0.5})
+    scores = score_sentiment_batch(scorer, ["love it", "boo", "love it"])
+    assert scores.tolist() == pytest.approx([0.8, -0.5, 0.8])
+    assert scorer.calls == ["love it", "boo"]
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name,) + args)
+
+
+class FakeMind:
+    def __init__(self, scores):
+        self.emotional_feedback_engine = Scorer(scores)
+        self.mood_engine = Recorder()
+        self.trust_engine = Recorder()
+        self.mental_health_engine = Recorder()
+        self.checkpointer = Recorder()
+
+
+def test_a_batch_updates_mood_once_and_trust_per_viewer():
+    mind = FakeMind({"great stream": 0.9, "so fun": 0.6, "meh": -0.2})
+    ingestor = YouTubeChatIngestor(mind, YouTubeLiveChatPoller(live_chat_id="chat", api_key="k"),
+                                   selector=ReplySelector(max_per_window=5, policy="first"))
+    batch = [message("great stream", "a"), message("so fun", "a"), message("meh", "b"), message("!!", "c")]
+    asyncio.run(ingestor.ingest(batch))
+
+    assert mind.mood_engine.calls == [("positive_interaction",)]
+    assert mind.trust_engine.calls == [("positive_interaction", "yt_a"), ("negative_interaction", "yt_b")]
+    assert mind.checkpointer.calls == [("mark_dirty", "mood", "trust", "mental_health")]
+    stats = ingestor.get_stats()
+    assert stats["ingested_total"] == 4 and stats["dropped_total"] == {"empty": 1}
+    assert [m.text for m in ingestor.selector.take()] == ["great stream", "so fun", "meh"]
@@ -0,0 +1,131 @@
+# tracing.py
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+# Latency buckets in seconds, from fast local work up to slow CPU generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# The innermost stage currently running, used to label LLM calls made inside it
+current_stage = contextvars.ContextVar("current_stage", default="other")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class LatencyTracer:
+    """
+    Span-based timing for the chat pipeline. Spans feed per-stage latency
+    histograms; LLM calls add token counts, Ollama's own timings and queue wait.
+    Everything can be rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, namespace: str = "aichris", buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._lock = threading.Lock() # Rendered from the web thread, recorded on the event loop
+
+    @contextmanager
+    def span(self, stage: str):
+        """Times a block as one pipeline stage. LLM calls inside it are labelled with the stage."""
+        token = current_stage.set(stage)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current_stage.reset(token)
+            self.observe("stage_latency_seconds", time.perf_counter() - start, stage=stage)
+
+    def observe(self, name: str, value: float, **labels):
+        """Adds one observation to a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        """Increments a counter."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def record_llm_call(self, call_site: str, seconds: float, queue_wait: float, response: Dict = None):
+        """Records wall time, queue wait and (if present) Ollama's token counts and durations for one call."""
+        self.observe("llm_call_latency_seconds", seconds, call_site=call_site)
+        self.observe("llm_queue_wait_seconds", queue_wait, call_site=call_site)
+        self.inc("llm_calls_total", call_site=call_site)
+        if not response:
+            return
+        self.inc("llm_prompt_tokens_total", response.get("prompt_eval_count", 0), call_site=call_site)
+        self.inc("llm_completion_tokens_total", response.get("eval_count", 0), call_site=call_site)
+        # Ollama reports durations in nanoseconds
+        for field in ("load_duration", "prompt_eval_duration", "eval_duration"):
+            if field in response:
+                self.inc(f"llm_{field}_seconds_total", response[field] / 1e9, call_site=call_site)
+
+    def render_prometheus(self, gauges: Dict[str, Dict[Labels, float]] = None,
+                          counters: Dict[str, Dict[Labels, float]] = None) -> str:
+        """
+        Renders all metrics as Prometheus text, plus point-in-time `gauges` and
+        `counters`: current totals of monotonic counts kept elsewhere (caches,
+        queues), which must be typed as counters for rate() to work.
+        """
+        lines = []
+        with self._lock:
+            all_counters = {name: dict(series) for name, series in self._counters.items()}
+            for name, series in sorted(self._histograms.items()):
+                full_name = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {full_name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {count}")
+                    lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {_format_value(histogram.total)}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+        for name, series in (counters or {}).items():
+            all_counters.setdefault(name, {}).update(series)
+        for name, series in sorted(all_counters.items()):
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {full_name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+        for name, series in sorted((gauges or {}).items()):
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {full_name} gauge")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
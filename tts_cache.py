@@ -0,0 +1,167 @@
+# tts_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from async_utils import run_blocking
+
+# Cached files are named after the SHA-256 of what they say and how they say it
+CACHE_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.[A-Za-z0-9]+$")
+
+
+def tts_cache_key(text: str, style: Dict = None, voice: str = "") -> str:
+    """Hashes the exact text, voice and style settings that produce one audio file."""
+    material = json.dumps({"text": text, "voice": voice or "", "style": style or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSAudioCache:
+    """
+    Content-addressed cache for synthesised speech. Each file in the audio
+    directory is renamed to the hash of (text, voice, style), so identical
+    requests reuse it. The directory is kept under `max_bytes` by evicting the
+    least recently used files. Concurrent requests for the same audio share one
+    synthesis.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = None, url_prefix: str = "audio/"):
+        self.directory = directory
+        self.max_bytes = max_bytes or int(float(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024)
+        self.url_prefix = url_prefix
+        self._entries: "OrderedDict[str, int]" = OrderedDict() # filename -> size, least recently used first
+        self._by_key: Dict[str, str] = {}                          # cache key -> filename
+        self._total_bytes = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncacheable = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Indexes existing files (including ones written before the cache existed) by last use, then trims."""
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        with self._lock:
+            for _, name, size in sorted(files):
+                self._add(name, size)
+            self._evict()
+        print(f"TTS cache: {len(self._entries)} file(s), {self._total_bytes / 1024 / 1024:.1f} MB in {self.directory}")
+
+    def _add(self, name: str, size: int):
+        self._remove(name)
+        self._entries[name] = size
+        self._total_bytes += size
+        if self.is_cached_name(name):
+            self._by_key[name.split(".", 1)[0]] = name
+
+    def _remove(self, name: str):
+        if name in self._entries:
+            self._total_bytes -= self._entries.pop(name)
+            self._by_key.pop(name.split(".", 1)[0], None)
+
+    def _touch(self, name: str):
+        self._entries.move_to_end(name)
+        try:
+            # The mtime doubles as the last-use time, so LRU order survives restarts
+            os.utime(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Removes least recently used files until the directory fits. Call with the lock held."""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name = next(iter(self._entries))
+            self._remove(name)
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError as e:
+                print(f"TTS cache: could not remove {name}: {e}")
+
+    async def get_or_create(self, text: str, style: Dict, synthesize: Callable[[str, Dict], Awaitable[Optional[str]]], voice: str = "") -> Optional[str]:
+        """Returns the URL of cached audio for this text/voice/style, synthesising it on a miss."""
+        key = tts_cache_key(text, style, voice)
+        with self._lock:
+            name = self._by_key.get(key)
+            if name and os.path.exists(os.path.join(self.directory, name)):
+                self.hits += 1
+                self._touch(name)
+                return self.url_prefix + name
+            if name:
+                # Deleted behind our back
+                self._remove(name)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            url = await self._store(key, await synthesize(text, style))
+            future.set_result(url)
+            return url
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception() # Mark retrieved; waiters (if any) still get the error
+            raise
+        finally:
+            del self._pending[key]
+
+    async def _store(self, key: str, audio_url: Optional[str]) -> Optional[str]:
+        """Renames a freshly synthesised file to its content address and adds it to the index."""
+        if not audio_url:
+            return audio_url
+        source = os.path.join(self.directory, os.path.basename(urlparse(audio_url).path))
+        if not os.path.isfile(source):
+            # Not written where we can manage it; hand the URL back untouched
+            self.uncacheable += 1
+            return audio_url
+
+        name = key + os.path.splitext(source)[1].lower()
+        target = os.path.join(self.directory, name)
+        await run_blocking(os.replace, source, target)
+        size = os.path.getsize(target)
+        with self._lock:
+            self._remove(os.path.basename(source))
+            self._add(name, size)
+            self._evict()
+        return self.url_prefix + name
+
+    @staticmethod
+    def is_cached_name(filename: str) -> bool:
+        """True for content-addressed files, whose bytes never change."""
+        return bool(CACHE_NAME_PATTERN.match(filename))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "files": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "uncacheable": self.uncacheable,
+            }
@@ -0,0 +1,128 @@
+# tts_pipeline.py
+import asyncio
+import os
+import re
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+# Sentence-ending punctuation (plus closing quotes/brackets) followed by whitespace, or a line break.
+# Requiring the whitespace means a '.' at the very end of a chunk waits for the next one ("3." + "14").
+_SENTENCE_END = re.compile(r"[.!?…]+[\"')\]”’]*(?=\s)|\n+")
+_ABBREVIATIONS = frozenset("mr mrs ms dr st vs etc e.g i.e jr sr prof approx".split())
+
+
+class SentenceSplitter:
+    """
+    Splits text that arrives in chunks into sentences for TTS. Very short
+    sentences are merged with the next one, so each synthesis request has
+    enough to say to sound natural.
+    """
+
+    def __init__(self, min_chars: int = None):
+        self.min_chars = min_chars or int(os.getenv("TTS_MIN_SENTENCE_CHARS", "24"))
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Adds text and returns any sentences that are now complete."""
+        self._buffer += text
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            candidate = self._buffer[start:match.end()].strip()
+            if match.group(0) == ".":
+                words = self._buffer[start:match.start()].split()
+                if words and words[-1].lower() in _ABBREVIATIONS:
+                    continue
+            if len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> List[str]:
+        """Returns whatever is left once the text is complete."""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if rest else []
+
+
+def split_sentences(text: str, min_chars: int = None) -> List[str]:
+    """Splits a complete reply into TTS-sized sentences."""
+    splitter = SentenceSplitter(min_chars)
+    return splitter.feed(text + " ") + splitter.flush()
+
+
+class TTSWorkerPool:
+    """Bounds how many sentences are synthesised at once, across all replies."""
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or int(os.getenv("TTS_MAX_WORKERS", "2"))
+        self._semaphore: Optional[asyncio.Semaphore] = None # Created on the event loop
+        self.synthesised = 0
+        self.failed = 0
+
+    async def run(self, synthesize: Callable[[str, Dict], Awaitable[Optional[str]]], text: str, style: Dict) -> Optional[str]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        async with self._semaphore:
+            try:
+                audio_url = await synthesize(text, style)
+            except Exception as e:
+                self.failed += 1
+                print(f"Error synthesising sentence audio: {e}")
+                return None
+        self.synthesised += 1
+        return audio_url
+
+    def get_stats(self) -> Dict:
+        return {"max_workers": self.max_workers, "synthesised": self.synthesised, "failed": self.failed}
+
+
+class SentenceAudioStream:
+    """
+    The audio for one reply. Sentences are added as the text comes in and
+    synthesised concurrently on the worker pool; `results()` yields them back
+    in sentence order as soon as each one (and everything before it) is ready.
+    """
+
+    def __init__(self, pool: TTSWorkerPool, synthesize: Callable[[str, Dict], Awaitable[Optional[str]]], style: Dict = None):
+        self.pool = pool
+        self.synthesize = synthesize
+        self.style = style or {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._cancelled = False
+
+    def add(self, sentence: str):
+        if not sentence or not sentence.strip():
+            return # Nothing left to say once filtered
+        task = asyncio.create_task(self.pool.run(self.synthesize, sentence, self.style))
+        self._tasks.append(task)
+        self._queue.put_nowait((sentence, task))
+
+    def close(self):
+        """Marks the reply as complete; `results()` ends after the last sentence."""
+        self._queue.put_nowait(None)
+
+    def cancel(self):
+        """Drops any synthesis that hasn't finished and ends `results()`."""
+        self._cancelled = True
+        for task in self._tasks:
+            task.cancel()
+        self.close()
+
+    async def results(self) -> AsyncIterator[Dict]:
+        index = 0
+        while True:
+            item = await self._queue.get()
+            if item is None or self._cancelled:
+                return
+            sentence, task = item
+            try:
+                audio_url = await task
+            except asyncio.CancelledError:
+                if self._cancelled:
+                    return
+                raise
+            yield {"index": index, "text": sentence, "audioUrl": audio_url}
+            index += 1
@@ -0,0 +1,180 @@
+# vector_memory_engine.py
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Words too common to say anything about what a message is about
+_STOPWORDS = frozenset(
+    "a an the and or but if so of to in on at for with about is am are was were be been do does did "
+    "i me my you your it its this that what how why when where who can could would should will just".split()
+)
+
+
+def hashing_embedding(text: str, dim: int = 512) -> np.ndarray:
+    """
+    A local, model-free embedding: words and word pairs are hashed into a fixed
+    number of buckets (with a hashed sign) and the vector is L2-normalised.
+    Uses crc32 rather than hash() so vectors are stable across restarts.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    words = [w[:-2] if w.endswith("'s") else w for w in _WORD_PATTERN.findall((text or "").lower())]
+    words = [w for w in words if w not in _STOPWORDS]
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for feature in features:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _UserIndex:
+    """In-memory vectors and texts for one user. Rows are L2-normalised."""
+
+    def __init__(self):
+        self.vectors: Optional[np.ndarray] = None # Allocated on first add, once the dimension is known
+        self.count = 0
+        self.entries: List[Dict] = []
+
+    def add(self, vector: np.ndarray, entry: Dict):
+        if self.vectors is None:
+            self.vectors = np.zeros((16, vector.shape[0]), dtype=np.float32)
+        if vector.shape[0] != self.vectors.shape[1]:
+            return
+        if self.count == len(self.vectors):
+            # Grow by doubling so appends stay cheap
+            grown = np.zeros((len(self.vectors) * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:self.count] = self.vectors[:self.count]
+            self.vectors = grown
+        self.vectors[self.count] = vector
+        self.entries.append(entry)
+        self.count += 1
+
+    def snapshot(self):
+        """
+        The stored rows as (vectors, entries). Rows below `count` are never
+        written again (growing copies them), so the snapshot can be searched
+        without the lock while new exchanges are added.
+        """
+        if self.count == 0:
+            return None, []
+        return self.vectors[:self.count], self.entries[:self.count]
+
+
+def _top_k(vectors: Optional[np.ndarray], entries: List[Dict], query: np.ndarray, k: int, min_score: float) -> List[Dict]:
+    if vectors is None or query.shape[0] != vectors.shape[1]:
+        return []
+    scores = vectors @ query
+    k = min(k, len(entries))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [dict(entries[i], score=float(scores[i])) for i in top if scores[i] >= min_score]
+
+
+class VectorMemoryEngine:
+    """
+    Long-term conversation memory backed by embeddings. Every exchange is stored
+    as a vector (in SQLite, next to the main database) and the few past exchanges
+    most similar to a new message can be recalled with a brute-force top-k search.
+    Only the `max_users` most recently used users are kept in memory; the rest
+    are loaded back from SQLite when they next talk.
+    """
+
+    def __init__(self, db_path: str = "vector_memory.db", embedder_name: str = "hashing-512", max_users: int = None):
+        self.db_path = db_path
+        # Vectors from different embedders can't be compared, so each row records its embedder
+        self.embedder_name = embedder_name
+        self.max_users = max_users or int(os.getenv("VECTOR_MEMORY_MAX_USERS", "200"))
+        self._indexes: "OrderedDict[str, _UserIndex]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memory_vectors ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_id TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " embedder TEXT NOT NULL,"
+            " user_text TEXT NOT NULL,"
+            " bot_text TEXT NOT NULL,"
+            " vector BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_vectors_user ON memory_vectors (user_id, embedder)")
+        self._conn.commit()
+
+    def _get_index(self, user_id: str) -> _UserIndex:
+        """Returns the user's in-memory index, loading it from SQLite on first use."""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+                return index
+
+            index = _UserIndex()
+            rows = self._conn.execute(
+                "SELECT created, user_text, bot_text, vector FROM memory_vectors WHERE user_id = ? AND embedder = ? ORDER BY id",
+                (user_id, self.embedder_name)
+            ).fetchall()
+            for created, user_text, bot_text, blob in rows:
+                index.add(np.frombuffer(blob, dtype=np.float32), {"created": created, "user": user_text, "assistant": bot_text})
+            self._indexes[user_id] = index
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+                self.evictions += 1
+            return index
+
+    def add_exchange(self, user_id: str, user_text: str, bot_text: str, vector: np.ndarray):
+        """Stores one user message and reply. Blocking; run it off the event loop."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        created = time.time()
+
+        with self._lock:
+            # Load the index before inserting, so the new row isn't loaded and then added twice
+            index = self._get_index(user_id)
+            self._conn.execute(
+                "INSERT INTO memory_vectors (user_id, created, embedder, user_text, bot_text, vector) VALUES (?, ?, ?, ?, ?, ?)",
+                (user_id, created, self.embedder_name, user_text, bot_text, vector.tobytes())
+            )
+            self._conn.commit()
+            index.add(vector, {"created": created, "user": user_text, "assistant": bot_text})
+
+    def search(self, user_id: str, vector: np.ndarray, k: int = 3, min_score: float = 0.1) -> List[Dict]:
+        """Returns up to k past exchanges most similar to the query vector, best first."""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return []
+        with self._lock:
+            vectors, entries = self._get_index(user_id).snapshot()
+        return _top_k(vectors, entries, vector / norm, k, min_score)
+
+    def count(self, user_id: str) -> int:
+        with self._lock:
+            return self._get_index(user_id).count
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {"cached_users": len(self._indexes), "max_users": self.max_users, "evictions": self.evictions}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def memory_db_path_for(db_engine, filename: str = "vector_memory.db") -> str:
+    """Places the vector store in the same directory as the DatabaseEngine's file, if it exposes one."""
+    db_path: Optional[str] = getattr(db_engine, "db_path", None) or getattr(db_engine, "db_file", None)
+    if isinstance(db_path, str) and db_path not in ("", ":memory:"):
+        return os.path.join(os.path.dirname(os.path.abspath(db_path)), filename)
+    return filename
@@ -1,13 +1,29 @@
-from flask import Flask, render_template, send_from_directory, request, jsonify
+from flask import Flask, render_template, send_from_directory, request, jsonify, Response
 from flask_socketio import SocketIO, emit
 import os
 import asyncio
+import json
+import uuid
+from chat_jobs import ChatJobQueue, QueueFullError
+from tts_cache import TTSAudioCache
+from tts_pipeline import SentenceAudioStream, SentenceSplitter, TTSWorkerPool, split_sentences
+from youtube_chat import YouTubeChatIngestor, YouTubeLiveChatPoller
 
 # This will be the bridge to the main ChatBot instance
 main_chatbot_instance = None
 
 app = Flask(__name__, template_folder='web_ui', static_folder='web_ui')
 socketio = SocketIO(app, cors_allowed_origins="*")
+# Push reply tokens to web clients as they are generated (WEB_STREAM_REPLIES=0 turns it off)
+STREAM_REPLIES = os.getenv("WEB_STREAM_REPLIES", "1").lower() in ("1", "true", "yes")
+# Bounded admission for /api/chat, so bursts get a 429 instead of piling up threads and loop work
+chat_jobs = ChatJobQueue()
+# Sentence-level TTS runs on a small shared pool (TTS_MAX_WORKERS)
+tts_pool = TTSWorkerPool()
+# Content-addressed, size-bounded store for everything in web_ui/audio
+tts_cache = TTSAudioCache(os.path.join(app.static_folder, 'audio'))
+# The running YouTube live-chat monitor, if any
+youtube_ingestor = None
 
 def set_main_chatbot_instance(instance):
     """Establishes the connection to the main ChatBot application."""
@@ -31,41 +47,217 @@ def serve_static(filename):
     """Serves static files like CSS and JS."""
     # Add a special route for the audio files
     if filename.startswith('audio/'):
-        return send_from_directory(os.path.join(app.static_folder, 'audio'), filename.split('/')[1])
+        return serve_audio(filename.split('/')[1])
     return send_from_directory(app.static_folder, filename)
 
+def serve_audio(filename):
+    """
+    Serves a TTS audio file with range request support (conditional=True).
+    Cached files are content-addressed, so their name is a strong ETag and
+    they can be cached by the browser forever.
+    """
+    if TTSAudioCache.is_cached_name(filename):
+        response = send_from_directory(tts_cache.directory, filename, conditional=True,
+                                       etag=filename.split('.', 1)[0], max_age=31536000)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+    response = send_from_directory(tts_cache.directory, filename, conditional=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/chat', methods=['POST'])
 def handle_chat_api():
-    """Handles POST requests for chat, compatible with Vercel AI Playground."""
-    data = request.json
+    """
+    Handles POST requests for chat, compatible with Vercel AI Playground.
+    Requests go through a bounded admission queue: when it is full the client
+    gets a 429 with Retry-After. Send "mode": "job" to get a job id back
+    immediately and poll /api/chat/jobs/<id> (or stream its /events) instead
+    of waiting. "deadline" (seconds) bounds queue time plus generation.
+    Waiting callers each hold a web thread until their reply is ready, so
+    only API_MAX_SYNC_WAITERS of them are admitted at once; job mode is the
+    one to use under load.
+    """
+    data = request.get_json(silent=True) or {}
     user_input = data.get('message')
     # history = data.get('history') # Vercel may send history, we can use it later if needed.
+    user_id = data.get('userId') # Optional: callers that send one get a persistent conversation
 
     if not user_input:
         return jsonify({"error": "No message provided"}), 400
 
-    if main_chatbot_instance:
-        try:
-            # Use the synchronous wrapper to call the async mind function from a sync context
-            response_data = main_chatbot_instance.mind.generate_chat_response_sync(
-                'api_user', 
-                'API User', 
-                user_input, 
-                [] # Start with empty history for API calls for now
-            )
-            
-            if response_data and "reply" in response_data:
-                bot_response = response_data.get("reply", "I'm at a loss for words.")
-                # The template expects a JSON object with a specific structure
-                return jsonify({"response": bot_response})
-            else:
-                return jsonify({"error": "AI failed to generate a response"}), 500
-        except Exception as e:
-            print(f"Error during API chat handle: {e}")
-            return jsonify({"error": "An internal error occurred."}), 500
-    else:
+    loop = getattr(main_chatbot_instance, 'async_loop', None)
+    if not main_chatbot_instance or not loop or not loop.is_running():
         return jsonify({"error": "AI mind is not connected"}), 503
 
+    try:
+        deadline = float(data['deadline']) if data.get('deadline') else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "deadline must be a number of seconds"}), 400
+
+    async def generate():
+        mind = main_chatbot_instance.mind
+        history = await mind.history_store.aget(f"api_{user_id}") if user_id else [] # Anonymous calls start fresh
+        async for event in mind.generate_chat_response_stream(f"api_{user_id}" if user_id else 'api_user', 'API User', user_input, history):
+            yield event
+
+    job_mode = data.get('mode') == 'job' or request.args.get('mode') == 'job'
+    try:
+        job = chat_jobs.submit(loop, generate, deadline, sync=not job_mode)
+    except QueueFullError as e:
+        response = jsonify({"error": "Too many requests in progress, please retry later.", "retryAfter": e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+
+    if job_mode:
+        response = jsonify({
+            "jobId": job.id,
+            "status": job.status,
+            "pollUrl": f"/api/chat/jobs/{job.id}",
+            "eventsUrl": f"/api/chat/jobs/{job.id}/events",
+        })
+        response.headers['Location'] = f"/api/chat/jobs/{job.id}"
+        return response, 202
+
+    # Wait a little past the deadline; the job expires itself once it is reached
+    job.wait(job.deadline_seconds + 5)
+    if job.status == "done":
+        # The template expects a JSON object with a specific structure
+        return jsonify({"response": job.result.get("reply", "I'm at a loss for words.")})
+    if job.status in ("expired", "queued", "running"):
+        chat_jobs.cancel(job.id)
+        return jsonify({"error": "The response took too long to generate."}), 504
+    return jsonify({"error": job.error or "AI failed to generate a response"}), 500
+
+@app.route('/api/chat/jobs/<job_id>', methods=['GET'])
+def get_chat_job(job_id):
+    """Returns the status (and any partial text) of an API chat job."""
+    job = chat_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/chat/jobs/<job_id>', methods=['DELETE'])
+def cancel_chat_job(job_id):
+    """Cancels a queued or running API chat job."""
+    if not chat_jobs.get(job_id):
+        return jsonify({"error": "Unknown or expired job"}), 404
+    if not chat_jobs.cancel(job_id):
+        return jsonify({"error": "Job has already finished"}), 409
+    return jsonify({"jobId": job_id, "status": "cancelled"})
+
+@app.route('/api/chat/jobs/<job_id>/events', methods=['GET'])
+def stream_chat_job(job_id):
+    """Streams an API chat job as server-sent events: 'chunk' for each piece of text, then 'done'."""
+    job = chat_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown or expired job"}), 404
+
+    def events():
+        sent = 0
+        while True:
+            if not job.wait_for_update(sent, timeout=15):
+                yield ": keep-alive\n\n"
+                continue
+            chunks = job.chunks[sent:]
+            sent += len(chunks)
+            for chunk in chunks:
+                yield f"event: chunk\ndata: {json.dumps({'text': chunk})}\n\n"
+            if job.is_finished:
+                yield f"event: done\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/metrics')
+def metrics():
+    """Exposes pipeline latency histograms and LLM counters for Prometheus."""
+    if not main_chatbot_instance:
+        return Response("# AI mind is not connected\n", status=503, mimetype="text/plain")
+    api_queue = chat_jobs.get_stats()
+    audio_cache = tts_cache.get_stats()
+    gauges = {
+        "api_chat_admitted": {(): api_queue["admitted"]},
+        "tts_cache_bytes": {(): audio_cache["bytes"]},
+    }
+    counters = {
+        "api_chat_rejected_total": {(): api_queue["rejected"]},
+        "tts_cache_hits_total": {(): audio_cache["hits"]},
+        "tts_cache_misses_total": {(): audio_cache["misses"]},
+        "tts_cache_evictions_total": {(): audio_cache["evictions"]},
+    }
+    if youtube_ingestor is not None:
+        youtube = youtube_ingestor.get_stats()
+        gauges.update({
+            "youtube_chat_ingested_per_minute": {(): youtube["ingested_per_minute"]},
+            "youtube_chat_answered_per_minute": {(): youtube["answered_per_minute"]},
+            "youtube_chat_answer_backlog": {(): youtube["answer_backlog"]},
+        })
+        counters.update({
+            "youtube_chat_ingested_total": {(): youtube["ingested_total"]},
+            "youtube_chat_answered_total": {(): youtube["answered_total"]},
+            "youtube_chat_dropped_total": {(("reason", reason),): count for reason, count in youtube["dropped_total"].items()},
+        })
+    return Response(main_chatbot_instance.mind.get_metrics_text(gauges, counters), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/youtube/monitor', methods=['POST'])
+def start_youtube_monitor():
+    """
+    Starts answering a YouTube live chat. Send "videoId" (or "liveChatId").
+    Replies go to web clients as 'youtube_reply' events, and to the chat
+    itself when YOUTUBE_POST_REPLIES=1 and an OAuth token is configured.
+    """
+    global youtube_ingestor
+    data = request.get_json(silent=True) or {}
+    if not data.get('videoId') and not data.get('liveChatId'):
+        return jsonify({"error": "videoId or liveChatId is required"}), 400
+
+    loop = getattr(main_chatbot_instance, 'async_loop', None)
+    if not main_chatbot_instance or not loop or not loop.is_running():
+        return jsonify({"error": "AI mind is not connected"}), 503
+    if youtube_ingestor is not None and not youtube_ingestor.poller.ended:
+        return jsonify({"error": "A YouTube chat is already being monitored"}), 409
+
+    poller = YouTubeLiveChatPoller(video_id=data.get('videoId'), live_chat_id=data.get('liveChatId'))
+    post_replies = os.getenv("YOUTUBE_POST_REPLIES", "0").lower() in ("1", "true", "yes")
+
+    async def reply(message, text):
+        socketio.emit('youtube_reply', {'author': message.author_name, 'message': message.text, 'reply': text})
+        if post_replies:
+            await poller.post_message(f"@{message.author_name} {text}")
+
+    youtube_ingestor = YouTubeChatIngestor(main_chatbot_instance.mind, poller, reply)
+    future = asyncio.run_coroutine_threadsafe(youtube_ingestor.run(), loop)
+    future.add_done_callback(_log_stream_failure)
+    return jsonify({"status": "started", "samplingPolicy": youtube_ingestor.selector.policy,
+                    "minPollIntervalSeconds": poller.min_interval}), 202
+
+@app.route('/api/youtube/monitor', methods=['GET'])
+def youtube_monitor_stats():
+    """Reports ingested, dropped and answered rates for the YouTube chat monitor."""
+    if youtube_ingestor is None:
+        return jsonify({"error": "No YouTube chat is being monitored"}), 404
+    return jsonify(youtube_ingestor.get_stats())
+
+@app.route('/api/youtube/monitor', methods=['DELETE'])
+def stop_youtube_monitor():
+    """Stops the YouTube chat monitor."""
+    loop = getattr(main_chatbot_instance, 'async_loop', None)
+    if youtube_ingestor is None or not loop:
+        return jsonify({"error": "No YouTube chat is being monitored"}), 404
+    asyncio.run_coroutine_threadsafe(youtube_ingestor.stop(), loop).result(timeout=10)
+    return jsonify(youtube_ingestor.get_stats())
+
+async def generate_traced_tts(text, style):
+    """
+    Returns TTS audio for a reply from the cache, synthesising it on a miss.
+    Synthesis is timed as the 'tts' pipeline stage.
+    """
+    async def synthesize(text, style):
+        with main_chatbot_instance.mind.tracer.span("tts"):
+            return await main_chatbot_instance.generate_tts_for_web(text, style)
+    # TTS_VOICE is part of the cache key; change it along with the voice so old audio isn't reused
+    return await tts_cache.get_or_create(text, style, synthesize, voice=os.getenv("TTS_VOICE", ""))
+
 @socketio.on('connect')
 def handle_connect():
     """Handles a new client connection."""
@@ -88,12 +280,21 @@ def handle_user_message(data):
     print(f"Received web message from {user_id}: {user_input}")
 
     if main_chatbot_instance:
-        # Load the specific conversation history for this web user
-        history = main_chatbot_instance.db.load_chat_history(channel=user_id)
+        # This web user's recent history, from memory (the database is only read on first use)
+        history = main_chatbot_instance.mind.history_store.get(user_id)
 
         # Generate response using the main mind's async function, but run it
         # in the main application's event loop.
         if hasattr(main_chatbot_instance, 'async_loop') and main_chatbot_instance.async_loop.is_running():
+            if data.get('stream') and STREAM_REPLIES:
+                # Streaming mode: push tokens to this client as they arrive
+                stream_future = asyncio.run_coroutine_threadsafe(
+                    stream_response_to_client(request.sid, user_id, user_input, history),
+                    main_chatbot_instance.async_loop
+                )
+                stream_future.add_done_callback(_log_stream_failure)
+                return
+
             # First, get the text response
             text_future = asyncio.run_coroutine_threadsafe(
                 main_chatbot_instance.mind.generate_chat_response(
@@ -105,38 +306,31 @@ def handle_user_message(data):
                 main_chatbot_instance.async_loop
             )
 
-            # Define a callback to handle the text response and then generate audio
+            sid = request.sid
+
+            # Define a callback to send the text response and then speak it sentence by sentence
             def handle_text_and_generate_audio(f):
                 try:
                     response_data = f.result()
                     if not response_data or "reply" not in response_data:
-                        socketio.emit('bot_response', {'reply': "Sorry, I had a problem thinking of a response."})
+                        socketio.emit('bot_response', {'reply': "Sorry, I had a problem thinking of a response."}, to=sid)
                         return
 
                     bot_response = response_data.get("reply")
                     style = response_data.get("style", {})
+                    message_id = uuid.uuid4().hex
 
-                    # Now, generate the TTS audio for this response
+                    # Send the text straight away; its audio follows as ordered 'audio_chunk' events
+                    print(f"Sending web response: {bot_response}")
+                    socketio.emit('bot_response', {'reply': bot_response, 'messageId': message_id}, to=sid)
                     audio_future = asyncio.run_coroutine_threadsafe(
-                        main_chatbot_instance.generate_tts_for_web(bot_response, style),
+                        speak_reply(sid, message_id, bot_response, style),
                         main_chatbot_instance.async_loop
                     )
-                    audio_future.add_done_callback(
-                        lambda af: emit_final_response(af, bot_response)
-                    )
+                    audio_future.add_done_callback(_log_stream_failure)
 
                 except Exception as e:
                     print(f"Error in web server text generation stage: {e}")
-            
-            def emit_final_response(audio_future, text_response):
-                audio_url = None
-                try:
-                    audio_url = audio_future.result()
-                except Exception as e:
-                    print(f"Error in web server audio generation stage: {e}")
-                
-                print(f"Sending web response: {text_response} with audio {audio_url}")
-                socketio.emit('bot_response', {'reply': text_response, 'audioUrl': audio_url})
 
             text_future.add_done_callback(handle_text_and_generate_audio)
         else:
@@ -144,6 +338,75 @@ def handle_user_message(data):
     else:
         emit('bot_response', {'reply': 'The AI mind is not connected. Please try again later.'})
 
+async def emit_audio_chunks(sid, message_id, audio):
+    """Sends each sentence's audio to the client in order, then 'audio_done' with the count."""
+    count = 0
+    async for item in audio.results():
+        if item["audioUrl"]:
+            socketio.emit('audio_chunk', {'messageId': message_id, **item}, to=sid)
+        count += 1
+    socketio.emit('audio_done', {'messageId': message_id, 'chunks': count}, to=sid)
+
+async def speak_reply(sid, message_id, text, style):
+    """Synthesises a complete reply sentence by sentence, so the first audio is ready after one sentence."""
+    audio = SentenceAudioStream(tts_pool, generate_traced_tts, style)
+    for sentence in split_sentences(text):
+        audio.add(sentence)
+    audio.close()
+    await emit_audio_chunks(sid, message_id, audio)
+
+async def stream_response_to_client(sid, user_id, user_input, history):
+    """
+    Runs the streaming chat pipeline on the main event loop and forwards each
+    chunk to a single web client. Emits 'bot_response_chunk' for every token
+    chunk and a final 'bot_response_done' with the filtered reply. Each
+    sentence is sent to TTS as soon as it is complete, so audio is generated
+    while the rest of the reply is still being written and arrives as ordered
+    'audio_chunk' events. Sentences go through the same filters as the final
+    reply before synthesis, so the audio matches the text the client shows.
+    """
+    mind = main_chatbot_instance.mind
+    message_id = uuid.uuid4().hex
+    final_event = None
+    splitter = SentenceSplitter()
+    audio = SentenceAudioStream(tts_pool, generate_traced_tts)
+    audio_sender = asyncio.create_task(emit_audio_chunks(sid, message_id, audio))
+
+    try:
+        async for event in mind.generate_chat_response_stream(user_id, 'Web User', user_input, history):
+            if event["type"] == "style":
+                audio.style = event["style"]
+            elif event["type"] == "chunk":
+                socketio.emit('bot_response_chunk', {'messageId': message_id, 'text': event["text"]}, to=sid)
+                for sentence in splitter.feed(event["text"]):
+                    audio.add(mind.filter_sentence(sentence))
+            elif event["type"] == "done":
+                final_event = event
+    except BaseException:
+        audio.cancel()
+        raise
+
+    if not final_event or not final_event.get("reply"):
+        audio.cancel()
+        socketio.emit('bot_response_done', {'messageId': message_id, 'reply': "Sorry, I had a problem thinking of a response."}, to=sid)
+        return
+
+    for sentence in splitter.flush():
+        audio.add(mind.filter_sentence(sentence))
+    audio.close()
+
+    bot_response = final_event["reply"]
+    print(f"Sending streamed web response: {bot_response}")
+    socketio.emit('bot_response_done', {'messageId': message_id, 'reply': bot_response}, to=sid)
+    await audio_sender
+
+def _log_stream_failure(future):
+    """Reports errors raised by a streaming response or audio task."""
+    try:
+        future.result()
+    except Exception as e:
+        print(f"Error in web server streaming stage: {e}")
+
 def run_web_server():
     """Runs the Flask-SocketIO web server."""
     print("Starting web server on http://0.0.0.0:5000 (all interfaces)")
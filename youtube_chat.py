@@ -0,0 +1,497 @@
+# youtube_chat.py
+import asyncio
+import heapq
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import aiohttp
+import numpy as np
+
+from async_utils import run_blocking
+
+YOUTUBE_API_URL = "https://www.googleapis.com/youtube/v3"
+
+_LINK_PATTERN = re.compile(r"https?://|www\.|\.(com|net|org|gg|ly)/", re.IGNORECASE)
+_REPEATED_CHARS = re.compile(r"(.)\1{2,}")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_chat_text(text: str) -> str:
+    """Lower-cases, collapses "sooooo" to "soo" and strips punctuation/emoji, for duplicate detection."""
+    text = _REPEATED_CHARS.sub(r"\1\1", text.lower())
+    return _NON_WORD.sub(" ", text).strip()
+
+
+class ChatMessage:
+    """One live-chat message, reduced to what the pipeline needs."""
+
+    def __init__(self, message_id: str, author_id: str, author_name: str, text: str, published: str = "",
+                 is_moderator: bool = False, is_owner: bool = False, is_sponsor: bool = False):
+        self.id = message_id
+        self.author_id = author_id
+        self.author_name = author_name
+        self.text = text
+        self.published = published
+        self.is_moderator = is_moderator
+        self.is_owner = is_owner
+        self.is_sponsor = is_sponsor
+        self.received = time.monotonic()
+        self.sentiment = 0.0
+
+    @property
+    def user_id(self) -> str:
+        return f"yt_{self.author_id}"
+
+    @classmethod
+    def from_api(cls, item: Dict) -> Optional["ChatMessage"]:
+        snippet = item.get("snippet", {})
+        author = item.get("authorDetails", {})
+        text = snippet.get("displayMessage") or snippet.get("textMessageDetails", {}).get("messageText")
+        if snippet.get("type", "textMessageEvent") != "textMessageEvent" or not text:
+            return None # Super chats, membership events, deletions etc.
+        return cls(item.get("id", ""), author.get("channelId", ""), author.get("displayName", "Viewer"), text,
+                   snippet.get("publishedAt", ""), author.get("isChatModerator", False),
+                   author.get("isChatOwner", False), author.get("isChatSponsor", False))
+
+
+class RateMeter:
+    """Counts events and reports how many happened in the last `window` seconds."""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self.total = 0
+        self._events: Deque[Tuple[float, int]] = deque()
+
+    def add(self, count: int = 1):
+        if count:
+            self.total += count
+            self._events.append((time.monotonic(), count))
+
+    def per_window(self) -> int:
+        cutoff = time.monotonic() - self.window
+        while self._events and self._events[0][0] < cutoff:
+            self._events.popleft()
+        return sum(count for _, count in self._events)
+
+
+class YouTubeAPIError(Exception):
+    def __init__(self, status: int, reason: str, message: str):
+        super().__init__(f"HTTP {status} {reason}: {message}")
+        self.status = status
+        self.reason = reason
+
+
+class YouTubeLiveChatPoller:
+    """
+    Reads a live chat through the YouTube Data API. Polls no faster than the
+    API's pollingIntervalMillis and no faster than the daily quota allows
+    (YOUTUBE_DAILY_QUOTA units, of which this poller may use YOUTUBE_QUOTA_SHARE).
+    Uses YOUTUBE_API_KEY for reading; posting replies needs an OAuth access
+    token (YOUTUBE_ACCESS_TOKEN).
+    """
+
+    LIST_COST = 5     # Quota units per liveChatMessages.list call
+    INSERT_COST = 50  # Quota units per liveChatMessages.insert call
+
+    def __init__(self, video_id: str = None, live_chat_id: str = None, api_key: str = None, access_token: str = None,
+                 daily_quota: int = None, quota_share: float = None):
+        self.video_id = video_id
+        self.live_chat_id = live_chat_id
+        self.api_key = api_key or os.getenv("YOUTUBE_API_KEY", "")
+        self.access_token = access_token or os.getenv("YOUTUBE_ACCESS_TOKEN", "")
+        self.daily_quota = daily_quota or int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+        self.quota_share = quota_share or float(os.getenv("YOUTUBE_QUOTA_SHARE", "0.8")) # Leave some for replies and other tools
+        self.min_interval = 86400.0 / max(1.0, self.daily_quota * self.quota_share / self.LIST_COST)
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._page_token: Optional[str] = None
+        self.polls = 0
+        self.quota_used = 0
+        self.errors = 0
+        self.ended = False
+
+    def _auth(self) -> Tuple[Dict, Dict]:
+        params = {} if self.access_token else {"key": self.api_key}
+        headers = {"Authorization": f"Bearer {self.access_token}"} if self.access_token else {}
+        return params, headers
+
+    async def _get(self, path: str, params: Dict, cost: int) -> Dict:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20))
+        auth_params, headers = self._auth()
+        self.quota_used += cost
+        async with self._session.get(f"{YOUTUBE_API_URL}/{path}", params={**params, **auth_params}, headers=headers) as response:
+            data = await response.json(content_type=None)
+            if response.status >= 400:
+                reason = (data.get("error", {}).get("errors") or [{}])[0].get("reason", "")
+                raise YouTubeAPIError(response.status, reason, data.get("error", {}).get("message", ""))
+            return data
+
+    async def resolve_live_chat_id(self) -> str:
+        if not self.live_chat_id:
+            data = await self._get("videos", {"part": "liveStreamingDetails", "id": self.video_id}, cost=1)
+            items = data.get("items", [])
+            self.live_chat_id = items[0].get("liveStreamingDetails", {}).get("activeLiveChatId") if items else None
+            if not self.live_chat_id:
+                raise YouTubeAPIError(404, "liveChatNotFound", f"Video {self.video_id} has no active live chat")
+        return self.live_chat_id
+
+    async def batches(self):
+        """Yields one list of ChatMessages per poll until the chat ends."""
+        await self.resolve_live_chat_id()
+        first = True
+        while not self.ended:
+            started = time.monotonic()
+            try:
+                data = await self._get("liveChat/messages", {
+                    "liveChatId": self.live_chat_id,
+                    "part": "snippet,authorDetails",
+                    "maxResults": 2000,
+                    **({"pageToken": self._page_token} if self._page_token else {}),
+                }, cost=self.LIST_COST)
+            except YouTubeAPIError as e:
+                self.errors += 1
+                if e.reason in ("liveChatEnded", "liveChatNotFound", "liveChatDisabled", "forbidden"):
+                    print(f"YouTube chat monitor stopping: {e}")
+                    self.ended = True
+                    return
+                # quotaExceeded resets daily; anything else gets a short retry
+                delay = 3600.0 if e.reason in ("quotaExceeded", "rateLimitExceeded") else max(self.min_interval, 30.0)
+                print(f"YouTube chat poll failed ({e}); retrying in {delay:.0f}s.")
+                await asyncio.sleep(delay)
+                continue
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.errors += 1
+                print(f"YouTube chat poll failed ({type(e).__name__}: {e}); retrying.")
+                await asyncio.sleep(max(self.min_interval, 10.0))
+                continue
+
+            self.polls += 1
+            self._page_token = data.get("nextPageToken")
+            if data.get("offlineAt"):
+                self.ended = True
+            messages = [m for m in (ChatMessage.from_api(item) for item in data.get("items", [])) if m]
+            if not first: # The first page is backlog from before we joined
+                yield messages
+            first = False
+            interval = max(self.min_interval, data.get("pollingIntervalMillis", 0) / 1000.0)
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    async def post_message(self, text: str) -> bool:
+        """Posts a reply to the chat. Needs an OAuth access token; returns False without one."""
+        if not self.access_token or not self.live_chat_id:
+            return False
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20))
+        body = {"snippet": {"liveChatId": self.live_chat_id, "type": "textMessageEvent",
+                            "textMessageDetails": {"messageText": text[:200]}}}
+        self.quota_used += self.INSERT_COST
+        async with self._session.post(f"{YOUTUBE_API_URL}/liveChat/messages", params={"part": "snippet"},
+                                      headers={"Authorization": f"Bearer {self.access_token}"}, json=body) as response:
+            if response.status >= 400:
+                print(f"Could not post to YouTube chat: HTTP {response.status} {await response.text()}")
+                return False
+            return True
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def get_stats(self) -> Dict:
+        return {
+            "live_chat_id": self.live_chat_id,
+            "polls": self.polls,
+            "quota_used": self.quota_used,
+            "min_poll_interval_seconds": self.min_interval,
+            "errors": self.errors,
+            "ended": self.ended,
+        }
+
+
+class ChatTriage:
+    """
+    Cheap, local filtering in front of everything else. Drops repeated
+    message ids, empty or overlong messages, links from regular viewers, a
+    viewer repeating themselves, copypasta posted by many viewers at once, and
+    viewers over YT_AUTHOR_MAX_PER_MINUTE.
+    """
+
+    def __init__(self, window: float = None, author_max_per_minute: int = None, copypasta_authors: int = None,
+                 max_chars: int = None):
+        self.window = window or float(os.getenv("YT_DEDUPE_SECONDS", "60"))
+        self.author_max_per_minute = author_max_per_minute or int(os.getenv("YT_AUTHOR_MAX_PER_MINUTE", "6"))
+        self.copypasta_authors = copypasta_authors or int(os.getenv("YT_COPYPASTA_AUTHORS", "3"))
+        self.max_chars = max_chars or int(os.getenv("YT_MAX_MESSAGE_CHARS", "300"))
+
+        self._seen_ids: Deque[str] = deque(maxlen=5000)
+        self._seen_id_set = set()
+        self._recent: Deque[Tuple[float, str, str]] = deque() # (time, author, normalized text)
+        self._text_authors: Dict[str, set] = {}
+        self._author_times: Dict[str, Deque[float]] = {}
+
+    def _expire(self, now: float):
+        while self._recent and self._recent[0][0] < now - self.window:
+            _, author, text = self._recent.popleft()
+            authors = self._text_authors.get(text)
+            if authors is not None:
+                authors.discard(author)
+                if not authors:
+                    del self._text_authors[text]
+        for author in [a for a, times in self._author_times.items() if not times or times[-1] < now - 60]:
+            del self._author_times[author]
+
+    def check(self, message: ChatMessage) -> Optional[str]:
+        """Returns why the message should be dropped, or None to keep it."""
+        if message.id in self._seen_id_set:
+            return "duplicate"
+        if len(self._seen_ids) == self._seen_ids.maxlen:
+            self._seen_id_set.discard(self._seen_ids[0])
+        self._seen_ids.append(message.id)
+        self._seen_id_set.add(message.id)
+
+        now = time.monotonic()
+        self._expire(now)
+        privileged = message.is_moderator or message.is_owner
+        normalized = normalize_chat_text(message.text)
+        if len(normalized) < 2:
+            return "empty"
+        if len(message.text) > self.max_chars:
+            return "too_long"
+        if not privileged and _LINK_PATTERN.search(message.text):
+            return "link"
+
+        times = self._author_times.setdefault(message.author_id, deque())
+        while times and times[0] < now - 60:
+            times.popleft()
+        times.append(now)
+        if not privileged and len(times) > self.author_max_per_minute:
+            return "rate_limited"
+
+        authors = self._text_authors.setdefault(normalized, set())
+        repeated = message.author_id in authors
+        authors.add(message.author_id)
+        self._recent.append((now, message.author_id, normalized))
+        if repeated:
+            return "repeat"
+        if len(authors) >= self.copypasta_authors:
+            return "copypasta"
+        return None
+
+
+class ReplySelector:
+    """
+    Picks at most `max_per_window` messages to answer from each window of chat.
+    Policies: "priority" (questions, mentions of the bot, moderators and
+    members, strong sentiment first), "random" (a uniform sample) or "first".
+    """
+
+    def __init__(self, max_per_window: int = None, policy: str = None, bot_names: List[str] = None, seed: int = None):
+        self.max_per_window = max_per_window or int(os.getenv("YT_MAX_REPLIES_PER_WINDOW", "3"))
+        self.policy = (policy or os.getenv("YT_SAMPLING_POLICY", "priority")).strip().lower()
+        self.bot_names = [name.lower() for name in (bot_names or os.getenv("YT_BOT_NAMES", "chris,aichris,ai chris").split(",")) if name]
+        self._random = random.Random(seed)
+        self._candidates: List[Tuple[float, int, ChatMessage]] = []
+        self._offered = 0
+
+    def score(self, message: ChatMessage) -> float:
+        text = message.text.lower()
+        score = abs(message.sentiment)
+        if "?" in text:
+            score += 2.0
+        if any(name in text for name in self.bot_names):
+            score += 3.0
+        if message.is_owner or message.is_moderator or message.is_sponsor:
+            score += 1.0
+        return score + self._random.random() * 0.1 # Break ties between similar messages
+
+    def offer(self, message: ChatMessage):
+        self._offered += 1
+        if self.policy == "first":
+            if len(self._candidates) < self.max_per_window:
+                self._candidates.append((0.0, self._offered, message))
+        elif self.policy == "random":
+            # Reservoir sampling: every message in the window is equally likely to be kept
+            if len(self._candidates) < self.max_per_window:
+                self._candidates.append((0.0, self._offered, message))
+            else:
+                slot = self._random.randrange(self._offered)
+                if slot < self.max_per_window:
+                    self._candidates[slot] = (0.0, self._offered, message)
+        else:
+            entry = (self.score(message), self._offered, message)
+            if len(self._candidates) < self.max_per_window:
+                heapq.heappush(self._candidates, entry)
+            elif entry[0] > self._candidates[0][0]:
+                heapq.heapreplace(self._candidates, entry)
+
+    def take(self) -> List[ChatMessage]:
+        """Ends the window: returns the chosen messages (best or oldest first) and starts a new one."""
+        chosen = sorted(self._candidates, key=lambda entry: (-entry[0], entry[1]))
+        self._candidates = []
+        self._offered = 0
+        return [message for _, _, message in chosen]
+
+
+def score_sentiment_batch(engine, texts: List[str]) -> np.ndarray:
+    """
+    Scores a poll's messages with the engine's score_text, one message at a
+    time (its scorer takes a single text) but in one pass, so the batch costs a
+    single hop to a worker thread. Live chat repeats itself, so each distinct
+    text is scored only once.
+    """
+    scored: Dict[str, float] = {}
+    for text in texts:
+        if text not in scored:
+            scored[text] = engine.score_text(text)
+    return np.fromiter((scored[text] for text in texts), dtype=np.float32, count=len(texts))
+
+
+class YouTubeChatIngestor:
+    """
+    Keeps the bot responsive on a busy live chat. Every poll's messages are
+    triaged, sentiment-scored together on a worker thread, and folded into
+    mood and trust once per batch rather than once per message. Only the messages the
+    ReplySelector picks each YT_REPLY_WINDOW_SECONDS go through the full chat
+    pipeline; `reply(message, text)` delivers each answer.
+    """
+
+    def __init__(self, mind, poller: YouTubeLiveChatPoller, reply: Callable[[ChatMessage, str], Awaitable[None]] = None,
+                 triage: ChatTriage = None, selector: ReplySelector = None, window: float = None):
+        self.mind = mind
+        self.poller = poller
+        self.reply = reply
+        self.triage = triage or ChatTriage()
+        self.selector = selector or ReplySelector()
+        self.window = window or float(os.getenv("YT_REPLY_WINDOW_SECONDS", "30"))
+        self.sentiment_threshold = 0.1 # Same threshold the chat pipeline uses for a single message
+
+        self._answers: Optional[asyncio.Queue] = None # Created in run(), on the event loop
+        self._tasks: List[asyncio.Task] = []
+        self._run_task: Optional[asyncio.Task] = None
+
+        self.ingested = RateMeter()
+        self.kept = RateMeter()
+        self.answered = RateMeter()
+        self.dropped: Dict[str, RateMeter] = {}
+        self.mean_sentiment = 0.0
+
+    def _drop(self, reason: str, count: int = 1):
+        self.dropped.setdefault(reason, RateMeter()).add(count)
+
+    async def run(self):
+        """Runs polling, window selection and answering until the chat ends or stop() is called."""
+        self._run_task = asyncio.current_task()
+        self._answers = asyncio.Queue(maxsize=self.selector.max_per_window)
+        self._tasks = [asyncio.create_task(self._select_periodically()), asyncio.create_task(self._answer_loop())]
+        try:
+            async for batch in self.poller.batches():
+                await self.ingest(batch)
+        except asyncio.CancelledError:
+            pass # stop() was called
+        finally:
+            await self._stop_workers()
+
+    async def ingest(self, batch: List[ChatMessage]):
+        """Triage, sentiment scoring and aggregate mood/trust updates for one poll's worth of messages."""
+        self.ingested.add(len(batch))
+        kept = []
+        for message in batch:
+            reason = self.triage.check(message)
+            if reason:
+                self._drop(reason)
+            else:
+                kept.append(message)
+        self.kept.add(len(kept))
+        if not kept:
+            return
+
+        engine = self.mind.emotional_feedback_engine
+        scores = await run_blocking(score_sentiment_batch, engine, [m.text for m in kept])
+        for message, score in zip(kept, scores):
+            message.sentiment = float(score)
+            self.selector.offer(message)
+        self._apply_aggregate(kept, scores)
+
+    def _apply_aggregate(self, messages: List[ChatMessage], scores: np.ndarray):
+        """One mood update for the batch's overall tone, and one trust update per viewer."""
+        mind = self.mind
+        self.mean_sentiment = float(scores.mean())
+        if self.mean_sentiment > self.sentiment_threshold:
+            mind.mood_engine.positive_interaction()
+        elif self.mean_sentiment < -self.sentiment_threshold:
+            mind.mood_engine.negative_interaction()
+            mind.mental_health_engine.add_stress(abs(self.mean_sentiment) * 0.2)
+
+        per_author: Dict[str, float] = {}
+        for message, score in zip(messages, scores):
+            per_author[message.user_id] = per_author.get(message.user_id, 0.0) + float(score)
+        for user_id, total in per_author.items():
+            if total > self.sentiment_threshold:
+                mind.trust_engine.positive_interaction(user_id)
+            elif total < -self.sentiment_threshold:
+                mind.trust_engine.negative_interaction(user_id)
+        mind.checkpointer.mark_dirty("mood", "trust", "mental_health")
+
+    async def _select_periodically(self):
+        while True:
+            await asyncio.sleep(self.window)
+            for message in self.selector.take():
+                if self._answers.full():
+                    # Still answering the last window; a stale question isn't worth a late answer
+                    stale = self._answers.get_nowait()
+                    self._drop("stale", 1)
+                    print(f"YouTube chat: skipped a stale message from {stale.author_name}.")
+                self._answers.put_nowait(message)
+
+    async def _answer_loop(self):
+        while True:
+            message = await self._answers.get()
+            try:
+                response = await self._answer(message)
+                if response and self.reply:
+                    await self.reply(message, response)
+                self.answered.add()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._drop("answer_failed")
+                print(f"YouTube chat: failed to answer {message.author_name}: {e}")
+
+    async def _answer(self, message: ChatMessage) -> str:
+        history = await self.mind.history_store.aget(message.user_id)
+        response = await self.mind.generate_chat_response(message.user_id, message.author_name, message.text, history)
+        return response.get("reply", "") if response else ""
+
+    async def stop(self):
+        """Stops polling (even mid-sleep) and answering."""
+        self.poller.ended = True
+        if self._run_task is not None and self._run_task is not asyncio.current_task() and not self._run_task.done():
+            self._run_task.cancel()
+            await asyncio.gather(self._run_task, return_exceptions=True)
+        await self._stop_workers()
+
+    async def _stop_workers(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.poller.close()
+
+    def get_stats(self) -> Dict:
+        return {
+            "ingested_total": self.ingested.total,
+            "ingested_per_minute": self.ingested.per_window(),
+            "kept_per_minute": self.kept.per_window(),
+            "answered_total": self.answered.total,
+            "answered_per_minute": self.answered.per_window(),
+            "dropped_total": {reason: meter.total for reason, meter in self.dropped.items()},
+            "dropped_per_minute": sum(meter.per_window() for meter in self.dropped.values()),
+            "answer_backlog": self._answers.qsize() if self._answers is not None else 0,
+            "mean_sentiment": self.mean_sentiment,
+            "sampling_policy": self.selector.policy,
+            "poller": self.poller.get_stats(),
+        }